@@ -0,0 +1,178 @@
+"""
+Проверка повторов, circuit breaker и отдачи прошлых ответов GNews
+
+Поднимает локальный GNews, ответы которого задаются сценарием (200, 5xx,
+429 с Retry-After, 401, зависание), и проверяет GNewsProvider и
+NewsService: повторы временных ошибок с паузой, ожидание Retry-After,
+размыкание цепи и отсутствие запросов, пока она разомкнута, отдачу
+последнего успешного ответа, восстановление через пробный запрос.
+Печатает результат каждой проверки; код выхода 1, если какая-то не прошла.
+
+Запуск:
+    python -m benchmarks.breaker_check
+"""
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+from aiohttp import web
+
+from benchmarks.checks import Checks
+from benchmarks.fake_gnews import FakeGNewsServer
+from config import GNewsConfig
+from services.circuit_breaker import CLOSED, OPEN, parse_retry_after
+from services.news_service import NewsService
+
+COMPANY = 'Яндекс'
+RECOVERY = 0.5
+
+
+class ScriptedGNews(FakeGNewsServer):
+    """GNews, отвечающий по очереди ответами из сценария (пустой - 200)"""
+
+    def __init__(self):
+        super().__init__()
+        self.script: List[str] = []
+        self.call_times: List[float] = []
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.call_times.append(time.monotonic())
+        step = self.script.pop(0) if self.script else 'ok'
+        if step == 'hang':
+            await asyncio.sleep(5)
+        if step.startswith('429'):
+            _, _, retry_after = step.partition(':')
+            headers = {'Retry-After': retry_after} if retry_after else {}
+            return web.json_response({'errors': ['Too many requests']}, status=429, headers=headers)
+        if step.isdigit():
+            return web.json_response({'errors': ['Error']}, status=int(step))
+        return await super().search(request)
+
+
+def make_service(base_url: str, **overrides) -> NewsService:
+    options = dict(
+        cache_ttl=0,
+        timeout=0.3,
+        retries=2,
+        retry_base_delay=0.05,
+        retry_max_delay=0.1,
+        max_retry_after=1.0,
+        breaker_failures=3,
+        breaker_recovery=RECOVERY,
+    )
+    options.update(overrides)
+    return NewsService(GNewsConfig(api_key='test', base_url=base_url, **options))
+
+
+async def fetch(service: NewsService) -> Optional[list]:
+    return await service.gnews.fetch(COMPANY, 5)
+
+
+async def run(checks: Checks):
+    server = ScriptedGNews()
+    base_url = await server.start()
+    try:
+        service = make_service(base_url)
+        gnews = service.gnews
+
+        # Временные ошибки повторяются, успешный ответ после них принимается
+        server.script = ['500', '503']
+        started = len(server.call_times)
+        articles = await fetch(service)
+        checks.check('retries transient errors', articles is not None and len(server.call_times) - started == 3,
+                     f"calls={len(server.call_times) - started}")
+        checks.check('success keeps circuit closed', gnews.breaker.state == CLOSED)
+
+        # 429 с Retry-After: следующая попытка не раньше указанной паузы
+        server.script = ['429:1']
+        started = len(server.call_times)
+        articles = await fetch(service)
+        times = server.call_times[started:]
+        waited = times[1] - times[0] if len(times) == 2 else 0
+        checks.check('honors Retry-After', articles is not None and waited >= 0.95, f"waited={waited:.2f}s")
+
+        # Таймаут тоже временная ошибка
+        server.script = ['hang']
+        articles = await fetch(service)
+        checks.check('retries after timeout', articles is not None)
+
+        # Успешный ответ запоминается, затем API падает: отдается прошлый ответ
+        good = await service.fetch_articles(COMPANY, 5)
+        server.script = ['500'] * 3
+        started = len(server.call_times)
+        stale = await service.fetch_articles(COMPANY, 5)
+        checks.check('serves last good articles on error', stale == good and len(good) > 0,
+                     f"{len(stale)} articles")
+        checks.check('gives up after retries', len(server.call_times) - started == 3)
+
+        # Еще две неудачи подряд размыкают цепь (порог 3)
+        server.script = ['500'] * 6
+        await fetch(service)
+        await fetch(service)
+        checks.check('opens after consecutive failures', gnews.breaker.state == OPEN,
+                     f"state={gnews.breaker.state}")
+
+        started = len(server.call_times)
+        stale = await service.fetch_articles(COMPANY, 5)
+        checks.check('no requests while open', len(server.call_times) == started)
+        checks.check('serves stale while open', stale == good)
+        status = service.providers_status()['gnews']
+        checks.check('breaker state in status', status['breaker']['state'] == OPEN and status['rejected'] >= 1,
+                     f"{status['breaker']}")
+
+        # После паузы один пробный запрос; неудача - снова пауза без повторов
+        server.script = ['500']
+        await asyncio.sleep(RECOVERY + 0.05)
+        started = len(server.call_times)
+        await fetch(service)
+        checks.check('half-open probe is a single request', len(server.call_times) - started == 1)
+        checks.check('failed probe reopens', gnews.breaker.state == OPEN)
+
+        # Успешная проба замыкает цепь
+        server.script = []
+        await asyncio.sleep(RECOVERY + 0.05)
+        articles = await fetch(service)
+        checks.check('successful probe closes', articles is not None and gnews.breaker.state == CLOSED,
+                     f"state={gnews.breaker.state}")
+
+        # Долгий Retry-After не ждем, а сразу размыкаем цепь на это время
+        server.script = ['429:30']
+        started = len(server.call_times)
+        await fetch(service)
+        breaker = gnews.breaker.status()
+        checks.check('long Retry-After opens immediately',
+                     len(server.call_times) - started == 1 and breaker['state'] == OPEN
+                     and breaker['retry_in'] > 25, f"{breaker}")
+
+        # 401 не повторяется; прочие 4xx не влияют на цепь
+        service = make_service(base_url)
+        server.script = ['400']
+        started = len(server.call_times)
+        await fetch(service)
+        checks.check('4xx not retried', len(server.call_times) - started == 1)
+        checks.check('4xx does not count toward breaker', service.gnews.breaker.failures == 0)
+        server.script = ['401']
+        await fetch(service)
+        checks.check('401 counts toward breaker', service.gnews.breaker.failures == 1)
+
+        # Без прошлого ответа ошибка дает пустой список
+        service = make_service(base_url, retries=0)
+        server.script = ['500']
+        checks.check('no stale data -> empty', await service.fetch_articles('Сбер', 5) == [])
+    finally:
+        await server.stop()
+
+    checks.check('Retry-After as HTTP date',
+                 55 <= (parse_retry_after(time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                                                        time.gmtime(time.time() + 60))) or 0) <= 61)
+
+
+def main():
+    checks = Checks()
+    asyncio.run(run(checks))
+    sys.exit(1 if checks.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
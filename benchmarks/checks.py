@@ -0,0 +1,12 @@
+"""Вывод OK/FAIL для скриптов проверки benchmarks/*_check.py"""
+
+
+class Checks:
+    """Печатает результат каждой проверки и помнит, была ли неудачная"""
+
+    def __init__(self):
+        self.failed = False
+
+    def check(self, name: str, ok: bool, details: str = ''):
+        self.failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}{f': {details}' if details else ''}")
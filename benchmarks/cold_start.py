@@ -0,0 +1,130 @@
+"""
+Холодный старт бота: импорты и время до первого апдейта
+
+Запускает `python main.py` в отдельном процессе против локального
+фиктивного Telegram Bot API (режим polling). Апдейт /start кладется в
+очередь до запуска, как сообщение, которое будит уснувший сервис на
+Render. Из лога берется строка "Startup: time to first update", из
+фиктивного API - время первого ответа бота. Отдельно печатаются самые
+дорогие импорты по `python -X importtime`.
+
+С --max-ttfu скрипт завершается с кодом 1, если медиана времени до
+первого апдейта превышает порог - так его можно использовать как
+проверку на регрессию.
+
+Запуск:
+    python -m benchmarks.cold_start --runs 5 --max-ttfu 3.0
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_telegram import FakeTelegramServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TTFU_RE = re.compile(r"Startup: time to first update ([\d.]+)s \((.*)\)")
+PHASE_RE = re.compile(r"(\w+) ([\d.]+)s")
+
+
+def import_profile(top: int) -> list:
+    """Самые дорогие модули, которые импортирует сам main.py"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Глубина вложенности - отступ по два пробела; main - на первом уровне,
+        # его прямые импорты - на втором
+        if not name.startswith('   ') or name.startswith('     '):
+            continue
+        modules.append((name.strip(), int(cumulative) / 1000))
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return [{'module': name, 'ms': round(ms, 1)} for name, ms in modules[:top]]
+
+
+async def boot_once(tmp: str, timeout: float) -> dict:
+    telegram = FakeTelegramServer()
+    base_url = await telegram.start()
+    telegram.push_message(1, '/start')
+
+    env = {
+        **os.environ,
+        'BOT_TOKEN': '42:cold-start',
+        'GNEWS_API_KEY': 'cold-start',
+        'TELEGRAM_API_URL': base_url,
+        'DATABASE_PATH': os.path.join(tmp, f"bot-{time.monotonic_ns()}.db"),
+        'BOT_MODE': 'polling',
+        'LOG_FILE': '',
+        'LOG_LEVEL': 'INFO',
+    }
+    for name in ('RENDER', 'RENDER_EXTERNAL_URL', 'PROFILING', 'ADMIN_ID'):
+        env.pop(name, None)
+
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, 'main.py',
+        cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    result = {}
+    try:
+        async def read_log():
+            async for raw in process.stdout:
+                match = TTFU_RE.search(raw.decode(errors='replace'))
+                if match:
+                    return float(match.group(1)), match.group(2)
+            raise RuntimeError(f"main.py exited with code {await process.wait()}")
+
+        ttfu, phases = await asyncio.wait_for(read_log(), timeout)
+        result['ttfu_s'] = ttfu
+        result['phases'] = {name: float(value) for name, value in PHASE_RE.findall(phases)}
+
+        # Ответ на /start - последний шаг, который видит пользователь
+        while not telegram.sent:
+            await asyncio.sleep(0.01)
+        result['first_reply_s'] = round(telegram.sent[0][0] - started, 3)
+    finally:
+        if process.returncode is None:
+            process.terminate()
+            await process.wait()
+        await telegram.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top-imports', type=int, default=10)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--max-ttfu', type=float, help='порог медианы, сек')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='cold-start-')
+    runs = [asyncio.run(boot_once(tmp, args.timeout)) for _ in range(args.runs)]
+    median = statistics.median(run['ttfu_s'] for run in runs)
+
+    print(json.dumps({
+        'imports': import_profile(args.top_imports),
+        'runs': runs,
+        'ttfu_median_s': round(median, 3),
+        'first_reply_median_s': round(statistics.median(run['first_reply_s'] for run in runs), 3),
+    }, ensure_ascii=False, indent=2))
+
+    if args.max_ttfu is not None and median > args.max_ttfu:
+        print(f"time to first update {median:.2f}s exceeds {args.max_ttfu:.2f}s", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Сквозной бенчмарк: цикл рассылки, /check и фильтрация
+
+Поднимает локальные фиктивные GNews и Telegram Bot API, заполняет SQLite
+синтетическими пользователями, подписками и фильтрами и прогоняет
+настоящие SchedulerService, CheckService и NewsFilter. Каждый масштаб
+выполняется в отдельном процессе, чтобы пиковый RSS был честным.
+Результат - JSON для сравнения прогонов.
+
+Запуск:
+    python -m benchmarks.e2e --output e2e.json
+    python -m benchmarks.e2e --scales 100 10000 100000 --output e2e.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+from contextlib import closing
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.fake_gnews import NOISE_WORDS, FakeGNewsServer
+from benchmarks.fake_telegram import FakeTelegramServer
+from config import CheckConfig, Config, DatabaseConfig, GNewsConfig, RenderConfig, SchedulerConfig
+from database.database import Database
+from services.check_service import CheckService
+from services.news_filter import NewsFilter
+from services.news_service import NewsService
+from services.scheduler_service import SchedulerService
+from utils.metrics import DB_QUERY_SECONDS
+
+
+async def seed(db_path: str, subscriptions: int, per_user: int, seed_value: int) -> dict:
+    """Заполнить БД: per_user подписок на пользователя, часть с фильтрами"""
+    await Database(db_path).init_db()
+
+    rng = random.Random(seed_value)
+    users = max(1, subscriptions // per_user)
+    companies = max(per_user * 2, subscriptions // 50)
+
+    user_rows = [(user_id, f"user{user_id}") for user_id in range(1, users + 1)]
+    subscription_rows = []
+    for user_id, _ in user_rows:
+        for company_idx in rng.sample(range(companies), per_user):
+            exclude, include = [], []
+            roll = rng.random()
+            if roll < 0.3:
+                exclude = [rng.choice(NOISE_WORDS)]
+            elif roll < 0.4:
+                include = ['выручки']
+            subscription_rows.append((
+                user_id,
+                f"Company{company_idx}",
+                json.dumps(exclude, ensure_ascii=False),
+                json.dumps(include, ensure_ascii=False)
+            ))
+
+    # Соединение закрывается явно: копия для /check не должна зависеть от WAL-файла
+    with closing(sqlite3.connect(db_path)) as db, db:
+        db.executemany('INSERT INTO users (user_id, username) VALUES (?, ?)', user_rows)
+        db.executemany(
+            '''INSERT INTO subscriptions (user_id, company_name, exclude_keywords, include_keywords)
+               VALUES (?, ?, ?, ?)''',
+            subscription_rows
+        )
+
+    return {'users': users, 'companies': companies, 'subscriptions': len(subscription_rows)}
+
+
+def db_ops() -> tuple:
+    """(вызовов методов Database, суммарное время в них)"""
+    return DB_QUERY_SECONDS.totals()
+
+
+def make_config(db_path: str, gnews_url: str) -> Config:
+    return Config(
+        tg_bot=None,
+        gnews=GNewsConfig(api_key='bench', base_url=gnews_url, cache_ttl=3600, daily_quota=10 ** 9),
+        database=DatabaseConfig(path=db_path),
+        scheduler=SchedulerConfig(check_interval=3600, worker_id='bench'),
+        render=RenderConfig(port=0, external_url=None, is_render=False),
+        check=CheckConfig(cooldown=0, concurrency=4)
+    )
+
+
+async def bench_cycle(db_path, gnews, telegram, bot):
+    """Полный цикл SchedulerService по всем компаниям"""
+    config = make_config(db_path, f"{gnews.base_url}/api/v4/search")
+    service = SchedulerService(bot, Database(db_path), NewsService(config.gnews), config)
+    service.SEND_DELAY = 0
+
+    calls_before, sent_before = gnews.calls, len(telegram.sent)
+    ops_before, db_seconds_before = db_ops()
+    started = time.perf_counter()
+    await service.check_and_send_news(force=True)
+    elapsed = time.perf_counter() - started
+    ops_after, db_seconds_after = db_ops()
+    sent = len(telegram.sent) - sent_before
+
+    return {
+        'seconds': round(elapsed, 3),
+        'gnews_calls': gnews.calls - calls_before,
+        'sent': sent,
+        'sends_per_sec': round(sent / elapsed, 1) if elapsed else None,
+        'db_ops': ops_after - ops_before,
+        'db_seconds': round(db_seconds_after - db_seconds_before, 3),
+        'stats': service.last_cycle_stats,
+    }, service.news_service
+
+
+async def bench_check(db_path, gnews, telegram, bot, users: int, sample: int) -> dict:
+    """/check для выборки пользователей на холодном кэше"""
+    config = make_config(db_path, f"{gnews.base_url}/api/v4/search")
+    check_service = CheckService(Database(db_path), NewsService(config.gnews), config.check)
+    check_service.SEND_DELAY = 0
+
+    user_ids = random.Random(1).sample(range(1, users + 1), min(sample, users))
+    calls_before, sent_before = gnews.calls, len(telegram.sent)
+    ops_before, _ = db_ops()
+    latencies = []
+    for user_id in user_ids:
+        started = time.perf_counter()
+        check_service.try_start(user_id)
+        await check_service.check(
+            user_id,
+            lambda text, reply_markup, chat_id=user_id: bot.send_message(
+                chat_id, text, reply_markup=reply_markup
+            )
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+    ops_after, _ = db_ops()
+
+    latencies.sort()
+    return {
+        'users': len(user_ids),
+        'p50_ms': round(statistics.median(latencies), 1),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1 if len(latencies) > 1 else 0], 1),
+        'gnews_calls': gnews.calls - calls_before,
+        'sent': len(telegram.sent) - sent_before,
+        'db_ops': ops_after - ops_before,
+    }
+
+
+def bench_filter(db_path: str, news_service: NewsService) -> dict:
+    """Персональные фильтры подписок по статьям из кэша цикла"""
+    with sqlite3.connect(db_path) as db:
+        rows = db.execute(
+            'SELECT company_name, exclude_keywords, include_keywords FROM subscriptions'
+        ).fetchall()
+
+    articles_by_company = news_service.cached_articles()
+
+    news_filter = NewsFilter()
+    checks = 0
+    kept = 0
+    started = time.perf_counter()
+    for company_name, exclude_json, include_json in rows:
+        exclude, include = json.loads(exclude_json), json.loads(include_json)
+        for article in articles_by_company.get(company_name, ()):
+            checks += 1
+            if news_filter.is_relevant(article, company_name, exclude, include):
+                news_filter.calculate_relevance_score(article, company_name)
+                kept += 1
+    elapsed = time.perf_counter() - started
+
+    return {
+        'checks': checks,
+        'kept': kept,
+        'seconds': round(elapsed, 3),
+        'checks_per_sec': round(checks / elapsed) if elapsed else None,
+    }
+
+
+async def run_scale(subscriptions: int, args) -> dict:
+    tmp = tempfile.mkdtemp(prefix='e2e-')
+    db_path = os.path.join(tmp, 'bench.db')
+    check_db_path = os.path.join(tmp, 'check.db')
+
+    started = time.perf_counter()
+    dataset = await seed(db_path, subscriptions, args.per_user, args.seed)
+    # /check работает на копии, чтобы не помечать статьи отправленными до цикла
+    shutil.copy(db_path, check_db_path)
+    seed_seconds = time.perf_counter() - started
+
+    gnews = FakeGNewsServer(
+        latency=args.gnews_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+    telegram = FakeTelegramServer(
+        latency=args.tg_latency,
+        error_rate=args.error_rate,
+        retry_after_rate=args.retry_after_rate,
+        seed=args.seed
+    )
+    await gnews.start()
+    base_url = await telegram.start()
+    bot = Bot('42:bench', session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+
+    try:
+        check = await bench_check(
+            check_db_path, gnews, telegram, bot, dataset['users'], args.check_users
+        )
+        cycle, news_service = await bench_cycle(db_path, gnews, telegram, bot)
+        filtering = bench_filter(db_path, news_service)
+    finally:
+        await bot.session.close()
+        await telegram.stop()
+        await gnews.stop()
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {
+        'scale': subscriptions,
+        'dataset': dataset,
+        'seed_seconds': round(seed_seconds, 2),
+        'cycle': cycle,
+        'check': check,
+        'filter': filtering,
+        'gnews_errors': gnews.errors,
+        'telegram_errors': telegram.errors,
+        # ru_maxrss в Linux - в килобайтах
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def scale_process(subscriptions: int, args, queue):
+    queue.put(asyncio.run(run_scale(subscriptions, args)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 10000],
+                        help='число подписок (100000 - только явно: долгий прогон)')
+    parser.add_argument('--per-user', type=int, default=5)
+    parser.add_argument('--check-users', type=int, default=20)
+    parser.add_argument('--gnews-latency', type=float, default=0.05)
+    parser.add_argument('--tg-latency', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='доля 429 от GNews')
+    parser.add_argument('--retry-after-rate', type=float, default=0.0, help='доля 429 от Telegram')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для JSON (по умолчанию stdout)')
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    results = []
+    for subscriptions in args.scales:
+        queue = ctx.Queue()
+        process = ctx.Process(target=scale_process, args=(subscriptions, args, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    report = {
+        'params': vars(args),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            output.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Проверка дозагрузки полного текста на локальном HTTP-сервере с фикстурами
+
+Поднимает aiohttp-сервер со страницами разных видов (статья с меню и
+скриптами, страница в windows-1251, огромная и медленная страницы,
+картинка, 404) и проверяет ArticleEnricher и пересчет оценки в
+NewsService: извлечение текста, лимиты на сайт и на пул, ограничение
+объема, дисковый кэш, исключения по полному тексту. Печатает результат
+каждой проверки; код выхода 1, если какая-то не прошла.
+
+Запуск:
+    python -m benchmarks.enrichment_check
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.checks import Checks
+from config import EnrichmentConfig, GNewsConfig
+from services.enrichment import ArticleEnricher
+from services.news_providers import NewsProvider
+from services.news_service import NewsService
+
+COMPANY = 'Яндекс'
+
+ARTICLE_PAGE = f'''<!doctype html><html><head><title>t</title>
+<script>var menu = "{COMPANY} такси реклама";</script><style>p {{color: red}}</style></head>
+<body><header><nav>{COMPANY} Такси | Маркет | Музыка</nav></header>
+<article><h1>Итоги квартала</h1>
+<p>Компания {COMPANY} отчиталась о росте выручки на 40% &mdash; до 200 млрд рублей.</p>
+<p>Аналитики отмечают, что {COMPANY} увеличила долю рекламного бизнеса.
+<p>По словам финансового директора, {COMPANY} сохранит прогноз на год.</p>
+</article><footer>© {COMPANY}</footer></body></html>'''
+
+EXCLUDED_PAGE = f'''<html><body>
+<p>Компания {COMPANY} запустила новый тариф в приложении такси для бизнеса.</p>
+<p>Сервис будет доступен в крупных городах с сентября.</p></body></html>'''
+
+OFFTOPIC_PAGE = '''<html><body>
+<p>Индексы завершили день разнонаправленно: нефть подешевела, рубль укрепился.</p>
+<p>Инвесторы ждут решения по ключевой ставке в пятницу.</p></body></html>'''
+
+
+class FixtureServer:
+    """Страницы для проверки и учет одновременных запросов"""
+
+    def __init__(self):
+        self.app = web.Application()
+        self.app.router.add_get('/article/{name}', self.article)
+        self.app.router.add_get('/cp1251', self.cp1251)
+        self.app.router.add_get('/huge', self.huge)
+        self.app.router.add_get('/slow/{idx}', self.slow)
+        self.app.router.add_get('/image', self.image)
+        self.runner: Optional[web.AppRunner] = None
+        self.port = 0
+        self.hits: Dict[str, int] = {}
+        self.active: Dict[str, int] = {}
+        self.max_active: Dict[str, int] = {}
+        self.huge_bytes_sent = 0
+
+    async def start(self):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+
+    async def stop(self):
+        await self.runner.cleanup()
+
+    def url(self, path: str, host: str = '127.0.0.1') -> str:
+        return f"http://{host}:{self.port}{path}"
+
+    def _hit(self, request: web.Request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+
+    async def article(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        pages = {'good': ARTICLE_PAGE, 'excluded': EXCLUDED_PAGE, 'offtopic': OFFTOPIC_PAGE}
+        name = request.match_info['name']
+        if name not in pages:
+            return web.Response(status=404)
+        return web.Response(text=pages[name], content_type='text/html')
+
+    async def cp1251(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        body = f'<html><body><p>{COMPANY} открыла офис в Казани.</p></body></html>'
+        return web.Response(
+            body=body.encode('cp1251'),
+            headers={'Content-Type': 'text/html; charset=windows-1251'}
+        )
+
+    async def huge(self, request: web.Request) -> web.StreamResponse:
+        """10 МБ абзацев: клиент должен остановиться на лимите"""
+        self._hit(request)
+        response = web.StreamResponse(headers={'Content-Type': 'text/html; charset=utf-8'})
+        await response.prepare(request)
+        chunk = (f'<p>{COMPANY} ' + 'х' * 1000 + '</p>').encode() * 16
+        try:
+            for _ in range(10 * 1024 * 1024 // len(chunk)):
+                await response.write(chunk)
+                self.huge_bytes_sent += len(chunk)
+                await asyncio.sleep(0.001)
+        except (ConnectionResetError, ConnectionError):
+            pass
+        return response
+
+    async def slow(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        host = request.host.split(':')[0]
+        self.active[host] = self.active.get(host, 0) + 1
+        self.active['*'] = self.active.get('*', 0) + 1
+        for key in (host, '*'):
+            self.max_active[key] = max(self.max_active.get(key, 0), self.active[key])
+        try:
+            await asyncio.sleep(0.2)
+            return web.Response(
+                text=f"<p>{COMPANY}: страница {request.match_info['idx']}</p>",
+                content_type='text/html'
+            )
+        finally:
+            self.active[host] -= 1
+            self.active['*'] -= 1
+
+    async def image(self, request: web.Request) -> web.Response:
+        self._hit(request)
+        return web.Response(body=b'\x89PNG', content_type='image/png')
+
+
+class FixtureProvider(NewsProvider):
+    """Источник со статьями, ссылающимися на фикстуры"""
+
+    name = 'fixture'
+
+    def __init__(self, articles: List[Dict]):
+        super().__init__()
+        self.articles = articles
+
+    async def fetch(self, company_name: str, fetch_count: int):
+        return self.articles
+
+
+def snippet(url: str, title: str, description: str) -> Dict:
+    return {
+        'title': title,
+        'description': description,
+        'content': description[:60],
+        'url': url,
+        'publishedAt': '2024-01-01T00:00:00Z',
+        'source': {'name': 'Fixture'},
+    }
+
+
+async def run_checks(checks: Checks):
+    server = FixtureServer()
+    await server.start()
+    cache_dir = tempfile.mkdtemp(prefix='enrichment-')
+    config = EnrichmentConfig(
+        enabled=True, concurrency=3, per_host=2, max_bytes=64 * 1024,
+        max_chars=5000, timeout=5, cache_dir=cache_dir
+    )
+    enricher = ArticleEnricher(config)
+
+    try:
+        text = await enricher.full_text(server.url('/article/good'))
+        checks.check(
+            'article text extracted without menu, scripts and footer',
+            bool(text) and 'рекламного бизнеса' in text and 'такси' not in text.lower()
+            and 'Маркет' not in text and '©' not in text,
+            repr(text[:80]) if text else text
+        )
+        checks.check('unclosed <p> split into paragraphs', bool(text) and text.count('\n') == 2)
+
+        again = await enricher.full_text(server.url('/article/good'))
+        checks.check(
+            'second request served from disk cache',
+            again == text and server.hits.get('/article/good') == 1,
+            f"hits={server.hits.get('/article/good')}"
+        )
+
+        text = await enricher.full_text(server.url('/cp1251'))
+        checks.check('windows-1251 page decoded', bool(text) and 'открыла офис' in text, repr(text))
+
+        started = time.perf_counter()
+        text = await enricher.full_text(server.url('/huge'))
+        elapsed = time.perf_counter() - started
+        checks.check(
+            'huge page cut at max_chars without reading it all',
+            bool(text) and len(text) <= config.max_chars and server.huge_bytes_sent < 1024 * 1024,
+            f"chars={len(text or '')}, server sent {server.huge_bytes_sent} bytes in {elapsed:.2f}s"
+        )
+
+        checks.check('image is not enriched', await enricher.full_text(server.url('/image')) is None)
+        checks.check('404 is not enriched', await enricher.full_text(server.url('/article/gone')) is None)
+        await enricher.full_text(server.url('/article/gone'))
+        checks.check(
+            'failed page not retried',
+            server.hits.get('/article/gone') == 1,
+            f"hits={server.hits.get('/article/gone')}"
+        )
+
+        urls = [server.url(f'/slow/{idx}', host) for host in ('127.0.0.1', 'localhost')
+                for idx in range(6)]
+        started = time.perf_counter()
+        texts = await asyncio.gather(*(enricher.full_text(url) for url in urls))
+        elapsed = time.perf_counter() - started
+        checks.check(
+            'per-host and pool limits respected',
+            all(texts) and server.max_active.get('127.0.0.1') == 2
+            and server.max_active.get('localhost') == 2 and server.max_active.get('*') == 3,
+            f"max active {server.max_active}, {elapsed:.2f}s"
+        )
+
+        # Пересчет оценки в NewsService: компания упоминается не в начале
+        # описания, у всех трех статей оценка 0.3 - ровно на пороге
+        articles = [
+            snippet(server.url('/article/good'), 'Итоги квартала', f'Выручка компании {COMPANY} выросла'),
+            snippet(server.url('/article/excluded'), 'Новый тариф', f'Новый тариф запустила {COMPANY}'),
+            snippet(server.url('/article/offtopic'), 'Обзор рынка', f'Рынок и компания {COMPANY}: итоги'),
+        ]
+        gnews_config = GNewsConfig(api_key='check', cache_ttl=0)
+        plain = NewsService(gnews_config, providers=[FixtureProvider(articles)])
+        enriched = NewsService(gnews_config, providers=[FixtureProvider(articles)], enricher=enricher)
+
+        kwargs = dict(max_results=5, exclude_keywords=['такси'], min_relevance_score=0.3)
+        before = {a['url'].rsplit('/', 1)[1]: a['_relevance_score']
+                  for a in await plain.fetch_news(COMPANY, **kwargs)}
+        after = {a['url'].rsplit('/', 1)[1]: a['_relevance_score']
+                 for a in await enriched.fetch_news(COMPANY, **kwargs)}
+        checks.check(
+            'exclude keyword found in full text',
+            'excluded' in before and 'excluded' not in after,
+            f"before={before}, after={after}"
+        )
+        checks.check(
+            'article without company mentions demoted',
+            'offtopic' in before and 'offtopic' not in after
+        )
+        checks.check(
+            'relevant article promoted',
+            after.get('good', 0) > before.get('good', 0)
+        )
+    finally:
+        await server.stop()
+
+
+def main():
+    checks = Checks()
+    asyncio.run(run_checks(checks))
+    sys.exit(1 if checks.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+Проверка рекомендуемых исключений по статистике статей
+
+Пропускает через ExclusionAdvisor поток синтетических ответов источников
+по многим компаниям: статьи о компании (компания в начале заголовка) и
+статьи, где она упоминается вскользь, со своими для каждой компании
+"шумовыми" словами; общие слова встречаются в обеих группах. Проверяется,
+что рекомендации состоят из шумовых слов компании, появляются у новой
+компании без пересчета по архиву, обновляются при появлении нового шума,
+что снимки нескольких процессов складываются, а статистика компании в БД
+не превышает max_terms слов. Для новой установки проверяется, что
+NewsService.suggest_exclusions не обращается к источникам, а для
+популярной компании без статистики отдает запасной список. Печатает скорость учета статей и задержку
+рекомендаций без кэша (одно чтение из БД). Код выхода 1, если какая-то
+проверка не прошла.
+
+Запуск:
+    python -m benchmarks.exclusions_check --companies 200 --fetches 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from benchmarks.checks import Checks
+from config import ExclusionsConfig, GNewsConfig
+from database.database import Database
+from services.exclusions import ExclusionAdvisor
+from services.news_filter import NewsFilter
+from services.news_providers import NewsProvider
+from services.news_service import NewsService
+
+GENERIC = ['рынок', 'инвесторы', 'сегодня', 'эксперты', 'россии', 'данные', 'итоги',
+           'неделя', 'рост', 'участники', 'мнение', 'проект']
+FINANCE = ['выручка', 'прибыль', 'квартал', 'дивиденды', 'отчетность', 'капитализация',
+           'облигации', 'аналитики', 'прогноз', 'акционеры']
+YANDEX_NOISE = ['такси', 'карты', 'маркет', 'музыка', 'браузер', 'доставка']
+
+
+class Corpus:
+    """Синтетические ответы источников по компаниям"""
+
+    def __init__(self, companies: int, seed: int = 1):
+        self.random = random.Random(seed)
+        self.noise = {'Яндекс': list(YANDEX_NOISE)}
+        for idx in range(companies):
+            self.noise[f"Компания{idx}"] = [self.make_word() for _ in range(6)]
+        self.counter = 0
+
+    def make_word(self) -> str:
+        return ''.join(self.random.choice('бвгдклмнпрст') + self.random.choice('аеиоу') for _ in range(4))
+
+    def fetch(self, company: str, count: int = 30) -> list:
+        rng = self.random
+        articles = []
+        for _ in range(count):
+            self.counter += 1
+            # Общие слова одинаково часты в обеих группах
+            generic = rng.sample(GENERIC, 4)
+            if rng.random() < 0.35:
+                words = rng.sample(FINANCE, 2)
+                title = f"{company}: {words[0]} {generic[0]} {generic[1]}"
+                description = f"{company} {words[1]} {generic[2]} {generic[3]}"
+            else:
+                noise = rng.sample(self.noise[company], min(2, len(self.noise[company])))
+                title = f"{noise[0].capitalize()} {generic[0]} {generic[1]}"
+                description = f"{noise[-1]} {generic[2]} {generic[3]}, сообщает {company}"
+            articles.append({
+                'title': title,
+                'description': description,
+                'url': f"https://news.local/{self.counter}",
+            })
+        return articles
+
+
+class CorpusProvider(NewsProvider):
+    """Источник, отвечающий статьями синтетического корпуса"""
+
+    name = 'corpus'
+
+    def __init__(self, corpus: Corpus):
+        super().__init__()
+        self.corpus = corpus
+        self.requests = 0
+
+    async def fetch(self, company_name: str, fetch_count: int):
+        self.requests += 1
+        return self.corpus.fetch(company_name, fetch_count) if company_name in self.corpus.noise else []
+
+
+def precision(suggestions: list, noise: list) -> float:
+    return sum(word in noise for word in suggestions) / len(suggestions) if suggestions else 0.0
+
+
+async def run(args, checks: Checks):
+    config = ExclusionsConfig(cache_ttl=0, max_terms=args.max_terms, max_pending=args.max_pending)
+    corpus = Corpus(args.companies)
+    companies = list(corpus.noise)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        db = Database(db_path)
+        await db.init_db()
+
+        # Два процесса (бот и воркер) пишут в одну БД
+        bot_advisor = ExclusionAdvisor(db, config)
+        worker_advisor = ExclusionAdvisor(db, config)
+
+        checks.check('no stats -> no suggestions', await bot_advisor.suggest('Яндекс') == [])
+
+        observed = 0
+        elapsed = 0.0
+        for round_idx in range(args.fetches):
+            for idx, company in enumerate(companies):
+                advisor = bot_advisor if idx % 2 else worker_advisor
+                articles = corpus.fetch(company)
+                started = time.perf_counter()
+                advisor.observe(company, articles)
+                elapsed += time.perf_counter() - started
+                observed += len(articles)
+            await bot_advisor.snapshot()
+            await worker_advisor.snapshot()
+        print(f"     observe: {observed / elapsed:,.0f} articles/s, "
+              f"{bot_advisor.snapshots + worker_advisor.snapshots} snapshots in {args.fetches} rounds")
+
+        suggestions = await bot_advisor.suggest('Яндекс')
+        checks.check('Яндекс suggestions are its noise words',
+                     precision(suggestions, YANDEX_NOISE) == 1.0 and len(suggestions) >= 4,
+                     ', '.join(suggestions))
+
+        # Холодный процесс: только чтение статистики из БД
+        cold = ExclusionAdvisor(db, config)
+        timings = []
+        precisions = []
+        for company in companies:
+            started = time.perf_counter()
+            suggested = await cold.suggest(company)
+            timings.append((time.perf_counter() - started) * 1000)
+            precisions.append(precision(suggested, corpus.noise[company]))
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        mean_precision = sum(precisions) / len(precisions)
+        checks.check('suggestions for every company are noise words', mean_precision >= 0.95,
+                     f"precision {mean_precision:.2f} over {len(companies)} companies")
+        checks.check('suggestions without cache are instant', p99 <= args.max_ms,
+                     f"p50={timings[len(timings) // 2]:.2f} ms p99={p99:.2f} ms")
+        # Общее слово может случайно пройти порог значимости у отдельных
+        # компаний: проверяем долю таких рекомендаций
+        suggested = [word for company in companies for word in await cold.suggest(company)]
+        common = [word for word in suggested if word in GENERIC or word in FINANCE]
+        checks.check('generic and finance words rarely suggested',
+                     len(common) <= 0.02 * len(suggested),
+                     f"{len(common)} of {len(suggested)} suggestions")
+
+        with sqlite3.connect(db_path) as conn:
+            docs = conn.execute(
+                "SELECT low_docs + high_docs FROM exclusion_docs WHERE company_name = 'яндекс'"
+            ).fetchone()[0]
+            max_rows = conn.execute(
+                'SELECT MAX(n) FROM (SELECT COUNT(*) AS n FROM exclusion_terms GROUP BY company_name)'
+            ).fetchone()[0]
+        checks.check('snapshots from two processes add up', docs == args.fetches * 30,
+                     f"{docs:.0f} of {args.fetches * 30} articles")
+        checks.check('stored terms per company bounded', max_rows <= args.max_terms,
+                     f"max {max_rows} rows")
+
+        # Новый шум: слово появляется в рекомендациях после очередного снимка
+        corpus.noise['Яндекс'] = ['самокаты']
+        for _ in range(3):
+            worker_advisor.observe('Яндекс', corpus.fetch('Яндекс'))
+        await worker_advisor.snapshot()
+        refreshed = await bot_advisor.suggest('Яндекс', limit=20)
+        checks.check('new noise word appears without recomputation', 'самокаты' in refreshed,
+                     ', '.join(refreshed))
+
+        checks.check('pending counters flushed',
+                     bot_advisor.status()['pending_terms'] == 0 and worker_advisor.status()['pending_terms'] == 0)
+
+    # Новая установка: статистики нет ни по одной компании
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'fresh.db'))
+        await db.init_db()
+        advisor = ExclusionAdvisor(db, config)
+        provider = CorpusProvider(corpus)
+        news_service = NewsService(
+            GNewsConfig(api_key='bench'), archive=db, providers=[provider], exclusions=advisor
+        )
+
+        started = time.perf_counter()
+        unknown = await news_service.suggest_exclusions('Компания0')
+        fallback = await news_service.suggest_exclusions('Google')
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        checks.check('stats miss answered without source requests',
+                     provider.requests == 0 and unknown == [],
+                     f"{provider.requests} requests, {elapsed_ms:.1f} ms for two suggestions")
+        checks.check('popular company without stats gets fallback list',
+                     fallback == NewsFilter.get_common_exclusions('Google'), ', '.join(fallback))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--fetches', type=int, default=20, help='ответов на компанию')
+    parser.add_argument('--max-terms', type=int, default=24)
+    parser.add_argument('--max-pending', type=int, default=1000)
+    parser.add_argument('--max-ms', type=float, default=20)
+    args = parser.parse_args()
+    checks = Checks()
+    asyncio.run(run(args, checks))
+    sys.exit(1 if checks.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
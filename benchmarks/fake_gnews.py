@@ -0,0 +1,113 @@
+"""
+Локальная замена GNews API (/api/v4/search) для бенчмарков
+
+Статьи детерминированы по запросу: часть упоминает компанию в заголовке,
+часть - только в тексте, часть содержит типичные слова-исключения, так
+что фильтры и оценка релевантности работают как на реальных данных.
+Можно задать задержку ответа, долю ошибок 5xx и ответов 429.
+"""
+import asyncio
+import hashlib
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+# Слова, по которым пользователи бенчмарка ставят исключения
+NOISE_WORDS = ('такси', 'карты', 'браузер', 'музыка', 'маркет', 'реклама')
+
+
+class FakeGNewsServer:
+    """Фиктивный GNews на aiohttp"""
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            rate_limit_rate: float = 0.0,
+            articles: int = 6,
+            seed: int = 0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.articles = articles
+        self.random = random.Random(seed)
+
+        self.app = web.Application()
+        self.app.router.add_get('/api/v4/search', self.search)
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+        self.calls = 0
+        self.errors = 0
+        # Номер «выпуска» новостей: увеличение дает новые URL статей
+        self.edition = 0
+
+    async def start(self, port: int = 0) -> str:
+        """Запустить сервер, вернуть URL для GNewsConfig.base_url"""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return f"{self.base_url}/api/v4/search"
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            self.errors += 1
+            return web.json_response(
+                {'errors': ['You have reached your request limit for today']}, status=429
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            return web.json_response({'errors': ['Internal error']}, status=500)
+
+        query = request.query.get('q', '')
+        limit = int(request.query.get('max', 10))
+        articles = self.make_articles(query)[:limit]
+        return web.json_response({'totalArticles': len(articles), 'articles': articles})
+
+    def make_articles(self, query: str) -> List[Dict]:
+        """Статьи по запросу для текущего выпуска"""
+        digest = int(hashlib.md5(f"{query}:{self.edition}".encode()).hexdigest(), 16)
+        published = datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=digest % 100000)
+
+        articles = []
+        for idx in range(self.articles):
+            noise = NOISE_WORDS[(digest >> idx) % len(NOISE_WORDS)]
+            kind = idx % 3
+            if kind == 0:
+                # Компания в начале заголовка - высокая релевантность
+                title = f"{query} отчиталась о росте выручки"
+                description = f"{query} опубликовала результаты квартала"
+            elif kind == 1:
+                # Упоминание в тексте и шумовое слово - проверка исключений
+                title = f"Новый сервис {noise} запущен"
+                description = f"Сервис {noise} от {query} стал доступен пользователям"
+            else:
+                # Компания почти не упоминается - отсекается порогом
+                title = f"Рынок акций: обзор дня, выпуск {idx}"
+                description = f"Индексы завершили день разнонаправленно"
+
+            articles.append({
+                'title': title,
+                'description': description,
+                'content': f"{description}. Подробности в материале.",
+                'url': f"https://news.local/{digest:x}/{self.edition}/{idx}",
+                'image': None,
+                'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'source': {'name': 'Fake News', 'url': 'https://news.local'},
+            })
+        return articles
@@ -0,0 +1,190 @@
+"""
+Локальная замена Telegram Bot API для бенчмарков
+
+Поддерживает методы, которые использует бот: getMe, getUpdates (long
+polling), setWebhook/deleteWebhook (с доставкой апдейтов в webhook),
+sendMessage, editMessageText, deleteMessage, answerCallbackQuery.
+Можно задать задержку ответа, долю ошибок 5xx и ответов 429.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+BOT_INFO = {'id': 1, 'is_bot': True, 'first_name': 'Fake', 'username': 'fake_bot'}
+
+
+class FakeTelegramServer:
+    """Фиктивный Bot API на aiohttp"""
+
+    def __init__(
+            self,
+            latency: float = 0.0,
+            error_rate: float = 0.0,
+            retry_after_rate: float = 0.0,
+            seed: int = 0
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after_rate = retry_after_rate
+        self.random = random.Random(seed)
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ''
+
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._updates: List[Dict] = []
+        self._updates_event = asyncio.Event()
+        self._webhook: Optional[Tuple[str, str]] = None
+        self._client: Optional[aiohttp.ClientSession] = None
+
+        self.sent: List[Tuple[float, int, str]] = []  # (время, chat_id, текст)
+        self.calls: Dict[str, int] = {}
+        self.errors = 0
+
+    async def start(self, port: int = 0) -> str:
+        """Запустить сервер, вернуть базовый URL"""
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        self._client = aiohttp.ClientSession()
+        return self.base_url
+
+    async def stop(self):
+        if self._client:
+            await self._client.close()
+        if self.runner:
+            await self.runner.cleanup()
+
+    def push_message(self, chat_id: int, text: str) -> int:
+        """Сымитировать входящее сообщение пользователя"""
+        update_id = next(self._update_ids)
+        update = {
+            'update_id': update_id,
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': f"user{chat_id}"},
+                'text': text,
+                **(
+                    {'entities': [{'type': 'bot_command', 'offset': 0,
+                                   'length': len(text.split()[0])}]}
+                    if text.startswith('/') else {}
+                ),
+            }
+        }
+
+        if self._webhook:
+            asyncio.create_task(self._deliver_webhook(update))
+        else:
+            self._updates.append(update)
+            self._updates_event.set()
+        return update_id
+
+    async def _deliver_webhook(self, update: Dict):
+        url, secret = self._webhook
+        await asyncio.sleep(self.latency)
+        async with self._client.post(
+                url,
+                json=update,
+                headers={'X-Telegram-Bot-Api-Secret-Token': secret}
+        ) as response:
+            await response.read()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        self.calls[method] = self.calls.get(method, 0) + 1
+        params = await self._params(request)
+
+        if method in ('sendMessage', 'editMessageText'):
+            roll = self.random.random()
+            if roll < self.retry_after_rate:
+                self.errors += 1
+                return self._error(429, 'Too Many Requests: retry after 1', retry_after=1)
+            if roll < self.retry_after_rate + self.error_rate:
+                self.errors += 1
+                return self._error(500, 'Internal Server Error')
+
+        handler = getattr(self, f"_method_{method}", None)
+        response = await handler(params) if handler else self._ok(True)
+
+        # Задержка сети на обратном пути
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return response
+
+    @staticmethod
+    async def _params(request: web.Request) -> Dict[str, Any]:
+        if request.content_type == 'application/json':
+            return await request.json()
+        # aiogram отправляет строки как есть, а вложенные объекты - в JSON
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str) and value[:1] in ('[', '{'):
+                value = json.loads(value)
+            params[key] = value
+        return params
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'ok': True, 'result': result})
+
+    @staticmethod
+    def _error(code: int, description: str, retry_after: Optional[int] = None) -> web.Response:
+        payload = {'ok': False, 'error_code': code, 'description': description}
+        if retry_after is not None:
+            payload['parameters'] = {'retry_after': retry_after}
+        return web.json_response(payload, status=code)
+
+    def _message(self, chat_id: int, text: str) -> Dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'},
+            'from': BOT_INFO,
+            'text': text,
+        }
+
+    async def _method_getMe(self, params):
+        return self._ok(BOT_INFO)
+
+    async def _method_getUpdates(self, params):
+        offset = int(params.get('offset') or 0)
+        self._updates = [u for u in self._updates if u['update_id'] >= offset]
+        if not self._updates:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(
+                    self._updates_event.wait(),
+                    timeout=float(params.get('timeout') or 0)
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self._ok(self._updates[:int(params.get('limit') or 100)])
+
+    async def _method_setWebhook(self, params):
+        self._webhook = (params['url'], params.get('secret_token', ''))
+        return self._ok(True)
+
+    async def _method_deleteWebhook(self, params):
+        self._webhook = None
+        return self._ok(True)
+
+    async def _method_sendMessage(self, params):
+        self.sent.append((time.perf_counter(), int(params['chat_id']), params['text']))
+        return self._ok(self._message(params['chat_id'], params['text']))
+
+    async def _method_editMessageText(self, params):
+        return self._ok(self._message(params.get('chat_id', 0), params['text']))
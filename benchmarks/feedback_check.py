@@ -0,0 +1,165 @@
+"""
+Проверка подстройки релевантности по оценкам 👍/👎
+
+Подписчик получает статьи двух тем с одинаковой базовой оценкой (компания
+упоминается в конце описания): отчетность, которую он отмечает 👍, и
+городские новости (такси, погода), которые он отмечает 👎. Оценки идут
+через FeedbackService.record, как из кнопок бота. Проверяется, что после
+нескольких оценок новые статьи второй темы перестают проходить
+персональный порог, а первой - проходят; что модель сохраняется в БД,
+повторная оценка не учитывается, а callback_data помещается в лимит
+Telegram. Печатает время оценки статьи моделью после 0, 100 и 10000
+оценок: оно зависит только от признаков статьи. Код выхода 1, если
+какая-то проверка не прошла.
+
+Запуск:
+    python -m benchmarks.feedback_check --votes 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.checks import Checks
+from config import FeedbackConfig
+from database.database import DEFAULT_MIN_RELEVANCE, Database
+from services.feedback import (
+    DUPLICATE, SAVED, FeedbackService, RelevanceModel, article_features, company_tag,
+    feedback_callback_data, feedback_keys,
+)
+from services.news_filter import NewsFilter
+from utils.urls import url_hash
+
+COMPANY = 'Яндекс'
+USER_ID = 1
+
+FINANCE = ['выручка', 'прибыль', 'квартал', 'дивиденды', 'акции', 'отчетность',
+           'инвесторы', 'рост', 'капитализация', 'облигации', 'аналитики', 'прогноз']
+CITY = ['такси', 'погода', 'пробки', 'метро', 'водитель', 'маршрут', 'дожди',
+        'заказ', 'поездка', 'тариф', 'курьер', 'доставка']
+
+
+def make_article(topic: list, idx: int, rng: random.Random) -> dict:
+    words = rng.sample(topic, 6)
+    return {
+        'title': f"{words[0].capitalize()} и {words[1]}: главное за день",
+        'description': f"{' '.join(words[2:])} - сообщает {COMPANY}",
+        'url': f"https://news.local/{topic[0]}/{idx}",
+        'publishedAt': f"2024-01-01T00:{idx % 60:02d}:00Z",
+    }
+
+
+def passes(model: RelevanceModel, article: dict) -> bool:
+    base = NewsFilter.calculate_relevance_score(article, COMPANY)
+    return model.score(article, COMPANY, base) >= model.threshold(DEFAULT_MIN_RELEVANCE)
+
+
+def score_cost_us(model: RelevanceModel, articles: list, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for article in articles:
+            model.score(article, COMPANY, 0.3)
+    return (time.perf_counter() - started) * 1e6 / (rounds * len(articles))
+
+
+async def run(args, checks: Checks):
+    rng = random.Random(1)
+    config = FeedbackConfig()
+    train = [
+        (make_article(FINANCE if idx % 2 else CITY, idx, rng), bool(idx % 2))
+        for idx in range(args.votes)
+    ]
+    test = [
+        (make_article(FINANCE if idx % 2 else CITY, 1000 + idx, rng), bool(idx % 2))
+        for idx in range(200)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        await db.init_db()
+        await db.add_user(USER_ID, 'reader')
+        await db.add_subscription(USER_ID, COMPANY)
+        await db.save_articles(COMPANY, len(train), [article for article, _ in train])
+
+        service = FeedbackService(db, config)
+        fresh = await service.model(USER_ID, COMPANY)
+        before = sum(passes(fresh, article) for article, _ in test)
+        checks.check('without votes every article passes the default threshold',
+                     before == len(test), f"{before}/{len(test)}")
+
+        tag = company_tag(COMPANY)
+        longest = max(
+            len(feedback_callback_data(liked, url_hash(article['url']), tag).encode())
+            for article, liked in train
+        )
+        checks.check('callback_data fits 64 bytes', longest <= 64, f"{longest} bytes")
+
+        results = []
+        started = time.perf_counter()
+        for article, liked in train:
+            article_hash, article_tag = feedback_keys(COMPANY, article)
+            results.append((await service.record(USER_ID, liked, article_hash, article_tag))[0])
+        record_ms = (time.perf_counter() - started) * 1000 / len(train)
+        checks.check('votes recorded', all(result == SAVED for result in results),
+                     f"{record_ms:.2f} ms per vote with SQLite write")
+
+        article, liked = train[0]
+        duplicate, _ = await service.record(USER_ID, liked, url_hash(article['url']), tag)
+        checks.check('repeated vote is ignored', duplicate == DUPLICATE)
+
+        # Модель читается из БД заново, как в воркере
+        model = await FeedbackService(db, config).model(USER_ID, COMPANY)
+        checks.check('model persisted', model.updates == len(train), f"{model.updates} votes")
+
+        kept_liked = sum(passes(model, article) for article, liked in test if liked)
+        kept_disliked = sum(passes(model, article) for article, liked in test if not liked)
+        half = len(test) // 2
+        checks.check('liked topic still delivered', kept_liked >= half * 0.9, f"{kept_liked}/{half}")
+        checks.check('disliked topic filtered out', kept_disliked <= half * 0.1, f"{kept_disliked}/{half}")
+        print(f"     threshold {DEFAULT_MIN_RELEVANCE:.2f} -> {model.threshold(DEFAULT_MIN_RELEVANCE):.3f}, "
+              f"weights {len(model.to_bytes())} bytes")
+
+        unknown, _ = await service.record(USER_ID, True, url_hash(article['url']), 'ffff')
+        checks.check('vote for another company is rejected', unknown != SAVED)
+
+    # Стоимость оценки статьи не зависит от числа учтенных оценок
+    articles = [article for article, _ in test]
+    costs = {}
+    for votes in (0, 100, 10000):
+        model = RelevanceModel(config)
+        for idx in range(votes):
+            article, liked = test[idx % len(test)]
+            model.update(article, COMPANY, 0.3, DEFAULT_MIN_RELEVANCE, liked)
+        # Модель без оценок не меняет оценку; считаем как обученную
+        model.updates = max(model.updates, 1)
+        costs[votes] = score_cost_us(model, articles, args.rounds)
+    print("     score cost: " + ", ".join(f"{votes} votes {cost:.1f} us" for votes, cost in costs.items()))
+    checks.check('score cost independent of vote count', costs[10000] <= costs[0] * 1.5)
+
+    # Рассылка: признаки статьи считаются один раз, подписчик платит только
+    # за скалярное произведение
+    features = [article_features(article, COMPANY) for article in articles]
+    started = time.perf_counter()
+    for _ in range(args.rounds):
+        for vector in features:
+            model.score_features(vector, 0.3)
+    shared_us = (time.perf_counter() - started) * 1e6 / (args.rounds * len(features))
+    checks.check('per-subscriber cost with shared features below full scoring', shared_us < costs[10000],
+                 f"{shared_us:.1f} us vs {costs[10000]:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--votes', type=int, default=20, help='оценок подписчика')
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+    checks = Checks()
+    asyncio.run(run(args, checks))
+    sys.exit(1 if checks.failed else 0)
+
+
+if __name__ == '__main__':
+    main()
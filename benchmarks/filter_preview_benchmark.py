@@ -0,0 +1,130 @@
+"""
+Задержка предпросмотра фильтров (/filter)
+
+Сохраняет в архив временной БД статьи компании (как после запросов к
+GNews), затем многократно проверяет черновик фильтров с десятками слов:
+чтение последних статей из архива и из кэша ответов в памяти, проверку
+скомпилированными фильтрами и сравнение с текущими фильтрами. Печатает
+p50/p99 и для сравнения время проверки, если слова компилировать для
+каждой статьи заново, как раньше делал NewsFilter.is_relevant. Код выхода
+1, если p99 выше --max-ms или результат предпросмотра расходится с
+NewsFilter.is_relevant.
+
+Запуск:
+    python -m benchmarks.filter_preview_benchmark --articles 50 --words 30
+"""
+import argparse
+import asyncio
+import os
+import re
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_gnews import FakeGNewsServer, NOISE_WORDS
+from config import GNewsConfig
+from database.database import Database
+from services.news_filter import NewsFilter, article_text
+from services.news_service import NewsService
+
+COMPANY = 'Яндекс'
+
+
+def make_articles(count: int) -> list:
+    server = FakeGNewsServer(articles=count)
+    articles = []
+    while len(articles) < count:
+        articles += server.make_articles(COMPANY)
+        server.edition += 1
+    return articles[:count]
+
+
+def percentile(values: list, share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def legacy_is_relevant(article: dict, exclude_keywords: list, include_keywords: list) -> bool:
+    """Проверка без предкомпиляции: регулярное выражение на каждое слово и статью"""
+    text = article_text(article)
+    for keyword in exclude_keywords:
+        if re.search(r'\b' + re.escape(keyword.lower()) + r'\b', text):
+            return False
+    for keyword in include_keywords:
+        if not re.search(r'\b' + re.escape(keyword.lower()) + r'\b', text):
+            return False
+    return True
+
+
+async def run(args) -> bool:
+    articles = make_articles(args.articles)
+    exclude = list(NOISE_WORDS) + [f"слово{idx}" for idx in range(args.words - len(NOISE_WORDS) - 1)]
+    include = ['выручки']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        await db.init_db()
+        await db.save_articles(COMPANY, len(articles), articles)
+
+        service = NewsService(GNewsConfig(api_key='bench'), archive=db)
+        current = ([], [], 0.3)
+
+        timings = []
+        preview = None
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            preview = await service.preview_filters(COMPANY, exclude, include, 0.2, current=current)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Со статьями в кэше ответов архив не читается
+        service._cache[(COMPANY, len(articles))] = (time.monotonic(), articles)
+        cached_timings = []
+        for _ in range(args.iterations):
+            started = time.perf_counter()
+            await service.preview_filters(COMPANY, exclude, include, 0.2, current=current)
+            cached_timings.append((time.perf_counter() - started) * 1000)
+
+    matched = time.perf_counter()
+    for _ in range(args.iterations):
+        NewsFilter.preview(articles, COMPANY, exclude, include, 0.2)
+    compiled_ms = (time.perf_counter() - matched) * 1000 / args.iterations
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        for article in articles:
+            legacy_is_relevant(article, exclude, include)
+            NewsFilter.calculate_relevance_score(article, COMPANY)
+    legacy_ms = (time.perf_counter() - started) * 1000 / args.iterations
+
+    expected = sum(
+        1 for article in articles
+        if legacy_is_relevant(article, exclude, include)
+        and NewsFilter.calculate_relevance_score(article, COMPANY) >= 0.2
+    )
+    consistent = len(preview.kept) == expected and preview.total == len(articles)
+
+    p99 = percentile(timings, 0.99)
+    print(f"articles={preview.total} words={len(exclude) + len(include)} "
+          f"kept={len(preview.kept)} dropped={preview.dropped} "
+          f"(+{preview.newly_kept} / -{preview.newly_dropped} vs current)")
+    print(f"preview from archive: p50={percentile(timings, 0.5):.2f} ms p99={p99:.2f} ms")
+    print(f"preview from cache:   p50={percentile(cached_timings, 0.5):.2f} ms "
+          f"p99={percentile(cached_timings, 0.99):.2f} ms")
+    print(f"matching only: compiled={compiled_ms:.3f} ms, per-article regex={legacy_ms:.3f} ms")
+    print(f"{'OK  ' if consistent else 'FAIL'} preview agrees with is_relevant ({expected} kept)")
+    print(f"{'OK  ' if p99 <= args.max_ms else 'FAIL'} p99 under {args.max_ms} ms")
+    return consistent and p99 <= args.max_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--articles', type=int, default=50)
+    parser.add_argument('--words', type=int, default=30, help='слов в черновике фильтров')
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--max-ms', type=float, default=100)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == '__main__':
+    main()
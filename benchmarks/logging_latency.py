@@ -0,0 +1,144 @@
+"""
+Задержка event loop при интенсивном логировании
+
+Сравнивает прежнюю схему (StreamHandler и FileHandler прямо в потоке
+event loop) с setup_logger (QueueHandler + QueueListener в фоновом
+потоке). Несколько задач пишут в лог пачками, а задача-пульс измеряет,
+насколько позже заданного она просыпается.
+
+Вывод консольного обработчика перенаправляется во временный файл, а
+каждая запись в него задерживается на --write-delay: так ведет себя
+переполненный pipe stdout или медленный диск. С --write-delay 0 видна
+только цена форматирования.
+
+Запуск:
+    python -m benchmarks.logging_latency --records 20000 --write-delay 0.0002
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from config import LoggingConfig
+from utils.logger import LOG_FORMAT, setup_logger
+
+
+class SlowStream:
+    """Файл, каждая запись в который блокирует поток на delay секунд"""
+
+    def __init__(self, path: str, delay: float):
+        self.file = open(path, 'w', encoding='utf-8')
+        self.delay = delay
+
+    def write(self, text: str):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def setup_direct(log_path: str):
+    """Прежний setup_logger: запись на диск в вызывающем потоке"""
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    logging.basicConfig(
+        level=logging.INFO,
+        format=LOG_FORMAT,
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+            logging.FileHandler(log_path, encoding='utf-8')
+        ]
+    )
+
+
+async def heartbeat(interval: float, lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - expected) * 1000)
+
+
+async def writer(logger: logging.Logger, records: int, batch: int, call_times: list):
+    for idx in range(0, records, batch):
+        started = time.perf_counter()
+        for offset in range(batch):
+            logger.info(f"Fetching news for Company{(idx + offset) % 500}: 3 new articles")
+        call_times.append((time.perf_counter() - started) / batch * 1e6)
+        await asyncio.sleep(0)
+
+
+async def measure(records: int, writers: int, batch: int) -> dict:
+    logger = logging.getLogger('bench')
+    lags, call_times = [], []
+    stop = asyncio.Event()
+    pulse = asyncio.create_task(heartbeat(0.001, lags, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        writer(logger, records // writers, batch, call_times) for _ in range(writers)
+    ))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await pulse
+
+    lags.sort()
+    return {
+        'loop_seconds': round(elapsed, 3),
+        'log_call_us': round(statistics.mean(call_times), 2),
+        'lag_p50_ms': round(statistics.median(lags), 3),
+        'lag_p99_ms': round(lags[int(len(lags) * 0.99)], 3),
+        'lag_max_ms': round(lags[-1], 3),
+    }
+
+
+def run(mode: str, args, tmp: str) -> dict:
+    log_path = os.path.join(tmp, f"{mode}.log")
+    stdout = sys.stdout
+    sys.stdout = SlowStream(os.path.join(tmp, f"{mode}.stdout"), args.write_delay)
+    try:
+        listener = None
+        if mode == 'direct':
+            setup_direct(log_path)
+        else:
+            listener = setup_logger(LoggingConfig(file=log_path))
+
+        result = asyncio.run(measure(args.records, args.writers, args.batch))
+
+        # Время, за которое фоновый поток дописывает хвост очереди
+        drain_started = time.perf_counter()
+        if listener:
+            listener.stop()
+        result['drain_seconds'] = round(time.perf_counter() - drain_started, 3)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return {'mode': mode, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=50)
+    parser.add_argument('--write-delay', type=float, default=0.0002,
+                        help='задержка записи в stdout, сек')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='logging-')
+    results = [run(mode, args, tmp) for mode in ('direct', 'queue')]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Симуляция расхода квоты GNews и свежести новостей
+
+Сравнивает фиксированный опрос раз в CHECK_INTERVAL с адаптивным
+расписанием (PollingPolicy + PollingDispatcher) на синтетическом потоке
+статей. Статьи появляются по пуассоновскому процессу с разной частотой
+для «горячих» и «тихих» компаний.
+
+Запуск:
+    python -m benchmarks.polling_simulation --days 7 --companies 200
+"""
+import argparse
+import bisect
+import random
+import statistics
+from typing import Dict, List, Tuple
+
+from services.polling_policy import PollingPolicy, PollingDispatcher
+
+
+def generate_companies(count: int, rng: random.Random) -> List[Tuple[str, float, int]]:
+    """Сгенерировать компании: (название, статей в час, подписчиков)"""
+    companies = []
+    for idx in range(count):
+        kind = rng.random()
+        if kind < 0.1:
+            rate = rng.uniform(2.0, 6.0)  # крупные тикеры
+        elif kind < 0.4:
+            rate = rng.uniform(0.2, 1.0)
+        else:
+            rate = rng.uniform(0.005, 0.05)  # региональные компании
+        subscribers = max(1, int(rng.paretovariate(1.5)))
+        companies.append((f"company-{idx}", rate, subscribers))
+    return companies
+
+
+def generate_articles(rate: float, duration: float, rng: random.Random) -> List[float]:
+    """Времена публикации статей (пуассоновский поток)"""
+    times = []
+    t = rng.expovariate(rate / 3600)
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate / 3600)
+    return times
+
+
+class Tracker:
+    """Подсчет вызовов API и задержек обнаружения статей"""
+
+    def __init__(self, articles: Dict[str, List[float]]):
+        self.articles = articles
+        self.seen = {name: 0 for name in articles}
+        self.calls = 0
+        self.delays: List[float] = []
+
+    def poll(self, company_name: str, now: float) -> int:
+        """Опросить компанию, вернуть количество новых статей"""
+        self.calls += 1
+        times = self.articles[company_name]
+        upto = bisect.bisect_right(times, now)
+        new = upto - self.seen[company_name]
+        self.delays.extend(now - t for t in times[self.seen[company_name]:upto])
+        self.seen[company_name] = upto
+        return new
+
+    def report(self, name: str, days: float) -> Dict:
+        delays = sorted(self.delays) or [0.0]
+        missed = sum(len(t) - self.seen[n] for n, t in self.articles.items())
+        return {
+            'strategy': name,
+            'api_calls': self.calls,
+            'calls_per_day': round(self.calls / days),
+            'mean_delay_min': round(statistics.fmean(delays) / 60, 1),
+            'p95_delay_min': round(delays[int(len(delays) * 0.95)] / 60, 1),
+            'undetected': missed
+        }
+
+
+def simulate_fixed(articles, interval: float, duration: float) -> Tracker:
+    tracker = Tracker(articles)
+    t = interval
+    while t <= duration:
+        for name in articles:
+            tracker.poll(name, t)
+        t += interval
+    return tracker
+
+
+def simulate_adaptive(articles, subscribers, policy: PollingPolicy, tick: float,
+                      duration: float) -> Tracker:
+    tracker = Tracker(articles)
+    dispatcher = PollingDispatcher(tick=tick)
+    for name in articles:
+        dispatcher.push(policy.new_schedule(name, 0.0))
+
+    t = 0.0
+    while t <= duration:
+        for schedule in dispatcher.pop_due(t, dispatcher.tick_budget()):
+            new = tracker.poll(schedule.company_name, t)
+            dispatcher.push(
+                policy.update(schedule, new, subscribers[schedule.company_name], t)
+            )
+        t += tick
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=float, default=7)
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=3600)
+    parser.add_argument('--min-interval', type=float, default=900)
+    parser.add_argument('--max-interval', type=float, default=6 * 3600)
+    parser.add_argument('--tick', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    duration = args.days * 86400
+    companies = generate_companies(args.companies, rng)
+    articles = {name: generate_articles(rate, duration, rng) for name, rate, _ in companies}
+    subscribers = {name: subs for name, _, subs in companies}
+
+    policy = PollingPolicy(args.interval, args.min_interval, args.max_interval)
+    results = [
+        simulate_fixed(articles, args.interval, duration).report('fixed', args.days),
+        simulate_adaptive(articles, subscribers, policy, args.tick, duration).report(
+            'adaptive', args.days
+        ),
+    ]
+
+    header = list(results[0])
+    print(' | '.join(f"{h:>15}" for h in header))
+    for row in results:
+        print(' | '.join(f"{row[h]!s:>15}" for h in header))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Микробенчмарк стоимости сообщения на одного получателя
+
+Сравнивает прежний f-string шаблон (рендер на каждого получателя, без
+экранирования) с MessageRenderer (рендер один раз на статью за цикл).
+
+Запуск:
+    python -m benchmarks.render_benchmark --recipients 500
+"""
+import argparse
+import timeit
+
+from services.message_renderer import MessageRenderer, render_news_message
+
+
+def legacy_format(company_name: str, article: dict) -> str:
+    """Прежняя реализация NewsService.format_news_message"""
+    title = article.get('title', 'Без заголовка')
+    description = article.get('description', '')
+    published_at = article.get('publishedAt', '')
+    source = article.get('source', {}).get('name', 'Неизвестный источник')
+    url = article.get('url', '')
+
+    message = f"""
+                    📰 <b>Новости по: {company_name}</b>
+                    
+                    📌 <b>{title}</b>
+                    
+                    {description}
+                    
+                    🔗 Источник: {source}
+                    ⏰ {published_at}
+                """
+    message += f"\n<a href=\"{url}\">Читать полностью</a>"
+    return message.strip()
+
+
+ARTICLE = {
+    'title': 'Сбербанк & ВТБ: прибыль <выше> прогнозов',
+    'description': 'Банки отчитались о рекордной прибыли за квартал, '
+                   'аналитики повысили целевые цены акций.',
+    'publishedAt': '2026-10-19T08:00:00Z',
+    'source': {'name': 'РБК'},
+    'url': 'https://example.com/news/sber-vtb?utm=a&b=c',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--recipients', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    def legacy():
+        for _ in range(args.recipients):
+            legacy_format('Сбербанк', ARTICLE)
+
+    def uncached():
+        for _ in range(args.recipients):
+            render_news_message('Сбербанк', ARTICLE)
+
+    def cached():
+        renderer = MessageRenderer()
+        for _ in range(args.recipients):
+            renderer.render('Сбербанк', ARTICLE)
+
+    for name, func in (('legacy', legacy), ('render', uncached), ('render_once', cached)):
+        seconds = min(timeit.repeat(func, number=args.repeat, repeat=3))
+        per_recipient = seconds / (args.repeat * args.recipients) * 1e9
+        print(f"{name:>12}: {per_recipient:8.0f} ns/recipient")
+
+    legacy_bytes = len(legacy_format('Сбербанк', ARTICLE).encode())
+    new_bytes = len(render_news_message('Сбербанк', ARTICLE).encode())
+    print(f"{'payload':>12}: {legacy_bytes} -> {new_bytes} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Прогон фильтрации на записанном трафике GNews
+
+Читает запись (GNEWS_RECORD=traffic.jsonl.gz на проде) и пропускает
+каждый ответ через NewsService.fetch_news в режиме воспроизведения - тот
+же путь фильтрации и оценки релевантности, что и в боте. Печатает
+статистику, с --profile - профиль cProfile.
+
+Без реальной записи можно сделать образец на фиктивном GNews:
+    python -m benchmarks.replay --make-sample traffic.jsonl.gz --companies 30 --rounds 50
+
+Запуск:
+    python -m benchmarks.replay traffic.jsonl.gz --speed 0 --profile replay.prof
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import json
+import pstats
+import time
+
+from benchmarks.fake_gnews import FakeGNewsServer
+from config import GNewsConfig
+from services.news_service import NewsService
+from services.traffic_log import read_records
+
+
+async def make_sample(path: str, companies: int, rounds: int):
+    """Записать трафик к фиктивному GNews через NewsService"""
+    gnews = FakeGNewsServer(articles=15, seed=1)
+    url = await gnews.start()
+    news_service = NewsService(GNewsConfig(
+        api_key='sample', base_url=url, cache_ttl=0, record_path=path
+    ))
+    try:
+        for edition in range(rounds):
+            gnews.edition = edition
+            for idx in range(companies):
+                await news_service.fetch_articles(f"Company{idx}", 15)
+    finally:
+        await gnews.stop()
+
+
+async def replay(path: str, speed: float, max_results: int, min_score: float) -> dict:
+    queries = [record['params']['q'] for record in read_records(path)]
+    # Без кэша: каждый записанный ответ проходит фильтрацию
+    news_service = NewsService(GNewsConfig(
+        api_key='replay', cache_ttl=0, replay_path=path, replay_speed=speed
+    ))
+
+    kept = 0
+    started = time.perf_counter()
+    for query in queries:
+        articles = await news_service.fetch_news(
+            query, max_results=max_results, min_relevance_score=min_score
+        )
+        kept += len(articles)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'responses': len(queries),
+        'articles_kept': kept,
+        'seconds': round(elapsed, 3),
+        'responses_per_sec': round(len(queries) / elapsed) if elapsed else None,
+        'not_replayed': news_service.gnews.replayer.remaining(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('path', help='запись трафика (.jsonl.gz)')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='ускорение относительно записи (0 - без ожидания)')
+    parser.add_argument('--max-results', type=int, default=5)
+    parser.add_argument('--min-score', type=float, default=0.3)
+    parser.add_argument('--profile', help='сохранить профиль cProfile в файл')
+    parser.add_argument('--make-sample', action='store_true',
+                        help='записать образец с фиктивного GNews в path')
+    parser.add_argument('--companies', type=int, default=30)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.make_sample:
+        asyncio.run(make_sample(args.path, args.companies, args.rounds))
+        return
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    result = asyncio.run(replay(args.path, args.speed, args.max_results, args.min_score))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        summary = io.StringIO()
+        pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(15)
+        result['profile'] = args.profile
+        print(summary.getvalue())
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
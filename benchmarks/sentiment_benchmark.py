@@ -0,0 +1,99 @@
+"""
+Пропускная способность оценки тональности
+
+Оценивает пачки статей с уникальными URL (каждая статья считается
+заново) и повторные пачки (оценки из кэша), печатает статей в секунду на
+одном ядре и проверяет метки на небольшом размеченном наборе. Код выхода
+1, если пропускная способность без кэша ниже --min-rate или метка не
+совпала.
+
+Запуск:
+    python -m benchmarks.sentiment_benchmark --articles 20000
+"""
+import argparse
+import random
+import sys
+import time
+
+from config import SentimentConfig
+from services.sentiment import BEARISH, BULLISH, NEUTRAL, SentimentScorer
+
+LABELLED = [
+    ("Акции Сбербанка выросли на 5% после отчета", "Прибыль банка превысила прогнозы", BULLISH),
+    ("Яндекс объявил рекордные дивиденды", "Совет директоров одобрил выплату", BULLISH),
+    ("Tesla shares soar after earnings beat", "Revenue exceeded analyst estimates", BULLISH),
+    ("Акции Аэрофлота упали на фоне санкций", "Компания сообщила об убытке за квартал", BEARISH),
+    ("ФАС оштрафовала Google", "Против компании возбуждено расследование", BEARISH),
+    ("Apple shares fell after iPhone sales missed estimates", "", BEARISH),
+    ("Выручка компании не выросла", "", BEARISH),
+    ("Газпром провел годовое собрание акционеров", "Собрание прошло в Москве", NEUTRAL),
+    ("Ростелеком представил новый тариф", "Тариф доступен в регионах", NEUTRAL),
+]
+
+TITLES = [
+    "{company} отчиталась о росте выручки на {n}%",
+    "Акции {company} упали на {n}% после заявления регулятора",
+    "{company} запустила новый сервис в {n} городах",
+    "{company} shares jump {n}% on strong guidance",
+    "{company} faces lawsuit over data breach",
+    "Аналитики понизили прогноз по {company}",
+]
+DESCRIPTIONS = [
+    "Компания сообщила о рекордной прибыли и повысила дивиденды.",
+    "Инвесторы опасаются дальнейшего снижения на фоне санкций.",
+    "Сервис будет доступен пользователям с сентября.",
+    "Revenue exceeded estimates while costs declined.",
+    "Regulators opened an investigation into the company.",
+    "Индексы завершили день разнонаправленно.",
+]
+COMPANIES = ["Сбербанк", "Газпром", "Яндекс", "Tesla", "Apple", "Microsoft"]
+
+
+def make_articles(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [
+        {
+            'title': rng.choice(TITLES).format(company=rng.choice(COMPANIES), n=rng.randint(1, 30)),
+            'description': rng.choice(DESCRIPTIONS),
+            'url': f"https://example.com/news/{seed}/{idx}?utm_source=gnews",
+        }
+        for idx in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--articles', type=int, default=20000)
+    parser.add_argument('--batch', type=int, default=30, help='статей в ответе источника')
+    parser.add_argument('--min-rate', type=float, default=5000, help='минимум статей/с без кэша')
+    args = parser.parse_args()
+
+    scorer = SentimentScorer(SentimentConfig(cache_size=args.articles * 2))
+    articles = make_articles(args.articles, seed=1)
+    batches = [articles[idx:idx + args.batch] for idx in range(0, len(articles), args.batch)]
+
+    started = time.perf_counter()
+    for batch in batches:
+        scorer.annotate([dict(article) for article in batch])
+    cold = args.articles / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for batch in batches:
+        scorer.annotate([dict(article) for article in batch])
+    warm = args.articles / (time.perf_counter() - started)
+
+    print(f"{'unique':>8}: {cold:10.0f} articles/s")
+    print(f"{'cached':>8}: {warm:10.0f} articles/s")
+
+    failed = cold < args.min_rate
+    for title, description, expected in LABELLED:
+        score = scorer.score_article({'title': title, 'description': description})
+        label = scorer.label(score)
+        failed |= label != expected
+        print(f"{'OK  ' if label == expected else 'FAIL'} {score:+.2f} {label:>8} {title}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Проверка шардирования цикла проверки между процессами-воркерами
+
+Запускает N процессов SchedulerService над общей SQLite базой с
+фиктивными GNews и Telegram, измеряет время обработки всех компаний и
+проверяет, что каждая новость доставлена ровно один раз.
+
+Запуск:
+    python -m benchmarks.sharding_check --workers 1 2 4 --companies 200
+"""
+import argparse
+import asyncio
+import collections
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+
+from config import Config, DatabaseConfig, RenderConfig, SchedulerConfig
+from database.database import Database
+from services.news_filter import NewsFilter
+from services.scheduler_service import SchedulerService
+
+
+class FakeNewsService:
+    """GNews с фиксированной задержкой и детерминированными статьями"""
+
+    filter = NewsFilter()
+    trending = None
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def fetch_news(self, company_name: str, **kwargs):
+        await asyncio.sleep(self.latency)
+        return [
+            {
+                'title': f"{company_name} #{idx}",
+                'url': f"https://news.local/{company_name}/{idx}",
+                '_relevance_score': 1.0,
+            }
+            for idx in range(2)
+        ]
+
+
+class FakeBot:
+    """Telegram, записывающий отправленные сообщения в общий лог"""
+
+    def __init__(self, log_path: str):
+        self.log_path = log_path
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        # O_APPEND: короткие строки дописываются атомарно
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            log.write(f"{chat_id} {text.replace(chr(10), ' ')}\n")
+
+
+def worker_process(worker_id: str, db_path: str, log_path: str, latency: float,
+                   barrier, stop_event):
+    asyncio.run(run_worker(worker_id, db_path, log_path, latency, barrier, stop_event))
+
+
+async def run_worker(worker_id, db_path, log_path, latency, barrier, stop_event):
+    config = Config(
+        tg_bot=None,
+        gnews=None,
+        database=DatabaseConfig(path=db_path),
+        scheduler=SchedulerConfig(check_interval=3600, dispatch_tick=1,
+                                  worker_id=worker_id, lease_ttl=30),
+        render=RenderConfig(port=0, external_url=None, is_render=False)
+    )
+    database = Database(db_path)
+    service = SchedulerService(FakeBot(log_path), database, FakeNewsService(latency), config)
+    service.SEND_DELAY = 0
+
+    # Регистрируемся до старта, чтобы доли считались по всем воркерам
+    await service.heartbeat()
+    barrier.wait()
+
+    while not stop_event.is_set():
+        await service.check_and_send_news()
+        await asyncio.sleep(0.1)
+
+    await service.release_ownership()
+
+
+async def seed(db_path: str, companies: int, users: int, per_user: int):
+    database = Database(db_path)
+    await database.init_db()
+    for user_id in range(users):
+        await database.add_user(user_id, f"user{user_id}")
+        for offset in range(per_user):
+            await database.add_subscription(user_id, f"company-{(user_id + offset) % companies}")
+
+
+def wait_done(db_path: str, timeout: float) -> bool:
+    """Дождаться, пока все компании проверены и очередь доставки пуста"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with sqlite3.connect(db_path) as db:
+            unchecked = db.execute(
+                '''SELECT COUNT(DISTINCT s.company_name) FROM subscriptions s
+                   LEFT JOIN company_schedule c ON c.company_name = s.company_name
+                   WHERE c.last_checked_at IS NULL'''
+            ).fetchone()[0]
+            pending = db.execute('SELECT COUNT(*) FROM pending_deliveries').fetchone()[0]
+        if unchecked == 0 and pending == 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(workers: int, companies: int, users: int, per_user: int, latency: float) -> dict:
+    tmp = tempfile.mkdtemp(prefix='sharding-')
+    db_path = os.path.join(tmp, 'bench.db')
+    log_path = os.path.join(tmp, 'sent.log')
+    asyncio.run(seed(db_path, companies, users, per_user))
+
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(workers + 1)
+    stop_event = ctx.Event()
+    processes = [
+        ctx.Process(target=worker_process,
+                    args=(f"w{idx}", db_path, log_path, latency, barrier, stop_event))
+        for idx in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    barrier.wait()
+    started = time.perf_counter()
+    done = wait_done(db_path, timeout=600)
+    elapsed = time.perf_counter() - started
+
+    stop_event.set()
+    for process in processes:
+        process.join()
+
+    with open(log_path, encoding='utf-8') as log:
+        sent = collections.Counter(line.strip() for line in log)
+    with sqlite3.connect(db_path) as db:
+        subscribed = db.execute(
+            'SELECT COUNT(DISTINCT company_name) FROM subscriptions'
+        ).fetchone()[0]
+    expected = users * per_user * 2
+
+    return {
+        'workers': workers,
+        'completed': done,
+        'seconds': round(elapsed, 2),
+        'companies_per_sec': round(subscribed / elapsed, 1),
+        'sent': sum(sent.values()),
+        'expected': expected,
+        'duplicates': sum(count - 1 for count in sent.values() if count > 1),
+        'exactly_once': len(sent) == expected and all(c == 1 for c in sent.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--per-user', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    for workers in args.workers:
+        print(run(workers, args.companies, args.users, args.per_user, args.latency))
+
+
+if __name__ == '__main__':
+    main()
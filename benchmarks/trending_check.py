@@ -0,0 +1,123 @@
+"""
+Проверка детектора всплесков упоминаний на синтетическом потоке
+
+Моделирует сутки статей с фоновыми упоминаниями нескольких тысяч
+сущностей (распределение Ципфа), затем в последний час одна компания
+упоминается в surge раз чаще обычного. Проверяет, что она попадает в
+/trending и получает ускорение опроса, что фоновые сущности не
+считаются всплеском, а первый ответ по новой компании не ускоряет ее
+опрос, что память не растет с числом сущностей, и
+печатает пропускную способность. Код выхода 1, если проверка не прошла.
+
+Запуск:
+    python -m benchmarks.trending_check --entities 5000 --surge 8
+"""
+import argparse
+import random
+import sys
+import time
+
+from config import TrendingConfig
+from services.trending import TrendingDetector, extract_entities
+
+SURGING = "Аэрофлот"
+NEW_COMPANY = "Новатэк"
+
+
+def entity_name(idx: int) -> str:
+    return f"Company{idx}"
+
+
+def make_article(serial: int, entities: list) -> dict:
+    names = ', '.join(entities)
+    return {
+        'title': f"Новости дня: {names} и рынок",
+        'description': f"Сегодня {entities[0]} сообщила о планах.",
+        'url': f"https://example.com/{serial}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entities', type=int, default=5000, help='фоновых сущностей')
+    parser.add_argument('--rate', type=float, default=600, help='статей в час')
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--surge', type=float, default=8, help='рост упоминаний компании')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    config = TrendingConfig()
+    detector = TrendingDetector(config)
+    weights = [1 / (idx + 1) for idx in range(args.entities)]
+    population = [entity_name(idx) for idx in range(args.entities)]
+
+    start = 1_700_000_000.0
+    end = start + args.hours * 3600
+    surge_from = end - 3600
+    base_share = 0.01  # доля статей об Аэрофлоте в обычное время
+
+    serial = 0
+    now = start
+    observed = 0
+    started = time.perf_counter()
+    while now < end:
+        batch = []
+        # Ответ источника - пачка статей раз в минуту
+        for _ in range(max(1, round(args.rate / 60))):
+            serial += 1
+            entities = rng.choices(population, weights, k=2)
+            share = base_share * (args.surge if now >= surge_from else 1)
+            if rng.random() < share:
+                entities[0] = rng.choice([SURGING, "Аэрофлота", "Аэрофлоту"])
+            batch.append(make_article(serial, entities))
+        # Источник повторяет прошлые статьи - они не должны учитываться
+        detector.observe(batch + batch[:3], now)
+        observed += len(batch)
+        now += 60
+    elapsed = time.perf_counter() - started
+
+    failed = False
+
+    def check(name: str, ok: bool, details=''):
+        nonlocal failed
+        failed |= not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {name}{f': {details}' if details else ''}")
+
+    check(
+        'case forms share one entity',
+        len({key for name in ("Аэрофлот", "Аэрофлота", "Аэрофлоту")
+             for key in extract_entities(f"Акции {name} выросли")}) == 1
+    )
+    check('repeated articles counted once', detector.articles == observed,
+          f"{detector.articles} of {observed}")
+
+    trending = detector.trending(10, now)
+    names = [name for name, _, _ in trending]
+    check('surging company detected', any(name.startswith("Аэрофлот") for name in names),
+          f"trending={[(n, round(c), round(s, 1)) for n, c, s in trending]}")
+    false_positives = [name for name in names if not name.startswith("Аэрофлот")]
+    check('no background entities flagged', len(false_positives) <= 1, f"{false_positives}")
+    boost = detector.boost(SURGING, now)
+    check('polling boosted', boost > 1.0, f"boost={boost:.1f}")
+    check('quiet company not boosted', detector.boost(entity_name(0), now) == 1.0)
+
+    # Новая подписка: первый ответ - статьи за много дней, а не всплеск
+    first_fetch = []
+    for _ in range(10):
+        serial += 1
+        first_fetch.append(make_article(serial, [NEW_COMPANY, rng.choice(population)]))
+    detector.observe(first_fetch, now, company_name=NEW_COMPANY)
+    check('first fetch of new company not boosted', detector.boost(NEW_COMPANY, now) == 1.0,
+          f"surge={detector.surge(NEW_COMPANY, now):.1f}")
+
+    sketch_bytes = 2 * config.width * config.depth * 8
+    tracked = detector.status()['tracked']
+    check('heavy hitters bounded', tracked <= config.top_k, f"{tracked}")
+    print(f"sketch memory: {sketch_bytes // 1024} KiB for {args.entities} entities")
+    print(f"throughput: {observed / elapsed:.0f} articles/s")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
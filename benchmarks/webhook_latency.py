@@ -0,0 +1,112 @@
+"""
+Сравнение задержки апдейт -> ответ в режимах polling и webhook
+
+Поднимает локальный фиктивный Telegram (benchmarks.fake_telegram),
+бот отвечает эхом на каждое сообщение. Время считается от появления
+апдейта на «сервере Telegram» до получения им sendMessage.
+
+Запуск:
+    python -m benchmarks.webhook_latency --updates 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import time
+
+from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Message
+
+from benchmarks.fake_telegram import FakeTelegramServer
+from services.keepalive_service import KeepAliveService
+
+
+def build_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.message()
+    async def echo(message: Message):
+        await message.answer(message.text)
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def measure(mode: str, updates: int, interval: float, latency: float, concurrency: int) -> dict:
+    server = FakeTelegramServer(latency=latency)
+    base_url = await server.start()
+    bot = Bot('42:fake', session=AiohttpSession(api=TelegramAPIServer.from_base(base_url)))
+    dp = build_dispatcher()
+
+    keepalive = None
+    polling = None
+    if mode == 'webhook':
+        port = free_port()
+        keepalive = KeepAliveService(port=port)
+        keepalive.mount_webhook(dp, bot, path='/webhook', secret='bench', max_concurrency=concurrency)
+        await keepalive.start()
+        await bot.set_webhook(f"http://127.0.0.1:{port}/webhook", secret_token='bench')
+    else:
+        await bot.delete_webhook()
+        polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=10))
+        await asyncio.sleep(0.2)
+
+    pushed = {}
+    for idx in range(updates):
+        pushed[str(idx)] = time.perf_counter()
+        server.push_message(chat_id=1000 + idx % 50, text=str(idx))
+        await asyncio.sleep(interval)
+
+    deadline = time.monotonic() + 30
+    while len(server.sent) < updates and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+
+    # Даем завершиться ответам на последние sendMessage
+    await asyncio.sleep(latency + 0.2)
+
+    delays = sorted((sent_at - pushed[text]) * 1000 for sent_at, _, text in server.sent)
+
+    if polling:
+        await dp.stop_polling()
+        await polling
+    if keepalive:
+        await keepalive.stop()
+    await bot.session.close()
+    await server.stop()
+
+    return {
+        'mode': mode,
+        'updates': updates,
+        'answered': len(delays),
+        'mean_ms': round(statistics.fmean(delays), 2),
+        'p50_ms': round(delays[len(delays) // 2], 2),
+        'p95_ms': round(delays[int(len(delays) * 0.95)], 2),
+        'api_calls': sum(server.calls.values()),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--updates', type=int, default=200)
+    parser.add_argument('--interval', type=float, default=0.005)
+    parser.add_argument('--latency', type=float, default=0.02, help='задержка ответа API, сек')
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    for mode in ('polling', 'webhook'):
+        result = await measure(mode, args.updates, args.interval, args.latency, args.concurrency)
+        print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
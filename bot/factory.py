@@ -0,0 +1,27 @@
+"""Создание экземпляра Bot"""
+from aiogram import Bot
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+from config import Config
+
+
+def create_bot(config: Config) -> Bot:
+    """
+    Бот с HTML-разметкой по умолчанию
+
+    Если задан TELEGRAM_API_URL, запросы идут на этот сервер (локальный
+    Bot API server или фиктивный сервер бенчмарков), иначе - на
+    api.telegram.org.
+    """
+    session = None
+    if config.tg_bot.api_url:
+        from aiogram.client.session.aiohttp import AiohttpSession
+        from aiogram.client.telegram import TelegramAPIServer
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.tg_bot.api_url))
+
+    return Bot(
+        token=config.tg_bot.token,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
+    )
@@ -1,101 +1,126 @@
 """Обработчики проверки новостей"""
+from html import escape
+from typing import Optional
+
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
-from database.database import Database
+from bot.keyboards.inline import get_feedback_keyboard
+from services.check_service import CheckService
+from services.feedback import DUPLICATE, UNKNOWN, FeedbackService, parse_feedback_callback
 from services.news_service import NewsService
-import asyncio
 
 router = Router()
 
 
-@router.message(Command("check"))
-async def cmd_check_news(message: Message, db: Database, news_service: NewsService):
-    """Проверить новости с фильтрацией"""
-    user_id = message.from_user.id
-    subscriptions = await db.get_user_subscriptions(user_id)
-
-    if not subscriptions:
-        await message.answer("У вас нет подписок. Используйте /add <компания>")
+async def run_check(message: Message, user_id: int, check_service: CheckService):
+    """Общая проверка новостей для команды и кнопки"""
+    # Слот занимается до первого await: параллельные нажатия его не обойдут
+    wait = check_service.try_start(user_id)
+    if wait > 0:
+        await message.answer(f"⏳ Повторная проверка будет доступна через {int(wait) + 1} сек.")
         return
 
-    status_msg = await message.answer("🔍 Ищу релевантные новости...")
-
-    news_count = 0
-    for company in subscriptions:
-        # Получаем фильтры для компании
-        filters = await db.get_subscription_filters(user_id, company)
-
-        # Получаем отфильтрованные новости
-        articles = await news_service.fetch_news(
-            company,
-            max_results=3,
-            exclude_keywords=filters['exclude'],
-            include_keywords=filters['include'],
-            min_relevance_score=0.3  # Минимальный порог релевантности
-        )
-
-        if articles:
-            for article in articles:
-                news_url = article.get('url', '')
-
-                if not await db.is_news_sent(user_id, news_url):
-                    message_text = news_service.format_news_message(
-                        company,
-                        article,
-                        show_relevance=True  # Показываем оценку
-                    )
-                    await message.answer(message_text, parse_mode="HTML")
-                    await db.mark_news_as_sent(user_id, news_url)
-                    news_count += 1
-                    await asyncio.sleep(0.5)
+    try:
+        status_msg = await message.answer("🔍 Ищу релевантные новости...")
+    except Exception:
+        check_service.finish(user_id)
+        raise
 
-        await asyncio.sleep(1)
+    news_count, subscriptions_count = await check_service.check(
+        user_id,
+        lambda text, reply_markup: message.answer(text, parse_mode="HTML", reply_markup=reply_markup)
+    )
 
     await status_msg.delete()
 
-    if news_count == 0:
+    if subscriptions_count == 0:
+        await message.answer("У вас нет подписок. Используйте /add &lt;компания&gt;")
+    elif news_count == 0:
         await message.answer("📭 Релевантных новостей не найдено.")
     else:
         await message.answer(f"✅ Найдено релевантных новостей: {news_count}")
 
 
-@router.callback_query(F.data == "check_news")
-async def callback_check_news(
-        callback: CallbackQuery,
-        db: Database,
-        news_service: NewsService
-):
+@router.message(Command("check"), flags={"throttling_key": "check", "profile": "check"})
+async def cmd_check_news(message: Message, check_service: CheckService):
+    """Проверить новости с фильтрацией"""
+    await run_check(message, message.from_user.id, check_service)
+
+
+@router.callback_query(F.data == "check_news", flags={"throttling_key": "check", "profile": "check"})
+async def callback_check_news(callback: CallbackQuery, check_service: CheckService):
     """Проверить новости через callback"""
-    await callback.answer("🔍 Ищу новости...", show_alert=False)
+    await callback.answer()
+    await run_check(callback.message, callback.from_user.id, check_service)
 
-    user_id = callback.from_user.id
-    subscriptions = await db.get_user_subscriptions(user_id)
 
-    if not subscriptions:
-        await callback.message.answer(
-            "У вас нет подписок. Используйте кнопку «Добавить компанию»"
+@router.callback_query(F.data.startswith("fb:"))
+async def callback_feedback(callback: CallbackQuery, feedback_service: Optional[FeedbackService]):
+    """Оценка новости 👍/👎: подстраивает отбор новостей компании для пользователя"""
+    parsed = parse_feedback_callback(callback.data)
+    if parsed is None or feedback_service is None:
+        await callback.answer("Оценки новостей сейчас не принимаются")
+        return
+    liked, article_hash, tag = parsed
+
+    result, company_name = await feedback_service.record(
+        callback.from_user.id, liked, article_hash, tag
+    )
+    if result == UNKNOWN:
+        await callback.answer(
+            "Вы больше не подписаны на эту компанию" if company_name is None
+            else "Новость устарела, оценка не учтена"
         )
         return
+    if result == DUPLICATE:
+        await callback.answer("Оценка уже учтена")
+        return
 
-    news_count = 0
-    for company in subscriptions:
-        articles = await news_service.fetch_news(company, max_results=3)
+    await callback.answer(
+        f"👍 Буду присылать больше похожих новостей о {company_name}" if liked
+        else f"👎 Буду реже присылать такие новости о {company_name}"
+    )
+    try:
+        await callback.message.edit_reply_markup(
+            reply_markup=get_feedback_keyboard(article_hash, tag, liked)
+        )
+    except TelegramBadRequest:
+        # Сообщение слишком старое или кнопки уже такие же
+        pass
 
-        if articles:
-            for article in articles:
-                news_url = article.get('url', '')
 
-                if not await db.is_news_sent(user_id, news_url):
-                    message_text = news_service.format_news_message(company, article)
-                    await callback.message.answer(message_text, parse_mode="HTML")
-                    await db.mark_news_as_sent(user_id, news_url)
-                    news_count += 1
-                    await asyncio.sleep(0.5)
+@router.message(Command("trending"))
+async def cmd_trending(message: Message, news_service: NewsService):
+    """Компании и темы с всплеском упоминаний в новостях"""
+    trending = news_service.trending
+    if not trending:
+        await message.answer("📈 Отслеживание трендов выключено.")
+        return
 
-        await asyncio.sleep(1)
+    if trending.warming_up():
+        # Базовой частоты еще нет: показываем просто самые упоминаемые
+        mentions = trending.top_mentions(10)
+        if not mentions:
+            await message.answer("📈 Статистика упоминаний еще собирается, попробуйте позже.")
+            return
+        lines = ["📈 <b>Чаще всего упоминаются</b> (статистика еще собирается):", ""]
+        lines += [
+            f"{idx}. {escape(name, quote=False)} - {count:.0f}"
+            for idx, (name, count) in enumerate(mentions, 1)
+        ]
+        await message.answer("\n".join(lines), parse_mode="HTML")
+        return
 
-    if news_count == 0:
-        await callback.message.answer("📭 Новых новостей пока нет.")
-    else:
-        await callback.message.answer(f"✅ Найдено новостей: {news_count}")
+    items = trending.trending(10)
+    if not items:
+        await message.answer("📈 Сейчас нет компаний с всплеском упоминаний.")
+        return
+
+    lines = ["📈 <b>В тренде</b> (упоминаний за последний час, рост к обычному):", ""]
+    lines += [
+        f"{idx}. <b>{escape(name, quote=False)}</b> - {count:.0f}, ×{surge:.1f}"
+        for idx, (name, count, surge) in enumerate(items, 1)
+    ]
+    await message.answer("\n".join(lines), parse_mode="HTML")
@@ -0,0 +1,125 @@
+"""Обработчики поиска по архиву статей"""
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, LinkPreviewOptions, Message
+from database.database import Database
+from bot.keyboards.inline import SEARCH_PAGE_SIZE, get_search_keyboard
+
+router = Router()
+
+
+async def split_company(db: Database, user_id: int, args: str) -> Tuple[str, Optional[str]]:
+    """
+    Отделить компанию в конце запроса
+
+    Компанией считается окончание запроса, совпадающее с одной из подписок
+    пользователя: "/search отчетность Яндекс" ищет "отчетность" по Яндексу.
+    """
+    lowered = args.lower()
+    subscriptions = sorted(await db.get_user_subscriptions(user_id), key=len, reverse=True)
+    for company_name in subscriptions:
+        suffix = ' ' + company_name.lower()
+        if lowered.endswith(suffix) and len(lowered) > len(suffix):
+            return args[:-len(suffix)].strip(), company_name
+    return args, None
+
+
+def format_results(
+        query: str,
+        company_name: Optional[str],
+        results: List[Tuple[int, Dict]],
+        first_number: int
+) -> str:
+    """Страница результатов поиска"""
+    header = f"🔎 <b>Поиск: {escape(query, quote=False)}</b>"
+    if company_name:
+        header += f" ({escape(company_name, quote=False)})"
+
+    lines = [header, ""]
+    for number, (_, article) in enumerate(results, start=first_number):
+        title = escape(article.get('title') or 'Без заголовка', quote=False)
+        url = escape(article.get('url') or '')
+        source = escape((article.get('source') or {}).get('name') or '', quote=False)
+        published_at = (article.get('publishedAt') or '')[:10]
+        details = ' · '.join(part for part in (source, published_at) if part)
+        lines.append(f"{number}. <a href=\"{url}\">{title}</a>")
+        if details:
+            lines.append(f"    {details}")
+    return "\n".join(lines)
+
+
+async def send_results_page(
+        message: Message,
+        db: Database,
+        data: dict,
+        before_id: Optional[int] = None
+) -> bool:
+    """
+    Отправить страницу результатов; False, если ничего не найдено
+
+    Запрашивается на одну статью больше страницы, чтобы знать, нужна ли
+    кнопка продолжения.
+    """
+    results = await db.search_articles(
+        data['search_query'],
+        company_name=data.get('search_company'),
+        before_id=before_id,
+        limit=SEARCH_PAGE_SIZE + 1
+    )
+    if not results:
+        return False
+
+    page, has_more = results[:SEARCH_PAGE_SIZE], len(results) > SEARCH_PAGE_SIZE
+    await message.answer(
+        format_results(
+            data['search_query'],
+            data.get('search_company'),
+            page,
+            data.get('search_shown', 0) + 1
+        ),
+        reply_markup=get_search_keyboard(page[-1][0]) if has_more else None,
+        link_preview_options=LinkPreviewOptions(is_disabled=True),
+        parse_mode="HTML"
+    )
+    data['search_shown'] = data.get('search_shown', 0) + len(page)
+    return True
+
+
+@router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext, db: Database):
+    """Поиск по уже полученным новостям (без запросов к API)"""
+    if not command.args or not command.args.strip():
+        await message.answer(
+            "❌ Использование: /search &lt;запрос&gt; [компания]\n"
+            "Пример: /search отчетность Яндекс",
+            parse_mode="HTML"
+        )
+        return
+
+    query, company_name = await split_company(db, message.from_user.id, command.args.strip())
+    data = {'search_query': query, 'search_company': company_name, 'search_shown': 0}
+    if not await send_results_page(message, db, data):
+        await message.answer("📭 В архиве ничего не найдено.")
+        return
+
+    # Запрос нужен для кнопки "Ещё": в callback_data он не помещается
+    await state.update_data(**data)
+
+
+@router.callback_query(F.data.startswith("search_more:"))
+async def callback_search_more(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Следующая страница результатов поиска"""
+    data = await state.get_data()
+    if 'search_query' not in data:
+        await callback.answer("Поиск устарел, повторите /search", show_alert=True)
+        return
+
+    await callback.answer()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    before_id = int(callback.data.split(":", 1)[1])
+    if await send_results_page(callback.message, db, data, before_id):
+        await state.update_data(search_shown=data['search_shown'])
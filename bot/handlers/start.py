@@ -65,13 +65,21 @@ async def show_help(callback: CallbackQuery):
 /remove &lt;название&gt; - Удалить компанию
 /list - Список подписок
 /check - Проверить новости
+/filter &lt;компания&gt; - Фильтры подписки с предпросмотром
+/search &lt;запрос&gt; [компания] - Поиск по полученным новостям
+/sentiment &lt;компания&gt; &lt;бычьи|медвежьи|все&gt; - Фильтр по тональности
+/trending - Компании с всплеском упоминаний
 
 <b>Примеры использования:</b>
 • /add Apple
 • /add Газпром
 • /remove Tesla
+• /filter Яндекс
+• /search отчетность Газпром
+• /sentiment Tesla медвежьи
 
 Бот автоматически проверяет новости каждый час и отправляет их вам.
+Оценивайте новости кнопками 👍/👎 - бот запомнит, какие вам интересны.
     """
 
     await callback.message.edit_text(
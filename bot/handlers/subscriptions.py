@@ -1,4 +1,7 @@
 """Обработчики подписок"""
+from html import escape
+from typing import List, Optional
+
 from aiogram import Router, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
@@ -6,11 +9,16 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from database.database import Database
 from bot.keyboards.inline import (
+    SUBSCRIPTIONS_PAGE_SIZE,
     get_subscriptions_keyboard,
     get_back_button,
-    get_main_menu_keyboard
+    get_filter_edit_keyboard,
+    get_main_menu_keyboard,
+    subscriptions_keyboard_cache
 )
-from services.news_filter import NewsFilter
+from services.news_filter import FilterPreview
+from services.news_service import NewsService
+from services.sentiment import sentiment_from_text
 
 router = Router()
 
@@ -21,7 +29,12 @@ class SubscriptionStates(StatesGroup):
     waiting_for_exclusions = State()
 
 
-@router.message(Command("add"))
+class FilterStates(StatesGroup):
+    """Редактирование фильтров подписки"""
+    editing = State()
+
+
+@router.message(Command("add"), flags={"throttling_key": "subscribe"})
 async def cmd_add_subscription(message: Message, db: Database):
     """Команда для добавления подписки"""
     try:
@@ -87,47 +100,293 @@ async def process_exclusions(message: Message, state: FSMContext, db: Database):
     await state.clear()
 
 
-@router.message(Command("filter"))
-async def cmd_filter_subscription(message: Message, db: Database):
-    """Настроить фильтры для подписки"""
-    try:
-        parts = message.text.split(maxsplit=1)
-        if len(parts) < 2:
-            await message.answer(
-                "❌ Использование: /filter <компания>\n"
-                "Пример: /filter Яндекс"
-            )
-            return
+# Ограничения черновика фильтров
+MAX_FILTER_WORDS = 30
+MAX_FILTER_WORD_LENGTH = 50
+# Примеров статей в каждой части предпросмотра
+PREVIEW_EXAMPLES = 3
 
-        company_name = parts[1].strip()
-        user_id = message.from_user.id
+FILTER_HELP = (
+    "<b>Как изменить:</b>\n"
+    "<code>- такси, карты</code> - добавить исключения\n"
+    "<code>+ выручка</code> - добавить обязательные слова\n"
+    "<code>убрать такси</code> - убрать слово\n"
+    "<code>порог 0.5</code> - порог релевантности от 0 до 1\n"
+    "Слова через запятую без знака заменяют все исключения, <code>нет</code> - убирает их."
+)
 
-        # Проверяем существование подписки
-        subscriptions = await db.get_user_subscriptions(user_id)
-        if company_name not in subscriptions:
-            await message.answer(
-                f"❌ Подписка на '<b>{company_name}</b>' не найдена",
-                parse_mode="HTML"
-            )
-            return
 
-        # Получаем текущие фильтры
-        filters = await db.get_subscription_filters(user_id, company_name)
+def _split_words(text: str) -> List[str]:
+    return [word.strip() for word in text.split(',') if word.strip()]
+
+
+def _add_words(words: List[str], new_words: List[str]) -> List[str]:
+    lowered = {word.lower() for word in words}
+    return words + [word for word in new_words if word.lower() not in lowered]
+
+
+def apply_filter_edit(text: str, draft: dict) -> Optional[str]:
+    """
+    Применить правку пользователя к черновику фильтров
+
+    Каждая строка сообщения - отдельная правка (см. FILTER_HELP).
+
+    Returns:
+        Текст ошибки или None
+    """
+    for line in text.strip().splitlines():
+        line = line.strip()
+        lowered = line.lower()
+        if not line:
+            continue
+        if line[0] in '-−':
+            draft['exclude'] = _add_words(draft['exclude'], _split_words(line[1:]))
+        elif line[0] == '+':
+            draft['include'] = _add_words(draft['include'], _split_words(line[1:]))
+        elif lowered.startswith('убрать ') or lowered.startswith('удалить '):
+            removed = {word.lower() for word in _split_words(line.split(maxsplit=1)[1])}
+            draft['exclude'] = [word for word in draft['exclude'] if word.lower() not in removed]
+            draft['include'] = [word for word in draft['include'] if word.lower() not in removed]
+        elif lowered.startswith('порог'):
+            try:
+                value = float(line[len('порог'):].strip().replace(',', '.'))
+            except ValueError:
+                return "Порог - число от 0 до 1, например: <code>порог 0.5</code>"
+            if not 0 <= value <= 1:
+                return "Порог должен быть от 0 до 1"
+            draft['min_relevance'] = value
+        elif lowered in ('нет', 'no', 'skip', '-'):
+            draft['exclude'] = []
+        else:
+            draft['exclude'] = _add_words([], _split_words(line))
+
+    words = draft['exclude'] + draft['include']
+    if len(words) > MAX_FILTER_WORDS:
+        return f"Слишком много слов: не больше {MAX_FILTER_WORDS}"
+    if any(len(word) > MAX_FILTER_WORD_LENGTH for word in words):
+        return f"Слово длиннее {MAX_FILTER_WORD_LENGTH} символов"
+    return None
+
+
+def _title(article: dict) -> str:
+    title = article.get('title') or 'Без заголовка'
+    if len(title) > 80:
+        title = title[:79] + '…'
+    return escape(title, quote=False)
+
+
+def format_filter_preview(company_name: str, draft: dict, preview: FilterPreview) -> str:
+    """Фильтры из черновика и что они оставят из последних статей"""
+    def words(items: List[str]) -> str:
+        return escape(', '.join(items), quote=False) if items else "нет"
+
+    lines = [
+        f"⚙️ <b>Фильтры: {escape(company_name, quote=False)}</b>",
+        "",
+        f"🚫 Исключения: {words(draft['exclude'])}",
+        f"✅ Обязательные слова: {words(draft['include'])}",
+        f"📏 Порог релевантности: {draft['min_relevance']:.2f}",
+        "",
+    ]
+
+    if not preview.total:
+        lines += [
+            "📭 По компании еще нет полученных статей - проверить фильтры "
+            "можно будет после первой загрузки новостей.",
+        ]
+    else:
+        change = ""
+        if preview.newly_kept or preview.newly_dropped:
+            change = f" (+{preview.newly_kept} / −{preview.newly_dropped} к текущим)"
+        lines += [
+            f"🔎 <b>Проверено последних статей: {preview.total}</b>",
+            f"✅ Останется: {len(preview.kept)}{change}",
+            f"🚫 По исключениям: {len(preview.excluded)}",
+            f"➖ Без обязательных слов: {len(preview.missing_include)}",
+            f"📉 Ниже порога: {len(preview.low_relevance)}",
+        ]
+        if preview.kept:
+            lines += ["", "<b>Останутся, например:</b>"]
+            lines += [
+                f"• {_title(article)} ({score:.2f})"
+                for article, score in preview.kept[:PREVIEW_EXAMPLES]
+            ]
+        dropped = (
+            [(article, f"«{escape(word, quote=False)}»") for article, word in preview.excluded]
+            + [(article, f"нет «{escape(word, quote=False)}»") for article, word in preview.missing_include]
+            + [(article, f"оценка {score:.2f}") for article, score in preview.low_relevance]
+        )
+        if dropped:
+            lines += ["", "<b>Будут отсеяны, например:</b>"]
+            lines += [f"• {_title(article)} - {reason}" for article, reason in dropped[:PREVIEW_EXAMPLES]]
+
+    lines += ["", FILTER_HELP]
+    return "\n".join(lines)
 
-        current = ""
-        if filters['exclude']:
-            current = f"\n\n<b>Текущие исключения:</b>\n{', '.join(filters['exclude'])}"
 
+async def show_filter_preview(message: Message, state: FSMContext, news_service: NewsService):
+    """Отправить предпросмотр черновика фильтров из данных FSM"""
+    data = await state.get_data()
+    draft = data['filter_draft']
+    current = data['filter_current']
+    preview = await news_service.preview_filters(
+        data['filter_company'],
+        draft['exclude'],
+        draft['include'],
+        draft['min_relevance'],
+        current=(current['exclude'], current['include'], current['min_relevance'])
+    )
+    await message.answer(
+        format_filter_preview(data['filter_company'], draft, preview),
+        reply_markup=get_filter_edit_keyboard(),
+        parse_mode="HTML"
+    )
+
+
+@router.message(Command("filter"), flags={"profile": "filter"})
+async def cmd_filter_subscription(
+        message: Message,
+        state: FSMContext,
+        db: Database,
+        news_service: NewsService
+):
+    """Настроить фильтры для подписки с предпросмотром на последних статьях"""
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
         await message.answer(
-            f"⚙️ <b>Настройка фильтров</b>\n\n"
-            f"Компания: <b>{company_name}</b>"
-            f"{current}\n\n"
-            f"Введите новые слова-исключения через запятую:",
+            "❌ Использование: /filter &lt;компания&gt;\n"
+            "Пример: /filter Яндекс",
             parse_mode="HTML"
         )
+        return
 
-    except Exception as e:
-        await message.answer(f"❌ Ошибка: {str(e)}")
+    company_name = parts[1].strip()
+    user_id = message.from_user.id
+
+    # Проверяем существование подписки
+    subscriptions = await db.get_user_subscriptions(user_id)
+    if company_name not in subscriptions:
+        await message.answer(
+            f"❌ Подписка на '<b>{escape(company_name, quote=False)}</b>' не найдена",
+            parse_mode="HTML"
+        )
+        return
+
+    filters = await db.get_subscription_filters(user_id, company_name)
+    current = {
+        'exclude': filters['exclude'],
+        'include': filters['include'],
+        'min_relevance': filters['min_relevance'],
+    }
+    await state.set_state(FilterStates.editing)
+    await state.update_data(filter_company=company_name, filter_current=current, filter_draft=dict(current))
+    await show_filter_preview(message, state, news_service)
+
+
+@router.message(FilterStates.editing, F.text, ~F.text.startswith('/'), flags={"profile": "filter"})
+async def process_filter_edit(message: Message, state: FSMContext, news_service: NewsService):
+    """Правка черновика фильтров и новый предпросмотр"""
+    data = await state.get_data()
+    draft = {key: list(value) if isinstance(value, list) else value
+             for key, value in data['filter_draft'].items()}
+
+    error = apply_filter_edit(message.text, draft)
+    if error:
+        await message.answer(f"❌ {error}", parse_mode="HTML")
+        return
+
+    await state.update_data(filter_draft=draft)
+    await show_filter_preview(message, state, news_service)
+
+
+@router.callback_query(FilterStates.editing, F.data == "filter_save")
+async def callback_filter_save(callback: CallbackQuery, state: FSMContext, db: Database):
+    """Сохранить черновик фильтров в подписку"""
+    data = await state.get_data()
+    company_name = data['filter_company']
+    draft = data['filter_draft']
+
+    saved = await db.update_subscription_filters(
+        callback.from_user.id,
+        company_name,
+        draft['exclude'],
+        draft['include'],
+        draft['min_relevance']
+    )
+    await state.clear()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    if saved:
+        await callback.answer("✅ Фильтры сохранены")
+        await callback.message.answer(
+            f"✅ Фильтры <b>{escape(company_name, quote=False)}</b> сохранены",
+            reply_markup=get_main_menu_keyboard(),
+            parse_mode="HTML"
+        )
+    else:
+        await callback.answer("❌ Подписка не найдена", show_alert=True)
+
+
+@router.callback_query(FilterStates.editing, F.data == "filter_reset")
+async def callback_filter_reset(callback: CallbackQuery, state: FSMContext, news_service: NewsService):
+    """Вернуть черновик к сохраненным фильтрам"""
+    data = await state.get_data()
+    await state.update_data(filter_draft=dict(data['filter_current']))
+    await callback.answer("↩️ Фильтры как были")
+    await show_filter_preview(callback.message, state, news_service)
+
+
+@router.callback_query(F.data.in_({"filter_save", "filter_reset", "filter_cancel"}))
+async def callback_filter_cancel(callback: CallbackQuery, state: FSMContext):
+    """Отменить редактирование (и кнопки устаревших предпросмотров)"""
+    if await state.get_state() == FilterStates.editing.state:
+        await state.clear()
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.answer("Изменения фильтров отменены")
+
+
+SENTIMENT_NAMES = {
+    'any': "все новости",
+    'bullish': "🐂 только бычьи",
+    'bearish': "🐻 только медвежьи",
+}
+
+
+@router.message(Command("sentiment"))
+async def cmd_sentiment_filter(message: Message, db: Database):
+    """Фильтр подписки по тональности: /sentiment <компания> <бычьи|медвежьи|все>"""
+    parts = message.text.split(maxsplit=1)
+    args = parts[1].strip() if len(parts) > 1 else ''
+    subscriptions = await db.get_user_subscriptions(message.from_user.id)
+
+    # Название компании может состоять из нескольких слов, режим - последнее слово
+    company_name, _, mode = args.rpartition(' ')
+    sentiment = sentiment_from_text(mode)
+    if sentiment is None:
+        company_name = args
+
+    if company_name not in subscriptions:
+        await message.answer(
+            "❌ Использование: /sentiment &lt;компания&gt; &lt;бычьи|медвежьи|все&gt;\n"
+            "Пример: /sentiment Tesla медвежьи\n\n"
+            "Компания должна быть в ваших подписках.",
+            parse_mode="HTML"
+        )
+        return
+
+    if sentiment is None:
+        filters = await db.get_subscription_filters(message.from_user.id, company_name)
+        await message.answer(
+            f"📊 <b>{escape(company_name, quote=False)}</b>: {SENTIMENT_NAMES[filters['sentiment']]}\n\n"
+            f"Изменить: /sentiment {escape(company_name, quote=False)} &lt;бычьи|медвежьи|все&gt;",
+            parse_mode="HTML"
+        )
+        return
+
+    await db.update_subscription_sentiment(message.from_user.id, company_name, sentiment)
+    await message.answer(
+        f"✅ <b>{escape(company_name, quote=False)}</b>: {SENTIMENT_NAMES[sentiment]}",
+        parse_mode="HTML"
+    )
 
 
 @router.callback_query(F.data == "add_subscription")
@@ -145,7 +404,7 @@ async def callback_add_subscription(callback: CallbackQuery, state: FSMContext):
 
 
 @router.message(SubscriptionStates.waiting_for_company)
-async def process_company_name(message: Message, state: FSMContext):
+async def process_company_name(message: Message, state: FSMContext, news_service: NewsService):
     """Обработка названия компании"""
     company_name = message.text.strip()
 
@@ -156,13 +415,16 @@ async def process_company_name(message: Message, state: FSMContext):
     # Сохраняем название компании
     await state.update_data(company_name=company_name)
 
-    # Получаем рекомендуемые исключения
-    filter_service = NewsFilter()
-    suggested_exclusions = filter_service.get_common_exclusions(company_name)
+    # Рекомендуемые исключения - слова, частые в статьях, где компания
+    # упоминается вскользь
+    suggested_exclusions = await news_service.suggest_exclusions(company_name)
 
     suggestion_text = ""
     if suggested_exclusions:
-        suggestion_text = f"\n\n💡 <b>Рекомендуемые исключения:</b>\n{', '.join(suggested_exclusions)}"
+        suggestion_text = (
+            f"\n\n💡 <b>Рекомендуемые исключения:</b>\n"
+            f"{escape(', '.join(suggested_exclusions), quote=False)}"
+        )
 
     await message.answer(
         f"✍️ <b>Шаг 2/2: Фильтрация новостей</b>\n\n"
@@ -176,7 +438,7 @@ async def process_company_name(message: Message, state: FSMContext):
     await state.set_state(SubscriptionStates.waiting_for_exclusions)
 
 
-@router.message(Command("remove"))
+@router.message(Command("remove"), flags={"throttling_key": "subscribe"})
 async def cmd_remove_subscription(message: Message, db: Database):
     """Команда для удаления подписки"""
     try:
@@ -200,68 +462,122 @@ async def cmd_remove_subscription(message: Message, db: Database):
         )
 
 
+async def render_subscriptions_page(db: Database, user_id: int, page: int):
+    """
+    Текст и клавиатура страницы списка подписок
+
+    Готовые клавиатуры берутся из кэша по версии списка подписок, так что
+    повторный показ стоит одного запроса версии. Размер ответа не зависит
+    от числа подписок.
+
+    Returns:
+        (текст, клавиатура) или None, если подписок нет
+    """
+    version = await db.get_subscriptions_version(user_id)
+    cached = subscriptions_keyboard_cache.get(user_id, version, page)
+    if cached:
+        keyboard, total = cached
+    else:
+        rows, total = await db.get_user_subscriptions_page(
+            user_id, page * SUBSCRIPTIONS_PAGE_SIZE, SUBSCRIPTIONS_PAGE_SIZE
+        )
+        if total == 0:
+            return None
+        if not rows:
+            # Страница исчезла после отписок - показываем последнюю
+            page = (total - 1) // SUBSCRIPTIONS_PAGE_SIZE
+            return await render_subscriptions_page(db, user_id, page)
+
+        pages = (total + SUBSCRIPTIONS_PAGE_SIZE - 1) // SUBSCRIPTIONS_PAGE_SIZE
+        keyboard = get_subscriptions_keyboard(rows, page, pages)
+        subscriptions_keyboard_cache.put(user_id, version, page, keyboard, total)
+
+    text = (
+        f"📊 <b>Ваши подписки ({total}):</b>\n\n"
+        f"Нажмите на компанию, чтобы отписаться:"
+    )
+    return text, keyboard
+
+
 @router.message(Command("list"))
 async def cmd_list_subscriptions(message: Message, db: Database):
     """Список подписок"""
-    user_id = message.from_user.id
-    subscriptions = await db.get_user_subscriptions(user_id)
+    page = await render_subscriptions_page(db, message.from_user.id, 0)
 
-    if subscriptions:
-        text = "📊 <b>Ваши подписки:</b>\n\n"
-        for idx, company in enumerate(subscriptions, 1):
-            text += f"{idx}. {company}\n"
-
-        await message.answer(text, parse_mode="HTML")
+    if page:
+        text, keyboard = page
+        await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
     else:
         await message.answer(
             "📭 У вас пока нет подписок.\n"
-            "Используйте /add <название компании>"
+            "Используйте /add &lt;название компании&gt;",
+            parse_mode="HTML"
         )
 
 
 @router.callback_query(F.data == "list_subscriptions")
 async def callback_list_subscriptions(callback: CallbackQuery, db: Database):
     """Показать список подписок через callback"""
-    user_id = callback.from_user.id
-    subscriptions = await db.get_user_subscriptions(user_id)
+    await show_subscriptions_page(callback, db, 0)
+    await callback.answer()
+
 
-    if subscriptions:
-        text = "📊 <b>Ваши подписки:</b>\n\nНажмите на компанию, чтобы отписаться:"
-        keyboard = get_subscriptions_keyboard(subscriptions)
+@router.callback_query(F.data.startswith("subs_page:"))
+async def callback_subscriptions_page(callback: CallbackQuery, db: Database):
+    """Перелистнуть список подписок"""
+    page = int(callback.data.split(":", 1)[1])
+    await show_subscriptions_page(callback, db, max(page, 0))
+    await callback.answer()
+
+
+@router.callback_query(F.data == "noop")
+async def callback_noop(callback: CallbackQuery):
+    """Кнопка-индикатор страницы"""
+    await callback.answer()
+
+
+async def show_subscriptions_page(
+        callback: CallbackQuery,
+        db: Database,
+        page: int,
+        empty_text: str = "📭 У вас пока нет подписок.\n\nИспользуйте кнопку «Добавить компанию»"
+):
+    """Показать страницу подписок в сообщении с кнопками"""
+    rendered = await render_subscriptions_page(db, callback.from_user.id, page)
+    if rendered:
+        text, keyboard = rendered
     else:
-        text = "📭 У вас пока нет подписок.\n\nИспользуйте кнопку «Добавить компанию»"
-        keyboard = get_back_button()
+        text, keyboard = empty_text, get_back_button()
 
     await callback.message.edit_text(
         text,
         reply_markup=keyboard,
         parse_mode="HTML"
     )
-    await callback.answer()
 
 
-@router.callback_query(F.data.startswith("unsub:"))
+@router.callback_query(F.data.startswith("unsub:"), flags={"throttling_key": "subscribe"})
 async def callback_unsubscribe(callback: CallbackQuery, db: Database):
     """Отписаться от компании"""
-    company_name = callback.data.split(":", 1)[1]
+    parts = callback.data.split(":")
     user_id = callback.from_user.id
 
-    if await db.remove_subscription(user_id, company_name):
+    if len(parts) == 3 and parts[1].isdigit() and parts[2].isdigit():
+        subscription_id, page = int(parts[1]), int(parts[2])
+        company_name = await db.remove_subscription_by_id(user_id, subscription_id)
+    else:
+        # Кнопки старого формата unsub:<компания> в ранее отправленных сообщениях
+        page = 0
+        company_name = callback.data.split(":", 1)[1]
+        if not await db.remove_subscription(user_id, company_name):
+            company_name = None
+
+    if company_name:
         await callback.answer(f"✅ Отписка от {company_name}", show_alert=True)
 
         # Обновляем список
-        subscriptions = await db.get_user_subscriptions(user_id)
-        if subscriptions:
-            text = "📊 <b>Ваши подписки:</b>\n\nНажмите на компанию, чтобы отписаться:"
-            keyboard = get_subscriptions_keyboard(subscriptions)
-        else:
-            text = "📭 У вас больше нет подписок."
-            keyboard = get_back_button()
-
-        await callback.message.edit_text(
-            text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
+        await show_subscriptions_page(
+            callback, db, page, empty_text="📭 У вас больше нет подписок."
         )
     else:
         await callback.answer("❌ Ошибка при отписке", show_alert=True)
@@ -1,11 +1,19 @@
 """Inline клавиатуры"""
+from collections import OrderedDict
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List
+from typing import List, Optional, Tuple
 
+from services.feedback import feedback_callback_data
 
-def get_main_menu_keyboard() -> InlineKeyboardMarkup:
-    """Главное меню"""
+# Подписок на одной странице списка
+SUBSCRIPTIONS_PAGE_SIZE = 8
+
+# Результатов /search на одной странице
+SEARCH_PAGE_SIZE = 5
+
+
+def _build_main_menu_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     builder.row(
         InlineKeyboardButton(text="➕ Добавить компанию", callback_data="add_subscription")
@@ -22,17 +30,91 @@ def get_main_menu_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def get_subscriptions_keyboard(subscriptions: List[str]) -> InlineKeyboardMarkup:
-    """Клавиатура со списком подписок"""
+def _build_back_button() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="« Назад", callback_data="back_to_menu")
+    )
+    return builder.as_markup()
+
 
-    for company in subscriptions:
+def _build_filter_edit_keyboard() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="💾 Сохранить", callback_data="filter_save"),
+        InlineKeyboardButton(text="↩️ Как было", callback_data="filter_reset")
+    )
+    builder.row(
+        InlineKeyboardButton(text="✖️ Отмена", callback_data="filter_cancel")
+    )
+    return builder.as_markup()
+
+
+# Статические клавиатуры не зависят от пользователя и строятся один раз
+_MAIN_MENU_KEYBOARD = _build_main_menu_keyboard()
+_BACK_BUTTON = _build_back_button()
+_FILTER_EDIT_KEYBOARD = _build_filter_edit_keyboard()
+
+
+def get_main_menu_keyboard() -> InlineKeyboardMarkup:
+    """Главное меню"""
+    return _MAIN_MENU_KEYBOARD
+
+
+def get_search_keyboard(last_article_id: int) -> InlineKeyboardMarkup:
+    """
+    Кнопка следующей страницы поиска
+
+    Запрос хранится в данных FSM, в callback_data - только id последней
+    показанной статьи (ключ пагинации).
+    """
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text="Ещё ▶️", callback_data=f"search_more:{last_article_id}")
+    )
+    return builder.as_markup()
+
+
+def get_subscriptions_keyboard(
+        subscriptions: List[Tuple[int, str]],
+        page: int,
+        pages: int
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура одной страницы списка подписок
+
+    В callback_data передается id подписки, а не название компании:
+    длинное название не помещается в 64 байта.
+
+    Args:
+        subscriptions: Подписки страницы [(id подписки, компания), ...]
+        page: Номер страницы (с нуля)
+        pages: Всего страниц
+    """
+    builder = InlineKeyboardBuilder()
+
+    for subscription_id, company in subscriptions:
         builder.row(
             InlineKeyboardButton(
                 text=f"❌ {company}",
-                callback_data=f"unsub:{company}"
+                callback_data=f"unsub:{subscription_id}:{page}"
+            )
+        )
+
+    if pages > 1:
+        navigation = []
+        if page > 0:
+            navigation.append(
+                InlineKeyboardButton(text="‹", callback_data=f"subs_page:{page - 1}")
             )
+        navigation.append(
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="noop")
         )
+        if page < pages - 1:
+            navigation.append(
+                InlineKeyboardButton(text="›", callback_data=f"subs_page:{page + 1}")
+            )
+        builder.row(*navigation)
 
     builder.row(
         InlineKeyboardButton(text="« Назад", callback_data="back_to_menu")
@@ -43,8 +125,81 @@ def get_subscriptions_keyboard(subscriptions: List[str]) -> InlineKeyboardMarkup
 
 def get_back_button() -> InlineKeyboardMarkup:
     """Кнопка назад"""
+    return _BACK_BUTTON
+
+
+def get_filter_edit_keyboard() -> InlineKeyboardMarkup:
+    """
+    Кнопки редактирования фильтров
+
+    Компания и черновик фильтров хранятся в данных FSM, поэтому
+    callback_data одинаковы для всех подписок.
+    """
+    return _FILTER_EDIT_KEYBOARD
+
+
+def get_feedback_keyboard(
+        article_hash: str,
+        tag: str,
+        liked: Optional[bool] = None
+) -> InlineKeyboardMarkup:
+    """
+    Кнопки оценки новости 👍/👎
+
+    В callback_data - хэш URL статьи и короткая метка компании: название
+    компании восстанавливается по подпискам пользователя.
+
+    Args:
+        article_hash: Хэш URL статьи
+        tag: Метка компании (company_tag)
+        liked: Уже поставленная оценка (отмечается на кнопке)
+    """
     builder = InlineKeyboardBuilder()
     builder.row(
-        InlineKeyboardButton(text="« Назад", callback_data="back_to_menu")
+        InlineKeyboardButton(
+            text="👍 Полезно" if liked else "👍",
+            callback_data=feedback_callback_data(True, article_hash, tag)
+        ),
+        InlineKeyboardButton(
+            text="👎 Мимо" if liked is False else "👎",
+            callback_data=feedback_callback_data(False, article_hash, tag)
+        )
     )
     return builder.as_markup()
+
+
+class SubscriptionsKeyboardCache:
+    """
+    Кэш готовых страниц списка подписок
+
+    Ключ - (пользователь, версия списка подписок, страница). Версия
+    меняется в БД при каждом добавлении и удалении подписки, поэтому
+    устаревшие страницы просто перестают запрашиваться и вытесняются.
+    """
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._pages: OrderedDict[Tuple[int, int, int], Tuple[InlineKeyboardMarkup, int]] = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, version: int, page: int):
+        """Вернуть (клавиатура, всего подписок) или None"""
+        key = (user_id, version, page)
+        cached = self._pages.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._pages.move_to_end(key)
+        return cached
+
+    def put(self, user_id: int, version: int, page: int, keyboard: InlineKeyboardMarkup, total: int):
+        self._pages[(user_id, version, page)] = (keyboard, total)
+        if len(self._pages) > self.max_size:
+            self._pages.popitem(last=False)
+
+
+subscriptions_keyboard_cache = SubscriptionsKeyboardCache()
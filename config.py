@@ -1,6 +1,9 @@
 """Конфигурация бота"""
+import hashlib
 import os
-from dataclasses import dataclass
+import re
+import secrets
+from dataclasses import dataclass, field
 from environs import Env
 
 
@@ -8,6 +11,7 @@ from environs import Env
 class TgBot:
     """Конфигурация Telegram бота"""
     token: str
+    api_url: str = ''  # свой Bot API сервер (по умолчанию api.telegram.org)
 
 
 @dataclass
@@ -17,6 +21,94 @@ class GNewsConfig:
     base_url: str = "https://gnews.io/api/v4/search"
     language: str = "ru"
     max_results: int = 5
+    cache_ttl: int = 300  # время жизни кэша ответов API в секундах
+    daily_quota: int = 100  # запросов в сутки по тарифу GNews
+    record_path: str = ''  # записывать ответы API в этот файл (.jsonl.gz)
+    replay_path: str = ''  # отдавать ответы из записи вместо запросов к API
+    replay_speed: float = 1.0  # ускорение воспроизведения (0 - без ожидания)
+    timeout: float = 10  # таймаут запроса к API, сек
+    retries: int = 2  # повторов при временной ошибке (таймаут, 5xx, 429)
+    retry_base_delay: float = 0.5  # начальная пауза перед повтором, сек
+    retry_max_delay: float = 8.0  # максимальная пауза перед повтором, сек
+    max_retry_after: float = 10.0  # дольше по Retry-After не ждем, а открываем breaker
+    breaker_failures: int = 5  # неудачных запросов подряд до размыкания
+    breaker_recovery: float = 60.0  # через сколько секунд пробовать снова
+    stale_ttl: int = 86400  # сколько секунд отдавать прошлый ответ при сбое API
+
+
+@dataclass
+class ProvidersConfig:
+    """Конфигурация дополнительных источников новостей"""
+    rss_feeds_file: str = ''  # JSON {"Компания": ["URL ленты", ...]}
+    rss_concurrency: int = 8  # одновременных запросов к лентам
+    rss_timeout: float = 10  # таймаут запроса ленты, сек
+    rss_max_items: int = 50  # сколько записей ленты разбирать
+
+
+@dataclass
+class EnrichmentConfig:
+    """Конфигурация загрузки полного текста пограничных статей"""
+    enabled: bool = False
+    margin: float = 0.15  # пограничные - оценка в пределах margin от порога
+    concurrency: int = 8  # одновременных загрузок страниц всего
+    per_host: int = 2  # одновременных загрузок с одного сайта
+    max_bytes: int = 512 * 1024  # сколько байт страницы читать
+    max_chars: int = 20000  # сколько символов текста хранить
+    timeout: float = 10  # таймаут загрузки страницы, сек
+    cache_dir: str = 'enrichment_cache'  # дисковый кэш текстов
+    cache_max_files: int = 5000  # сколько текстов хранить в кэше
+
+
+@dataclass
+class SentimentConfig:
+    """Конфигурация оценки тональности новостей"""
+    enabled: bool = True
+    model_path: str = ''  # JSON с весами линейной модели поверх словаря
+    threshold: float = 0.2  # |оценка| не меньше порога - бычья или медвежья
+    cache_size: int = 50000  # сколько оценок статей помнить
+
+
+@dataclass
+class TrendingConfig:
+    """Конфигурация поиска компаний и тем с всплеском упоминаний"""
+    enabled: bool = True
+    width: int = 4096  # ширина count-min sketch
+    depth: int = 4  # число хэш-функций
+    top_k: int = 64  # сколько самых упоминаемых сущностей отслеживать
+    short_half_life: float = 3600  # период полураспада "свежего" окна, сек
+    long_half_life: float = 86400  # период полураспада базового окна, сек
+    surge_ratio: float = 3.0  # во сколько раз свежая частота выше обычной
+    min_mentions: float = 3  # минимум упоминаний в свежем окне
+    warmup: float = 7200  # сколько собирать статистику до первых всплесков, сек
+    max_boost: float = 4.0  # во сколько раз можно ускорить опрос компании
+
+
+@dataclass
+class FeedbackConfig:
+    """Конфигурация подстройки релевантности по 👍/👎 пользователей"""
+    enabled: bool = True
+    learning_rate: float = 0.05  # шаг обновления весов на одну оценку
+    threshold_rate: float = 0.02  # шаг сдвига порога на одну оценку
+    max_adjust: float = 0.3  # на сколько модель может изменить оценку статьи
+    max_shift: float = 0.2  # на сколько модель может сдвинуть порог подписки
+    cache_size: int = 10000  # сколько моделей (пользователь, компания) держать в памяти
+    cache_ttl: float = 300  # через сколько секунд перечитывать модель из БД
+
+
+@dataclass
+class ExclusionsConfig:
+    """Конфигурация рекомендуемых исключений по статистике полученных статей"""
+    enabled: bool = True
+    low_score: float = 0.5  # статьи с оценкой ниже - "шум" (компания не в заголовке)
+    high_score: float = 0.7  # статьи с оценкой не ниже - точно о компании
+    suggestions: int = 7  # сколько слов предлагать
+    min_count: float = 3  # минимум статей с низкой оценкой, где встречалось слово
+    min_z: float = 2.5  # минимальная значимость отличия частот (z-оценка)
+    max_terms: int = 2000  # сколько слов компании хранить в БД
+    max_docs: float = 5000  # после стольких статей счетчики компании делятся пополам
+    max_pending: int = 50000  # слов в памяти до внеочередного снимка в БД
+    snapshot_interval: float = 60  # как часто сохранять счетчики в БД, сек
+    cache_ttl: float = 300  # сколько секунд показывать готовые рекомендации
 
 
 @dataclass
@@ -29,6 +121,61 @@ class DatabaseConfig:
 class SchedulerConfig:
     """Конфигурация планировщика"""
     check_interval: int  # в секундах
+    min_poll_interval: int = 900  # минимальный интервал опроса компании
+    max_poll_interval: int = 6 * 3600  # максимальный интервал опроса компании
+    dispatch_tick: int = 60  # шаг диспетчера опросов
+    worker_id: str = ''  # идентификатор воркера (по умолчанию host-pid)
+    lease_ttl: int = 180  # время жизни аренды компании воркером
+
+
+@dataclass
+class CheckConfig:
+    """Конфигурация ручной проверки новостей (/check)"""
+    cooldown: int = 60  # минимальная пауза между проверками пользователя
+    concurrency: int = 4  # одновременных запросов к API на одну проверку
+
+
+@dataclass
+class ThrottlingConfig:
+    """Конфигурация ограничения частоты запросов пользователя"""
+    rate: float = 1.0  # событий в секунду на пользователя
+    burst: int = 5  # допустимый всплеск
+
+
+@dataclass
+class FSMConfig:
+    """Конфигурация хранилища состояний FSM"""
+    state_ttl: int = 86400  # через сколько секунд брошенный диалог сбрасывается
+    flush_interval: float = 1.0  # период записи изменений в БД
+
+
+@dataclass
+class ArchiveConfig:
+    """Конфигурация архива статей"""
+    retention_days: int = 30  # сколько дней хранить статьи для /search
+
+
+@dataclass
+class ProfilingConfig:
+    """Конфигурация режима профилирования"""
+    enabled: bool = False
+    directory: str = 'profiles'  # куда писать файлы профилей
+    keep: int = 10  # сколько последних профилей хранить на каждое имя
+    slow_callback_ms: int = 100  # порог блокировки event loop для лога
+    lag_interval: float = 0.5  # период проверки задержки event loop
+    admin_token: str = ''  # токен для /admin/profiles (без него маршрут не подключается)
+
+
+@dataclass
+class LoggingConfig:
+    """Конфигурация логирования"""
+    level: str = 'INFO'
+    file: str = 'bot.log'  # пустая строка - только консоль
+    max_bytes: int = 10 * 1024 * 1024  # размер файла лога до ротации
+    backup_count: int = 5  # сколько старых файлов хранить
+    json: bool = False  # JSON-строки с полями контекста (cycle, company)
+    error_interval: float = 60  # окно ограничения повторяющихся ошибок, сек
+    error_burst: int = 5  # ошибок с одного места за окно
 
 
 @dataclass
@@ -37,6 +184,16 @@ class RenderConfig:
     port: int
     external_url: str | None
     is_render: bool
+    metrics_token: str = ''  # токен для /metrics (без него - только с localhost)
+
+
+@dataclass
+class WebhookConfig:
+    """Конфигурация режима получения апдейтов"""
+    enabled: bool  # webhook вместо long polling
+    path: str = '/webhook'
+    secret: str = ''  # X-Telegram-Bot-Api-Secret-Token
+    max_concurrency: int = 20  # одновременно обрабатываемых апдейтов
 
 
 @dataclass
@@ -47,6 +204,38 @@ class Config:
     database: DatabaseConfig
     scheduler: SchedulerConfig
     render: RenderConfig
+    check: CheckConfig = field(default_factory=CheckConfig)
+    throttling: ThrottlingConfig = field(default_factory=ThrottlingConfig)
+    fsm: FSMConfig = field(default_factory=FSMConfig)
+    archive: ArchiveConfig = field(default_factory=ArchiveConfig)
+    providers: ProvidersConfig = field(default_factory=ProvidersConfig)
+    enrichment: EnrichmentConfig = field(default_factory=EnrichmentConfig)
+    sentiment: SentimentConfig = field(default_factory=SentimentConfig)
+    trending: TrendingConfig = field(default_factory=TrendingConfig)
+    feedback: FeedbackConfig = field(default_factory=FeedbackConfig)
+    exclusions: ExclusionsConfig = field(default_factory=ExclusionsConfig)
+    profiling: ProfilingConfig = field(default_factory=ProfilingConfig)
+    logging: LoggingConfig = field(default_factory=LoggingConfig)
+    webhook: WebhookConfig = field(default_factory=lambda: WebhookConfig(enabled=False))
+
+
+# Telegram принимает secret_token только из этих символов
+_WEBHOOK_SECRET_RE = re.compile(r'[A-Za-z0-9_-]{1,256}')
+
+
+def webhook_secret(value: str) -> str:
+    """
+    Секрет webhook в допустимом для Telegram виде
+
+    Пустое значение - случайный секрет на время работы процесса. Значение
+    с недопустимыми символами (например, base64 с "+", "/" и "=") заменяется
+    его SHA-256 в hex: секрет остается постоянным между перезапусками.
+    """
+    if not value:
+        return secrets.token_urlsafe(32)
+    if _WEBHOOK_SECRET_RE.fullmatch(value):
+        return value
+    return hashlib.sha256(value.encode()).hexdigest()
 
 
 def load_config(path: str = None) -> Config:
@@ -64,24 +253,143 @@ def load_config(path: str = None) -> Config:
         os.makedirs('/opt/render/project/src/data', exist_ok=True)
         default_db_path = '/opt/render/project/src/data/news_bot.db'
 
+    # Webhook по умолчанию на Render (есть внешний URL), локально - polling
+    external_url = env.str("RENDER_EXTERNAL_URL", None)
+    bot_mode = env.str("BOT_MODE", "webhook" if external_url else "polling")
+
     return Config(
         tg_bot=TgBot(
-            token=env.str("BOT_TOKEN")
+            token=env.str("BOT_TOKEN"),
+            api_url=env.str("TELEGRAM_API_URL", "")
         ),
         gnews=GNewsConfig(
             api_key=env.str("GNEWS_API_KEY"),
             language=env.str("GNEWS_LANGUAGE", "ru"),
-            max_results=env.int("GNEWS_MAX_RESULTS", 5)
+            max_results=env.int("GNEWS_MAX_RESULTS", 5),
+            cache_ttl=env.int("GNEWS_CACHE_TTL", 300),
+            daily_quota=env.int("GNEWS_DAILY_QUOTA", 100),
+            record_path=env.str("GNEWS_RECORD", ""),
+            replay_path=env.str("GNEWS_REPLAY", ""),
+            replay_speed=env.float("GNEWS_REPLAY_SPEED", 1.0),
+            timeout=env.float("GNEWS_TIMEOUT", 10),
+            retries=env.int("GNEWS_RETRIES", 2),
+            retry_base_delay=env.float("GNEWS_RETRY_BASE_DELAY", 0.5),
+            retry_max_delay=env.float("GNEWS_RETRY_MAX_DELAY", 8.0),
+            max_retry_after=env.float("GNEWS_MAX_RETRY_AFTER", 10.0),
+            breaker_failures=env.int("GNEWS_BREAKER_FAILURES", 5),
+            breaker_recovery=env.float("GNEWS_BREAKER_RECOVERY", 60.0),
+            stale_ttl=env.int("GNEWS_STALE_TTL", 86400)
         ),
         database=DatabaseConfig(
             path=env.str("DATABASE_PATH", default_db_path)
         ),
         scheduler=SchedulerConfig(
-            check_interval=env.int("CHECK_INTERVAL", 3600)
+            check_interval=env.int("CHECK_INTERVAL", 3600),
+            min_poll_interval=env.int("MIN_POLL_INTERVAL", 900),
+            max_poll_interval=env.int("MAX_POLL_INTERVAL", 6 * 3600),
+            dispatch_tick=env.int("DISPATCH_TICK", 60),
+            worker_id=env.str("WORKER_ID", ""),
+            lease_ttl=env.int("LEASE_TTL", 180)
         ),
         render=RenderConfig(
             port=env.int("PORT", 8080),
-            external_url=env.str("RENDER_EXTERNAL_URL", None),
-            is_render=is_render
+            external_url=external_url,
+            is_render=is_render,
+            metrics_token=env.str("METRICS_TOKEN", "")
+        ),
+        check=CheckConfig(
+            cooldown=env.int("CHECK_COOLDOWN", 60),
+            concurrency=env.int("CHECK_CONCURRENCY", 4)
+        ),
+        throttling=ThrottlingConfig(
+            rate=env.float("THROTTLE_RATE", 1.0),
+            burst=env.int("THROTTLE_BURST", 5)
+        ),
+        fsm=FSMConfig(
+            state_ttl=env.int("FSM_STATE_TTL", 86400),
+            flush_interval=env.float("FSM_FLUSH_INTERVAL", 1.0)
+        ),
+        providers=ProvidersConfig(
+            rss_feeds_file=env.str("RSS_FEEDS_FILE", ""),
+            rss_concurrency=env.int("RSS_CONCURRENCY", 8),
+            rss_timeout=env.float("RSS_TIMEOUT", 10),
+            rss_max_items=env.int("RSS_MAX_ITEMS", 50)
+        ),
+        enrichment=EnrichmentConfig(
+            enabled=env.bool("ENRICHMENT", False),
+            margin=env.float("ENRICHMENT_MARGIN", 0.15),
+            concurrency=env.int("ENRICHMENT_CONCURRENCY", 8),
+            per_host=env.int("ENRICHMENT_PER_HOST", 2),
+            max_bytes=env.int("ENRICHMENT_MAX_BYTES", 512 * 1024),
+            max_chars=env.int("ENRICHMENT_MAX_CHARS", 20000),
+            timeout=env.float("ENRICHMENT_TIMEOUT", 10),
+            cache_dir=env.str("ENRICHMENT_CACHE_DIR", "enrichment_cache"),
+            cache_max_files=env.int("ENRICHMENT_CACHE_MAX_FILES", 5000)
+        ),
+        sentiment=SentimentConfig(
+            enabled=env.bool("SENTIMENT", True),
+            model_path=env.str("SENTIMENT_MODEL", ""),
+            threshold=env.float("SENTIMENT_THRESHOLD", 0.2),
+            cache_size=env.int("SENTIMENT_CACHE_SIZE", 50000)
+        ),
+        trending=TrendingConfig(
+            enabled=env.bool("TRENDING", True),
+            width=env.int("TRENDING_WIDTH", 4096),
+            depth=env.int("TRENDING_DEPTH", 4),
+            top_k=env.int("TRENDING_TOP_K", 64),
+            short_half_life=env.float("TRENDING_SHORT_HALF_LIFE", 3600),
+            long_half_life=env.float("TRENDING_LONG_HALF_LIFE", 86400),
+            surge_ratio=env.float("TRENDING_SURGE_RATIO", 3.0),
+            min_mentions=env.float("TRENDING_MIN_MENTIONS", 3),
+            warmup=env.float("TRENDING_WARMUP", 7200),
+            max_boost=env.float("TRENDING_MAX_BOOST", 4.0)
+        ),
+        feedback=FeedbackConfig(
+            enabled=env.bool("FEEDBACK", True),
+            learning_rate=env.float("FEEDBACK_LEARNING_RATE", 0.05),
+            threshold_rate=env.float("FEEDBACK_THRESHOLD_RATE", 0.02),
+            max_adjust=env.float("FEEDBACK_MAX_ADJUST", 0.3),
+            max_shift=env.float("FEEDBACK_MAX_SHIFT", 0.2),
+            cache_size=env.int("FEEDBACK_CACHE_SIZE", 10000),
+            cache_ttl=env.float("FEEDBACK_CACHE_TTL", 300)
+        ),
+        exclusions=ExclusionsConfig(
+            enabled=env.bool("EXCLUSIONS", True),
+            low_score=env.float("EXCLUSIONS_LOW_SCORE", 0.5),
+            high_score=env.float("EXCLUSIONS_HIGH_SCORE", 0.7),
+            suggestions=env.int("EXCLUSIONS_SUGGESTIONS", 7),
+            min_count=env.float("EXCLUSIONS_MIN_COUNT", 3),
+            min_z=env.float("EXCLUSIONS_MIN_Z", 2.5),
+            max_terms=env.int("EXCLUSIONS_MAX_TERMS", 2000),
+            max_docs=env.float("EXCLUSIONS_MAX_DOCS", 5000),
+            max_pending=env.int("EXCLUSIONS_MAX_PENDING", 50000),
+            snapshot_interval=env.float("EXCLUSIONS_SNAPSHOT_INTERVAL", 60),
+            cache_ttl=env.float("EXCLUSIONS_CACHE_TTL", 300)
+        ),
+        archive=ArchiveConfig(
+            retention_days=env.int("ARCHIVE_RETENTION_DAYS", 30)
+        ),
+        profiling=ProfilingConfig(
+            enabled=env.bool("PROFILING", False),
+            directory=env.str("PROFILING_DIR", "profiles"),
+            keep=env.int("PROFILING_KEEP", 10),
+            slow_callback_ms=env.int("PROFILING_SLOW_CALLBACK_MS", 100),
+            lag_interval=env.float("PROFILING_LAG_INTERVAL", 0.5),
+            admin_token=env.str("PROFILING_TOKEN", "")
+        ),
+        logging=LoggingConfig(
+            level=env.str("LOG_LEVEL", "INFO").upper(),
+            file=env.str("LOG_FILE", "bot.log"),
+            max_bytes=env.int("LOG_MAX_BYTES", 10 * 1024 * 1024),
+            backup_count=env.int("LOG_BACKUP_COUNT", 5),
+            json=env.bool("LOG_JSON", False),
+            error_interval=env.float("LOG_ERROR_INTERVAL", 60),
+            error_burst=env.int("LOG_ERROR_BURST", 5)
+        ),
+        webhook=WebhookConfig(
+            enabled=bot_mode == "webhook" and external_url is not None,
+            path=env.str("WEBHOOK_PATH", "/webhook"),
+            secret=webhook_secret(env.str("WEBHOOK_SECRET", "")),
+            max_concurrency=env.int("WEBHOOK_MAX_CONCURRENCY", 20)
         )
     )
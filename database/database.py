@@ -1,14 +1,86 @@
 """Управление базой данных"""
 import aiosqlite
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from database.models import User, Subscription
+from database.models import User, Subscription, CompanySchedule
+from utils.metrics import DB_QUERY_SECONDS, timed_methods
+from utils.urls import url_hash
 import json
 import logging
+import re
+import time
+import zlib
 
 logger = logging.getLogger(__name__)
 
+_SAVE_SCHEDULE_SQL = '''
+    INSERT OR REPLACE INTO company_schedule
+    (company_name, next_due_at, interval, article_rate, quiet_streak, last_checked_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
 
+
+# Порог релевантности подписки, если пользователь его не менял
+DEFAULT_MIN_RELEVANCE = 0.3
+
+
+def _parse_filters(
+        company_name: str,
+        exclude_json: str,
+        include_json: str,
+        sentiment: Optional[str] = None,
+        min_relevance: Optional[float] = None
+) -> dict:
+    sentiment = sentiment or 'any'
+    if min_relevance is None:
+        min_relevance = DEFAULT_MIN_RELEVANCE
+    try:
+        return {
+            'exclude': json.loads(exclude_json) if exclude_json else [],
+            'include': json.loads(include_json) if include_json else [],
+            'sentiment': sentiment,
+            'min_relevance': min_relevance
+        }
+    except json.JSONDecodeError:
+        logger.warning(f"Invalid JSON in filters for {company_name}")
+        return {'exclude': [], 'include': [], 'sentiment': sentiment, 'min_relevance': min_relevance}
+
+
+_FTS_WORD = re.compile(r'\w+')
+
+
+def _pack_article(article: Dict) -> bytes:
+    """Сжатый JSON статьи без служебных полей (_relevance_score и т.п.)"""
+    payload = {key: value for key, value in article.items() if not key.startswith('_')}
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode())
+
+
+def _unpack_article(payload: bytes) -> Dict:
+    return json.loads(zlib.decompress(payload))
+
+
+def _fts_query(text: str) -> str:
+    """
+    Запрос FTS5 из пользовательского текста
+
+    Каждое слово ищется как префикс ("выруч" найдет "выручка"), все слова
+    обязательны. Синтаксис FTS5 из ввода не пропускается.
+    """
+    return ' '.join(f'"{word}"*' for word in _FTS_WORD.findall(text.lower()))
+
+
+def _schedule_params(schedule: CompanySchedule) -> tuple:
+    return (
+        schedule.company_name,
+        schedule.next_due_at,
+        schedule.interval,
+        schedule.article_rate,
+        schedule.quiet_streak,
+        schedule.last_checked_at
+    )
+
+
+@timed_methods(DB_QUERY_SECONDS)
 class Database:
     """Класс для работы с базой данных"""
 
@@ -18,14 +90,27 @@ class Database:
     async def init_db(self):
         """Инициализация базы данных"""
         async with aiosqlite.connect(self.db_path) as db:
+            # WAL позволяет нескольким воркерам читать во время записи
+            await db.execute('PRAGMA journal_mode=WAL')
+
             # Таблица пользователей
             await db.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     user_id INTEGER PRIMARY KEY,
                     username TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    is_active INTEGER DEFAULT 1,
+                    deactivated_at TIMESTAMP,
+                    deactivation_reason TEXT,
+                    subscriptions_version INTEGER DEFAULT 0
                 )
             ''')
+            await self._ensure_columns(db, 'users', {
+                'is_active': 'INTEGER DEFAULT 1',
+                'deactivated_at': 'TIMESTAMP',
+                'deactivation_reason': 'TEXT',
+                'subscriptions_version': 'INTEGER DEFAULT 0'
+            })
 
             # Таблица подписок с колонками фильтров
             await db.execute('''
@@ -35,11 +120,17 @@ class Database:
                     company_name TEXT,
                     exclude_keywords TEXT DEFAULT '[]',
                     include_keywords TEXT DEFAULT '[]',
+                    sentiment TEXT DEFAULT 'any',
+                    min_relevance REAL,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(user_id),
                     UNIQUE(user_id, company_name)
                 )
             ''')
+            await self._ensure_columns(db, 'subscriptions', {
+                'sentiment': "TEXT DEFAULT 'any'",
+                'min_relevance': 'REAL'
+            })
 
             # Таблица отправленных новостей
             await db.execute('''
@@ -48,19 +139,214 @@ class Database:
                     user_id INTEGER,
                     news_url TEXT,
                     sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    article_id INTEGER REFERENCES articles(id),
+                    UNIQUE(user_id, news_url)
+                )
+            ''')
+            await self._ensure_columns(db, 'sent_news', {
+                'article_id': 'INTEGER REFERENCES articles(id)'
+            })
+
+            # Архив статей: каждая статья хранится один раз по хэшу канонического
+            # URL, полный ответ API - сжатым. Заголовок и описание - открытым
+            # текстом для полнотекстового индекса
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS articles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url_hash TEXT NOT NULL UNIQUE,
+                    url TEXT NOT NULL,
+                    title TEXT NOT NULL DEFAULT '',
+                    description TEXT NOT NULL DEFAULT '',
+                    published_at TEXT NOT NULL DEFAULT '',
+                    fetched_at REAL NOT NULL,
+                    payload BLOB NOT NULL
+                )
+            ''')
+            await db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_articles_published ON articles (published_at, id)'
+            )
+            await db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_articles_fetched ON articles (fetched_at)'
+            )
+
+            # Статья может относиться к нескольким компаниям
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS article_companies (
+                    company_name TEXT NOT NULL,
+                    article_id INTEGER NOT NULL REFERENCES articles(id),
+                    PRIMARY KEY (company_name, article_id)
+                ) WITHOUT ROWID
+            ''')
+            await db.execute(
+                'CREATE INDEX IF NOT EXISTS idx_article_companies_article '
+                'ON article_companies (article_id)'
+            )
+
+            # Последний успешный запрос к API по компании: по нему архив
+            # заменяет повторный запрос в пределах времени жизни кэша
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS company_fetches (
+                    company_name TEXT PRIMARY KEY,
+                    fetch_count INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+
+            # Персональные модели релевантности (пользователь, компания):
+            # веса упакованы в float32, обновляются по 👍/👎
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS relevance_models (
+                    user_id INTEGER NOT NULL,
+                    company_name TEXT NOT NULL,
+                    weights BLOB NOT NULL,
+                    threshold_shift REAL NOT NULL DEFAULT 0,
+                    updates INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, company_name)
+                ) WITHOUT ROWID
+            ''')
+
+            # Оценки новостей: повторное нажатие той же кнопки не учитывается
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS news_feedback (
+                    user_id INTEGER NOT NULL,
+                    url_hash TEXT NOT NULL,
+                    company_name TEXT NOT NULL,
+                    liked INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (user_id, url_hash, company_name)
+                ) WITHOUT ROWID
+            ''')
+
+            # Статистика слов в статьях компании с низкой и высокой оценкой
+            # релевантности (для рекомендуемых исключений): счетчики только
+            # прибавляются снимками из памяти процессов
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS exclusion_docs (
+                    company_name TEXT PRIMARY KEY,
+                    low_docs REAL NOT NULL DEFAULT 0,
+                    high_docs REAL NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS exclusion_terms (
+                    company_name TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    low REAL NOT NULL DEFAULT 0,
+                    high REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY (company_name, term)
+                ) WITHOUT ROWID
+            ''')
+
+            # Полнотекстовый индекс поверх articles, синхронизируется триггерами
+            await db.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                    title, description,
+                    content='articles', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+                    INSERT INTO articles_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                END
+            ''')
+            await db.execute('''
+                CREATE TRIGGER IF NOT EXISTS articles_fts_update
+                AFTER UPDATE OF title, description ON articles BEGIN
+                    INSERT INTO articles_fts (articles_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO articles_fts (rowid, title, description)
+                    VALUES (new.id, new.title, new.description);
+                END
+            ''')
+
+            # Таблица расписания опроса компаний
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS company_schedule (
+                    company_name TEXT PRIMARY KEY,
+                    next_due_at REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    article_rate REAL DEFAULT 0,
+                    quiet_streak INTEGER DEFAULT 0,
+                    last_checked_at REAL
+                )
+            ''')
+
+            # Очередь доставки: статьи, отобранные для пользователя, но еще не отправленные.
+            # Переживает перезапуск, чтобы прерванный цикл продолжился с места остановки
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS pending_deliveries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER,
+                    company_name TEXT,
+                    news_url TEXT,
+                    article TEXT,
+                    claimed_by TEXT,
+                    claimed_until REAL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id, news_url)
                 )
             ''')
 
+            # Воркеры и аренда компаний: каждая компания принадлежит одному воркеру
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    heartbeat_at REAL NOT NULL
+                )
+            ''')
+
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS company_leases (
+                    company_name TEXT PRIMARY KEY,
+                    worker_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+
+            # Состояния FSM (диалоги добавления подписки и т.п.)
+            await db.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_states (
+                    storage_key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL
+                )
+            ''')
+
             await db.commit()
             logger.info("Database schema initialized")
 
+    @staticmethod
+    async def _ensure_columns(db: aiosqlite.Connection, table: str, columns: Dict[str, str]):
+        """Добавить недостающие колонки в существующую таблицу (миграция старых БД)"""
+        async with db.execute(f'PRAGMA table_info({table})') as cursor:
+            existing = {row[1] for row in await cursor.fetchall()}
+        for name, definition in columns.items():
+            if name not in existing:
+                await db.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+                logger.info(f"Added column {table}.{name}")
+
     async def add_user(self, user_id: int, username: Optional[str] = None) -> bool:
-        """Добавить пользователя"""
+        """Добавить пользователя (или снова активировать после блокировки бота)"""
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 await db.execute(
-                    'INSERT OR IGNORE INTO users (user_id, username) VALUES (?, ?)',
+                    '''INSERT INTO users (user_id, username) VALUES (?, ?)
+                       ON CONFLICT(user_id) DO UPDATE SET
+                           username = excluded.username,
+                           is_active = 1,
+                           deactivated_at = NULL,
+                           deactivation_reason = NULL''',
                     (user_id, username)
                 )
                 await db.commit()
@@ -90,6 +376,7 @@ class Database:
                         json.dumps(include_keywords or [], ensure_ascii=False)
                     )
                 )
+                await self._bump_subscriptions_version(db, user_id)
                 await db.commit()
                 return True
             except aiosqlite.IntegrityError:
@@ -105,8 +392,72 @@ class Database:
                 'DELETE FROM subscriptions WHERE user_id = ? AND company_name = ?',
                 (user_id, company_name)
             )
+            removed = cursor.rowcount > 0
+            if removed:
+                await self._bump_subscriptions_version(db, user_id)
             await db.commit()
-            return cursor.rowcount > 0
+            return removed
+
+    async def remove_subscription_by_id(self, user_id: int, subscription_id: int) -> Optional[str]:
+        """Удалить подписку по id строки, вернуть название компании"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'DELETE FROM subscriptions WHERE id = ? AND user_id = ? RETURNING company_name',
+                (subscription_id, user_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row:
+                await self._bump_subscriptions_version(db, user_id)
+            await db.commit()
+            return row[0] if row else None
+
+    @staticmethod
+    async def _bump_subscriptions_version(db: aiosqlite.Connection, user_id: int):
+        """Отметить, что список подписок пользователя изменился"""
+        await db.execute(
+            '''INSERT INTO users (user_id, subscriptions_version) VALUES (?, 1)
+               ON CONFLICT(user_id) DO UPDATE SET
+                   subscriptions_version = COALESCE(subscriptions_version, 0) + 1''',
+            (user_id,)
+        )
+
+    async def get_subscriptions_version(self, user_id: int) -> int:
+        """Версия списка подписок пользователя (меняется при каждом изменении)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'SELECT subscriptions_version FROM users WHERE user_id = ?',
+                (user_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return (row[0] or 0) if row else 0
+
+    async def get_user_subscriptions_page(
+        self,
+        user_id: int,
+        offset: int,
+        limit: int
+    ) -> Tuple[List[tuple], int]:
+        """
+        Получить страницу подписок пользователя
+
+        Returns:
+            ([(id подписки, компания), ...], всего подписок)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'SELECT COUNT(*) FROM subscriptions WHERE user_id = ?',
+                (user_id,)
+            ) as cursor:
+                total = (await cursor.fetchone())[0]
+            async with db.execute(
+                '''SELECT id, company_name FROM subscriptions
+                   WHERE user_id = ?
+                   ORDER BY created_at, id
+                   LIMIT ? OFFSET ?''',
+                (user_id, limit, offset)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [tuple(row) for row in rows], total
 
     async def get_user_subscriptions(self, user_id: int) -> List[str]:
         """Получить подписки пользователя"""
@@ -119,13 +470,44 @@ class Database:
                 return [row[0] for row in rows]
 
     async def get_all_subscriptions(self) -> List[tuple]:
-        """Получить все подписки"""
+        """Получить все подписки активных пользователей"""
         async with aiosqlite.connect(self.db_path) as db:
             async with db.execute(
-                'SELECT user_id, company_name FROM subscriptions'
+                '''SELECT s.user_id, s.company_name
+                   FROM subscriptions s
+                   LEFT JOIN users u ON u.user_id = s.user_id
+                   WHERE COALESCE(u.is_active, 1) = 1'''
             ) as cursor:
                 return await cursor.fetchall()
 
+    async def get_inactive_subscription_counts(self) -> Dict[str, int]:
+        """Количество подписок неактивных пользователей по компаниям"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT s.company_name, COUNT(*)
+                   FROM subscriptions s
+                   JOIN users u ON u.user_id = s.user_id
+                   WHERE u.is_active = 0
+                   GROUP BY s.company_name'''
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return {row[0]: row[1] for row in rows}
+
+    async def deactivate_user(self, user_id: int, reason: str) -> None:
+        """Пометить чат недоступным и убрать его из очереди доставки"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                '''UPDATE users
+                   SET is_active = 0, deactivated_at = CURRENT_TIMESTAMP, deactivation_reason = ?
+                   WHERE user_id = ?''',
+                (reason, user_id)
+            )
+            await db.execute(
+                'DELETE FROM pending_deliveries WHERE user_id = ?',
+                (user_id,)
+            )
+            await db.commit()
+
     async def is_news_sent(self, user_id: int, news_url: str) -> bool:
         """Проверить, была ли отправлена новость"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -141,8 +523,9 @@ class Database:
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 await db.execute(
-                    'INSERT INTO sent_news (user_id, news_url) VALUES (?, ?)',
-                    (user_id, news_url)
+                    '''INSERT INTO sent_news (user_id, news_url, article_id)
+                       VALUES (?, ?, (SELECT id FROM articles WHERE url_hash = ?))''',
+                    (user_id, news_url, url_hash(news_url))
                 )
                 await db.commit()
                 return True
@@ -153,40 +536,46 @@ class Database:
         """Получить фильтры для подписки"""
         async with aiosqlite.connect(self.db_path) as db:
             async with db.execute(
-                '''SELECT exclude_keywords, include_keywords 
+                '''SELECT exclude_keywords, include_keywords, sentiment, min_relevance
                    FROM subscriptions 
                    WHERE user_id = ? AND company_name = ?''',
                 (user_id, company_name)
             ) as cursor:
                 row = await cursor.fetchone()
                 if row:
-                    try:
-                        return {
-                            'exclude': json.loads(row[0]) if row[0] else [],
-                            'include': json.loads(row[1]) if row[1] else []
-                        }
-                    except json.JSONDecodeError:
-                        logger.warning(f"Invalid JSON in filters for {company_name}")
-                        return {'exclude': [], 'include': []}
-                return {'exclude': [], 'include': []}
+                    return _parse_filters(company_name, *row)
+                return _parse_filters(company_name, '', '')
+
+    async def get_user_subscriptions_with_filters(self, user_id: int) -> List[tuple]:
+        """Получить подписки пользователя вместе с фильтрами: (company_name, filters)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT company_name, exclude_keywords, include_keywords, sentiment, min_relevance
+                   FROM subscriptions WHERE user_id = ? ORDER BY created_at''',
+                (user_id,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [(row[0], _parse_filters(*row)) for row in rows]
 
     async def update_subscription_filters(
         self,
         user_id: int,
         company_name: str,
         exclude_keywords: list = None,
-        include_keywords: list = None
+        include_keywords: list = None,
+        min_relevance: Optional[float] = None
     ) -> bool:
-        """Обновить фильтры подписки"""
+        """Обновить фильтры подписки (min_relevance=None - порог по умолчанию)"""
         async with aiosqlite.connect(self.db_path) as db:
             try:
                 cursor = await db.execute(
                     '''UPDATE subscriptions 
-                       SET exclude_keywords = ?, include_keywords = ?
+                       SET exclude_keywords = ?, include_keywords = ?, min_relevance = ?
                        WHERE user_id = ? AND company_name = ?''',
                     (
                         json.dumps(exclude_keywords or [], ensure_ascii=False),
                         json.dumps(include_keywords or [], ensure_ascii=False),
+                        min_relevance,
                         user_id,
                         company_name
                     )
@@ -197,12 +586,610 @@ class Database:
                 logger.error(f"Error updating filters: {e}")
                 return False
 
+    async def update_subscription_sentiment(
+        self,
+        user_id: int,
+        company_name: str,
+        sentiment: str
+    ) -> bool:
+        """Изменить фильтр тональности подписки (any, bullish, bearish)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                '''UPDATE subscriptions SET sentiment = ?
+                   WHERE user_id = ? AND company_name = ?''',
+                (sentiment, user_id, company_name)
+            )
+            await db.commit()
+            return cursor.rowcount > 0
+
+    async def get_company_schedules(self) -> List[CompanySchedule]:
+        """Получить расписание опроса всех компаний"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT company_name, next_due_at, interval, article_rate,
+                          quiet_streak, last_checked_at
+                   FROM company_schedule'''
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [CompanySchedule(*row) for row in rows]
+
+    async def save_company_schedule(self, schedule: CompanySchedule) -> None:
+        """Сохранить расписание опроса компании"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                _SAVE_SCHEDULE_SQL,
+                _schedule_params(schedule)
+            )
+            await db.commit()
+
+    async def complete_company_check(
+        self,
+        schedule: CompanySchedule,
+        deliveries: List[tuple]
+    ) -> None:
+        """
+        Атомарно поставить статьи в очередь доставки и продвинуть расписание компании
+
+        Args:
+            schedule: Новое расписание компании
+            deliveries: Список (user_id, news_url, article)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                '''INSERT OR IGNORE INTO pending_deliveries
+                   (user_id, company_name, news_url, article)
+                   VALUES (?, ?, ?, ?)''',
+                [
+                    (
+                        user_id,
+                        schedule.company_name,
+                        news_url,
+                        json.dumps(article, ensure_ascii=False)
+                    )
+                    for user_id, news_url, article in deliveries
+                ]
+            )
+            await db.execute(
+                _SAVE_SCHEDULE_SQL,
+                _schedule_params(schedule)
+            )
+            await db.commit()
+
+    async def claim_pending_deliveries(
+        self,
+        worker_id: str,
+        ttl: float,
+        limit: int = 100
+    ) -> List[tuple]:
+        """
+        Захватить часть очереди доставки для воркера
+
+        Строка, захваченная упавшим воркером или не доставленная из-за
+        временной ошибки, снова становится доступной по истечении ttl.
+
+        Returns:
+            Список (id, user_id, company_name, news_url, article)
+        """
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                '''UPDATE pending_deliveries
+                   SET claimed_by = ?, claimed_until = ?
+                   WHERE id IN (
+                       SELECT id FROM pending_deliveries
+                       WHERE claimed_until IS NULL OR claimed_until < ?
+                       ORDER BY id LIMIT ?
+                   )''',
+                (worker_id, now + ttl, now, limit)
+            )
+            await db.commit()
+            async with db.execute(
+                '''SELECT id, user_id, company_name, news_url, article
+                   FROM pending_deliveries
+                   WHERE claimed_by = ? AND claimed_until = ?
+                   ORDER BY id''',
+                (worker_id, now + ttl)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [
+                    (row[0], row[1], row[2], row[3], json.loads(row[4]))
+                    for row in rows
+                ]
+
+    async def count_pending_deliveries(self) -> int:
+        """Размер очереди доставки"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute('SELECT COUNT(*) FROM pending_deliveries') as cursor:
+                row = await cursor.fetchone()
+                return row[0]
+
+    async def complete_delivery(self, delivery_id: int, user_id: int, news_url: str) -> None:
+        """Отметить новость отправленной и убрать ее из очереди доставки"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                '''INSERT OR IGNORE INTO sent_news (user_id, news_url, article_id)
+                   VALUES (?, ?, (SELECT id FROM articles WHERE url_hash = ?))''',
+                (user_id, news_url, url_hash(news_url))
+            )
+            await db.execute(
+                'DELETE FROM pending_deliveries WHERE id = ?',
+                (delivery_id,)
+            )
+            await db.commit()
+
+    async def heartbeat_worker(self, worker_id: str, ttl: float) -> int:
+        """
+        Отметить воркер живым и продлить его аренды
+
+        Returns:
+            Количество живых воркеров
+        """
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                'INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)',
+                (worker_id, now)
+            )
+            await db.execute(
+                'UPDATE company_leases SET expires_at = ? WHERE worker_id = ?',
+                (now + ttl, worker_id)
+            )
+            await db.execute(
+                'DELETE FROM workers WHERE heartbeat_at < ?',
+                (now - ttl,)
+            )
+            await db.commit()
+            async with db.execute('SELECT COUNT(*) FROM workers') as cursor:
+                row = await cursor.fetchone()
+                return row[0]
+
+    async def get_company_leases(self) -> Dict[str, str]:
+        """Получить действующие аренды: компания -> воркер"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'SELECT company_name, worker_id FROM company_leases WHERE expires_at >= ?',
+                (time.time(),)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return {row[0]: row[1] for row in rows}
+
+    async def acquire_company_leases(
+        self,
+        worker_id: str,
+        company_names: List[str],
+        ttl: float
+    ) -> List[str]:
+        """
+        Арендовать компании (свободные, просроченные или уже свои)
+
+        Returns:
+            Список компаний, аренда которых получена
+        """
+        now = time.time()
+        acquired = []
+        async with aiosqlite.connect(self.db_path) as db:
+            for company_name in company_names:
+                cursor = await db.execute(
+                    '''INSERT INTO company_leases (company_name, worker_id, expires_at)
+                       VALUES (?, ?, ?)
+                       ON CONFLICT(company_name) DO UPDATE
+                       SET worker_id = excluded.worker_id, expires_at = excluded.expires_at
+                       WHERE company_leases.expires_at < ?
+                          OR company_leases.worker_id = excluded.worker_id''',
+                    (company_name, worker_id, now + ttl, now)
+                )
+                if cursor.rowcount > 0:
+                    acquired.append(company_name)
+            await db.commit()
+        return acquired
+
+    async def release_company_leases(
+        self,
+        worker_id: str,
+        company_names: Optional[List[str]] = None
+    ) -> None:
+        """Освободить аренды воркера (все или указанные)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            if company_names is None:
+                await db.execute(
+                    'DELETE FROM company_leases WHERE worker_id = ?',
+                    (worker_id,)
+                )
+                await db.execute(
+                    'DELETE FROM workers WHERE worker_id = ?',
+                    (worker_id,)
+                )
+            else:
+                await db.executemany(
+                    'DELETE FROM company_leases WHERE worker_id = ? AND company_name = ?',
+                    [(worker_id, name) for name in company_names]
+                )
+            await db.commit()
+
+    async def delete_company_schedules(self, company_names: List[str]) -> None:
+        """Удалить расписание компаний, на которые больше никто не подписан"""
+        if not company_names:
+            return
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                'DELETE FROM company_schedule WHERE company_name = ?',
+                [(name,) for name in company_names]
+            )
+            await db.commit()
+
+    async def load_fsm_states(self, ttl: float) -> List[tuple]:
+        """
+        Загрузить неистекшие состояния FSM, истекшие удалить
+
+        Returns:
+            Список (storage_key, state, data, updated_at)
+        """
+        expire_before = time.time() - ttl
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute('DELETE FROM fsm_states WHERE updated_at < ?', (expire_before,))
+            await db.commit()
+            async with db.execute(
+                'SELECT storage_key, state, data, updated_at FROM fsm_states'
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [
+            (storage_key, state, json.loads(data), updated_at)
+            for storage_key, state, data, updated_at in rows
+        ]
+
+    async def save_fsm_states(self, upserts: List[tuple], deletes: List[str]) -> None:
+        """
+        Записать пачку изменений FSM одной транзакцией
+
+        Args:
+            upserts: Список (storage_key, state, data, updated_at)
+            deletes: Ключи, состояние которых очищено
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            if upserts:
+                await db.executemany(
+                    '''
+                    INSERT INTO fsm_states (storage_key, state, data, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(storage_key) DO UPDATE SET
+                        state = excluded.state,
+                        data = excluded.data,
+                        updated_at = excluded.updated_at
+                    ''',
+                    [
+                        (storage_key, state, json.dumps(data, ensure_ascii=False), updated_at)
+                        for storage_key, state, data, updated_at in upserts
+                    ]
+                )
+            if deletes:
+                await db.executemany(
+                    'DELETE FROM fsm_states WHERE storage_key = ?',
+                    [(storage_key,) for storage_key in deletes]
+                )
+            await db.commit()
+
+    async def save_articles(self, company_name: str, fetch_count: int, articles: List[Dict]) -> None:
+        """
+        Сохранить ответ API в архив
+
+        Уже известные статьи (тот же канонический URL) не дублируются,
+        у них только обновляется время последнего получения.
+        """
+        now = time.time()
+        rows = [
+            (
+                url_hash(article['url']),
+                article['url'],
+                article.get('title') or '',
+                article.get('description') or '',
+                article.get('publishedAt') or '',
+                now,
+                _pack_article(article)
+            )
+            for article in articles if article.get('url')
+        ]
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                '''INSERT INTO articles
+                   (url_hash, url, title, description, published_at, fetched_at, payload)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(url_hash) DO UPDATE SET fetched_at = excluded.fetched_at''',
+                rows
+            )
+            await db.executemany(
+                '''INSERT OR IGNORE INTO article_companies (company_name, article_id)
+                   SELECT ?, id FROM articles WHERE url_hash = ?''',
+                [(company_name, row[0]) for row in rows]
+            )
+            await db.execute(
+                '''INSERT OR REPLACE INTO company_fetches (company_name, fetch_count, fetched_at)
+                   VALUES (?, ?, ?)''',
+                (company_name, fetch_count, now)
+            )
+            await db.commit()
+
+    async def get_recent_articles(
+        self,
+        company_name: str,
+        fetch_count: int,
+        max_age: float
+    ) -> Optional[List[Dict]]:
+        """
+        Статьи последнего запроса к API по компании, если он не старше max_age
+
+        Returns:
+            Статьи (новые первыми) или None, если подходящего запроса не было
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT fetched_at FROM company_fetches
+                   WHERE company_name = ? AND fetch_count >= ? AND fetched_at >= ?''',
+                (company_name, fetch_count, time.time() - max_age)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return None
+            async with db.execute(
+                '''SELECT a.payload FROM article_companies c
+                   JOIN articles a ON a.id = c.article_id
+                   WHERE c.company_name = ? AND a.fetched_at >= ?
+                   ORDER BY a.published_at DESC, a.id DESC
+                   LIMIT ?''',
+                (company_name, row[0], fetch_count)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [_unpack_article(row[0]) for row in rows]
+
+    async def get_company_articles(self, company_name: str, limit: int) -> List[Dict]:
+        """Последние статьи компании из архива, новые первыми"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT a.payload FROM article_companies c
+                   JOIN articles a ON a.id = c.article_id
+                   WHERE c.company_name = ?
+                   ORDER BY a.published_at DESC, a.id DESC
+                   LIMIT ?''',
+                (company_name, limit)
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [_unpack_article(row[0]) for row in rows]
+
+    async def get_article_by_hash(self, article_hash: str) -> Optional[Dict]:
+        """Статья архива по хэшу URL"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'SELECT payload FROM articles WHERE url_hash = ?', (article_hash,)
+            ) as cursor:
+                row = await cursor.fetchone()
+        return _unpack_article(row[0]) if row else None
+
+    async def get_relevance_models(
+        self,
+        company_name: str,
+        user_ids: List[int]
+    ) -> Dict[int, Tuple[bytes, float, int]]:
+        """Модели релевантности подписчиков компании: {user_id: (веса, сдвиг порога, оценок)}"""
+        if not user_ids:
+            return {}
+        result = {}
+        async with aiosqlite.connect(self.db_path) as db:
+            # Ограничение SQLite на число параметров запроса
+            for start in range(0, len(user_ids), 500):
+                chunk = user_ids[start:start + 500]
+                async with db.execute(
+                    f'''SELECT user_id, weights, threshold_shift, updates FROM relevance_models
+                        WHERE company_name = ? AND user_id IN ({','.join('?' * len(chunk))})''',
+                    (company_name, *chunk)
+                ) as cursor:
+                    async for row in cursor:
+                        result[row[0]] = (row[1], row[2], row[3])
+        return result
+
+    async def get_feedback_vote(self, user_id: int, article_hash: str, company_name: str) -> Optional[bool]:
+        """Оценка пользователем статьи (None - не оценивал)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                '''SELECT liked FROM news_feedback
+                   WHERE user_id = ? AND url_hash = ? AND company_name = ?''',
+                (user_id, article_hash, company_name)
+            ) as cursor:
+                row = await cursor.fetchone()
+        return bool(row[0]) if row else None
+
+    async def save_feedback(
+        self,
+        user_id: int,
+        company_name: str,
+        article_hash: str,
+        liked: bool,
+        weights: bytes,
+        threshold_shift: float,
+        updates: int
+    ) -> None:
+        """Сохранить оценку статьи вместе с обновленной моделью (в одной транзакции)"""
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                '''INSERT OR REPLACE INTO news_feedback
+                   (user_id, url_hash, company_name, liked, created_at) VALUES (?, ?, ?, ?, ?)''',
+                (user_id, article_hash, company_name, int(liked), now)
+            )
+            await db.execute(
+                '''INSERT OR REPLACE INTO relevance_models
+                   (user_id, company_name, weights, threshold_shift, updates, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)''',
+                (user_id, company_name, weights, threshold_shift, updates, now)
+            )
+            await db.commit()
+
+    async def merge_exclusion_stats(
+        self,
+        deltas: Dict[str, Tuple[float, float, Dict[str, List[float]]]],
+        max_terms: int,
+        max_docs: float
+    ) -> None:
+        """
+        Прибавить накопленные в памяти счетчики слов к статистике компаний
+
+        Счетчики складываются, поэтому снимки нескольких процессов не
+        затирают друг друга. Когда статей компании больше max_docs, все ее
+        счетчики делятся пополам (старые статьи весят меньше новых), а
+        слов остается не больше max_terms - самые частые.
+
+        Args:
+            deltas: {компания: (статей с низкой оценкой, с высокой, {слово: [низкие, высокие]})}
+        """
+        now = time.time()
+        async with aiosqlite.connect(self.db_path) as db:
+            for company_name, (low_docs, high_docs, terms) in deltas.items():
+                await db.execute(
+                    '''INSERT INTO exclusion_docs (company_name, low_docs, high_docs, updated_at)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(company_name) DO UPDATE SET
+                           low_docs = low_docs + excluded.low_docs,
+                           high_docs = high_docs + excluded.high_docs,
+                           updated_at = excluded.updated_at''',
+                    (company_name, low_docs, high_docs, now)
+                )
+                await db.executemany(
+                    '''INSERT INTO exclusion_terms (company_name, term, low, high)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(company_name, term) DO UPDATE SET
+                           low = low + excluded.low,
+                           high = high + excluded.high''',
+                    [(company_name, term, low, high) for term, (low, high) in terms.items()]
+                )
+
+                async with db.execute(
+                    'SELECT low_docs + high_docs FROM exclusion_docs WHERE company_name = ?',
+                    (company_name,)
+                ) as cursor:
+                    total_docs = (await cursor.fetchone())[0]
+                if total_docs > max_docs:
+                    await db.execute(
+                        '''UPDATE exclusion_docs SET low_docs = low_docs / 2, high_docs = high_docs / 2
+                           WHERE company_name = ?''',
+                        (company_name,)
+                    )
+                    await db.execute(
+                        'UPDATE exclusion_terms SET low = low / 2, high = high / 2 WHERE company_name = ?',
+                        (company_name,)
+                    )
+                    await db.execute(
+                        'DELETE FROM exclusion_terms WHERE company_name = ? AND low + high < 1',
+                        (company_name,)
+                    )
+
+                async with db.execute(
+                    'SELECT COUNT(*) FROM exclusion_terms WHERE company_name = ?', (company_name,)
+                ) as cursor:
+                    term_count = (await cursor.fetchone())[0]
+                if term_count > max_terms:
+                    await db.execute(
+                        '''DELETE FROM exclusion_terms
+                           WHERE company_name = ? AND term NOT IN (
+                               SELECT term FROM exclusion_terms WHERE company_name = ?
+                               ORDER BY low + high DESC LIMIT ?
+                           )''',
+                        (company_name, company_name, max_terms)
+                    )
+            await db.commit()
+
+    async def get_exclusion_stats(
+        self,
+        company_name: str
+    ) -> Tuple[float, float, Dict[str, Tuple[float, float]]]:
+        """Статистика слов компании: (статей с низкой оценкой, с высокой, {слово: (низкие, высокие)})"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                'SELECT low_docs, high_docs FROM exclusion_docs WHERE company_name = ?',
+                (company_name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            if row is None:
+                return 0.0, 0.0, {}
+            async with db.execute(
+                'SELECT term, low, high FROM exclusion_terms WHERE company_name = ?',
+                (company_name,)
+            ) as cursor:
+                terms = {term: (low, high) async for term, low, high in cursor}
+        return row[0], row[1], terms
+
+    async def search_articles(
+        self,
+        query: str,
+        company_name: Optional[str] = None,
+        before_id: Optional[int] = None,
+        limit: int = 5
+    ) -> List[Tuple[int, Dict]]:
+        """
+        Полнотекстовый поиск по архиву, новые статьи первыми
+
+        Пагинация по ключу: следующая страница начинается после статьи
+        before_id (последней на предыдущей странице), без OFFSET.
+
+        Returns:
+            Список (id статьи, статья)
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+
+        conditions = ['articles_fts MATCH ?']
+        params: list = [match]
+        if company_name:
+            conditions.append(
+                '''a.id IN (SELECT article_id FROM article_companies
+                            WHERE company_name = ? COLLATE NOCASE)'''
+            )
+            params.append(company_name)
+        if before_id is not None:
+            conditions.append(
+                '(a.published_at, a.id) < (SELECT published_at, id FROM articles WHERE id = ?)'
+            )
+            params.append(before_id)
+        params.append(limit)
+
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                f'''SELECT a.id, a.payload FROM articles_fts
+                    JOIN articles a ON a.id = articles_fts.rowid
+                    WHERE {' AND '.join(conditions)}
+                    ORDER BY a.published_at DESC, a.id DESC
+                    LIMIT ?''',
+                params
+            ) as cursor:
+                rows = await cursor.fetchall()
+        return [(row[0], _unpack_article(row[1])) for row in rows]
+
+    async def cleanup_old_articles(self, days: int = 30):
+        """Удалить из архива статьи, которые не встречались дольше days дней"""
+        expire_before = time.time() - days * 86400
+        async with aiosqlite.connect(self.db_path) as db:
+            expired = 'SELECT id FROM articles WHERE fetched_at < ?'
+            await db.execute(
+                f'UPDATE sent_news SET article_id = NULL WHERE article_id IN ({expired})',
+                (expire_before,)
+            )
+            await db.execute(
+                f'DELETE FROM article_companies WHERE article_id IN ({expired})',
+                (expire_before,)
+            )
+            cursor = await db.execute('DELETE FROM articles WHERE fetched_at < ?', (expire_before,))
+            await db.execute('DELETE FROM company_fetches WHERE fetched_at < ?', (expire_before,))
+            await db.commit()
+            logger.info(f"Removed {cursor.rowcount} archived articles older than {days} days")
+
     async def cleanup_old_news(self, days: int = 7):
-        """Удалить старые записи об отправленных новостях"""
+        """Удалить старые записи об отправленных новостях и оценках"""
         async with aiosqlite.connect(self.db_path) as db:
             await db.execute(
                 "DELETE FROM sent_news WHERE sent_at < datetime('now', '-' || ? || ' days')",
                 (days,)
             )
+            await db.execute(
+                'DELETE FROM news_feedback WHERE created_at < ?',
+                (time.time() - days * 86400,)
+            )
             await db.commit()
             logger.info(f"Cleaned up news older than {days} days")
@@ -0,0 +1,171 @@
+"""Хранилище состояний FSM в SQLite с кэшем в памяти"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional, Set
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class _Record:
+    """Состояние одного ключа FSM"""
+
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], updated_at: float):
+        self.state = state
+        self.data = data
+        self.updated_at = updated_at
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище, переживающее перезапуск бота
+
+    Все чтения обслуживаются из памяти, поэтому обычное сообщение не
+    обращается к БД. Запись сразу меняет память, а в таблицу fsm_states
+    изменения сбрасываются фоновой задачей пачками раз в flush_interval
+    секунд (при аварийном падении теряются только изменения последнего
+    интервала). Состояния, не менявшиеся дольше ttl, считаются брошенными
+    и удаляются.
+
+    Перед использованием нужно вызвать start(), при остановке - close().
+    """
+
+    SWEEP_INTERVAL = 60  # как часто искать истекшие состояния в памяти
+
+    def __init__(self, database: Database, ttl: float = 86400, flush_interval: float = 1.0):
+        self.database = database
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self._records: Dict[str, _Record] = {}
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._last_sweep = 0.0
+
+    async def start(self):
+        """Загрузить сохраненные состояния и запустить фоновую запись"""
+        rows = await self.database.load_fsm_states(self.ttl)
+        self._records = {
+            storage_key: _Record(state, data, updated_at)
+            for storage_key, state, data, updated_at in rows
+        }
+        self._last_sweep = time.time()
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        logger.info(f"FSM storage loaded {len(self._records)} states")
+
+    async def close(self) -> None:
+        """Остановить фоновую запись и сбросить оставшиеся изменения"""
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        await self.flush()
+
+    @staticmethod
+    def _make_key(key: StorageKey) -> str:
+        return ':'.join(
+            str(part) if part is not None else ''
+            for part in (
+                key.bot_id,
+                key.chat_id,
+                key.user_id,
+                key.thread_id,
+                key.destiny,
+                key.business_connection_id,
+            )
+        )
+
+    def _get_record(self, key: StorageKey) -> Optional[_Record]:
+        storage_key = self._make_key(key)
+        record = self._records.get(storage_key)
+        if record is not None and time.time() - record.updated_at > self.ttl:
+            del self._records[storage_key]
+            self._dirty.add(storage_key)
+            return None
+        return record
+
+    def _write(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]):
+        storage_key = self._make_key(key)
+        if state is None and not data:
+            # Пустое состояние не храним (так выглядит state.clear())
+            self._records.pop(storage_key, None)
+        else:
+            self._records[storage_key] = _Record(state, data, time.time())
+        self._dirty.add(storage_key)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        record = self._get_record(key)
+        self._write(
+            key,
+            state.state if isinstance(state, State) else state,
+            record.data if record else {}
+        )
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = self._get_record(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        record = self._get_record(key)
+        self._write(key, record.state if record else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = self._get_record(key)
+        return record.data.copy() if record else {}
+
+    async def flush(self):
+        """Записать накопленные изменения в БД"""
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, set()
+        upserts = []
+        deletes = []
+        for storage_key in dirty:
+            record = self._records.get(storage_key)
+            if record is None:
+                deletes.append(storage_key)
+            else:
+                upserts.append((storage_key, record.state, record.data, record.updated_at))
+
+        try:
+            await self.database.save_fsm_states(upserts, deletes)
+        except Exception as e:
+            # Повторим в следующий раз; ключи, измененные за это время, уже в _dirty
+            self._dirty |= dirty
+            logger.error(f"Error saving FSM states: {e}")
+
+    def _sweep(self, now: float):
+        """Удалить из памяти состояния старше ttl"""
+        expired = [
+            storage_key for storage_key, record in self._records.items()
+            if now - record.updated_at > self.ttl
+        ]
+        for storage_key in expired:
+            del self._records[storage_key]
+        self._dirty.update(expired)
+        if expired:
+            logger.info(f"Expired {len(expired)} FSM states")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            now = time.time()
+            if now - self._last_sweep >= self.SWEEP_INTERVAL:
+                self._last_sweep = now
+                self._sweep(now)
+            await self.flush()
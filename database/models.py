@@ -28,3 +28,14 @@ class SentNews:
     user_id: int
     news_url: str
     sent_at: datetime
+
+
+@dataclass
+class CompanySchedule:
+    """Расписание опроса компании"""
+    company_name: str
+    next_due_at: float  # unix-время следующей проверки
+    interval: float  # текущий интервал опроса в секундах
+    article_rate: float = 0.0  # сглаженная частота новых статей (в час)
+    quiet_streak: int = 0  # количество проверок подряд без новых статей
+    last_checked_at: Optional[float] = None
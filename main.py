@@ -3,60 +3,109 @@ import asyncio
 import logging
 import os
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
 
+from bot.factory import create_bot
 from config import load_config
 from database.database import Database
+from database.fsm_storage import SQLiteStorage
+from services.enrichment import ArticleEnricher
+from services.exclusions import ExclusionAdvisor
+from services.feedback import FeedbackService
+from services.sentiment import SentimentScorer
+from services.trending import TrendingDetector
+from services.news_providers import create_providers
 from services.news_service import NewsService
+from services.check_service import CheckService
 from services.scheduler_service import SchedulerService
-from services.keepalive_service import KeepAliveService
 from middlewares.database import DatabaseMiddleware
+from middlewares.startup import StartupMiddleware
+from middlewares.throttling import ThrottlingMiddleware
 from utils.logger import setup_logger
 
 # Импорт роутеров
-from bot.handlers import start, subscriptions, news
+from bot.handlers import start, subscriptions, news, search
 
 logger = logging.getLogger(__name__)
 
 
+async def send_startup_notification(bot: Bot, config):
+    """Уведомить администратора о старте (опционально)"""
+    try:
+        admin_id = os.getenv('ADMIN_ID')
+        if admin_id:
+            await bot.send_message(
+                admin_id,
+                "🤖 <b>StockPulse Bot запущен!</b>\n\n"
+                f"Окружение: {'Render' if config.render.is_render else 'Local'}\n"
+                f"База данных: {config.database.path}",
+                parse_mode="HTML"
+            )
+    except Exception as e:
+        logger.warning(f"Could not send startup notification: {e}")
+
+
 async def main():
     """Главная функция запуска бота"""
-    # Настройка логирования
-    setup_logger()
-    logger.info("Starting StockPulse News Bot...")
+    startup = StartupMiddleware()
+    startup.mark('imports')
 
     # Загрузка конфигурации
     config = load_config()
+
+    # Настройка логирования
+    setup_logger(config.logging)
+    logger.info("Starting StockPulse News Bot...")
     logger.info(f"Configuration loaded. Running on Render: {config.render.is_render}")
 
     # Инициализация бота и диспетчера
-    bot = Bot(
-        token=config.tg_bot.token,
-        default=DefaultBotProperties(parse_mode=ParseMode.HTML)
-    )
+    bot = create_bot(config)
+
+    # База данных инициализируется ниже, параллельно с сетевыми вызовами
+    database = Database(config.database.path)
 
-    storage = MemoryStorage()
+    # Состояния FSM хранятся в той же БД и переживают перезапуск
+    storage = SQLiteStorage(
+        database,
+        ttl=config.fsm.state_ttl,
+        flush_interval=config.fsm.flush_interval
+    )
     dp = Dispatcher(storage=storage)
 
-    # Инициализация базы данных
-    database = Database(config.database.path)
-    await database.init_db()
-    logger.info(f"Database initialized at: {config.database.path}")
+    # Апдейты, пришедшие раньше готовности БД, ждут ее
+    dp.update.outer_middleware(startup)
 
     # Инициализация сервисов
-    news_service = NewsService(config.gnews)
-
-    # Keep-alive сервис (только для Render)
+    news_service = NewsService(
+        config.gnews,
+        archive=database,
+        providers=create_providers(config),
+        enricher=ArticleEnricher(config.enrichment) if config.enrichment.enabled else None,
+        sentiment=SentimentScorer(config.sentiment) if config.sentiment.enabled else None,
+        trending=TrendingDetector(config.trending) if config.trending.enabled else None,
+        exclusions=ExclusionAdvisor(database, config.exclusions) if config.exclusions.enabled else None
+    )
+    # Оценки 👍/👎 подстраивают отбор новостей под пользователя
+    feedback_service = FeedbackService(database, config.feedback) if config.feedback.enabled else None
+    check_service = CheckService(database, news_service, config.check, feedback_service)
+
+    # Профилирование включается только переменной PROFILING
+    profiler = None
+    if config.profiling.enabled:
+        from utils.profiling import Profiler, ProfilingMiddleware
+        profiler = Profiler(config.profiling)
+        profiler.start_loop_monitor()
+        logger.info(f"Profiling enabled, profiles in {config.profiling.directory}")
+
+    # Keep-alive сервис (на Render или для приема webhook); aiohttp.web
+    # импортируется, только если он нужен
     keepalive_service = None
-    if config.render.is_render:
+    if config.render.is_render or config.webhook.enabled:
+        from services.keepalive_service import KeepAliveService
         keepalive_service = KeepAliveService(
             port=config.render.port,
-            external_url=config.render.external_url
+            external_url=config.render.external_url,
+            metrics_token=config.render.metrics_token
         )
-        await keepalive_service.start()
-        logger.info(f"Keep-alive service started on port {config.render.port}")
 
     # Scheduler сервис
     scheduler_service = SchedulerService(
@@ -64,55 +113,119 @@ async def main():
         database,
         news_service,
         config,
-        keepalive_service
+        keepalive_service,
+        profiler,
+        feedback_service
     )
 
-    # Регистрация middleware
+    if keepalive_service:
+        keepalive_service.set_status_provider(scheduler_service.get_status)
+
+    # Регистрация middleware (ограничение частоты - первым, до остальной работы)
+    throttling = ThrottlingMiddleware(
+        rate=config.throttling.rate,
+        burst=config.throttling.burst,
+        rates={
+            'check': (1 / 10, 2),  # проверка новостей тратит квоту API
+            'subscribe': (1.0, 3),
+        }
+    )
+    dp.message.middleware(throttling)
+    dp.callback_query.middleware(throttling)
     dp.message.middleware(DatabaseMiddleware(database))
     dp.callback_query.middleware(DatabaseMiddleware(database))
+    if profiler:
+        dp.message.middleware(ProfilingMiddleware(profiler))
+        dp.callback_query.middleware(ProfilingMiddleware(profiler))
 
     # Добавляем сервисы в data для доступа в хендлерах
     dp['news_service'] = news_service
     dp['scheduler_service'] = scheduler_service
+    dp['check_service'] = check_service
+    dp['feedback_service'] = feedback_service
     dp['database'] = database
 
     # Регистрация роутеров
     dp.include_router(start.router)
     dp.include_router(subscriptions.router)
     dp.include_router(news.router)
-
-    # Запуск планировщика
-    scheduler_service.start()
-    logger.info("Scheduler started")
-
-    # Отправляем уведомление о старте (опционально)
-    try:
-        admin_id = os.getenv('ADMIN_ID')
-        if admin_id:
-            await bot.send_message(
-                admin_id,
-                "🤖 <b>StockPulse Bot запущен!</b>\n\n"
-                f"Окружение: {'Render' if config.render.is_render else 'Local'}\n"
-                f"База данных: {config.database.path}",
-                parse_mode="HTML"
+    dp.include_router(search.router)
+
+    # Webhook обслуживается тем же aiohttp-приложением, что и /health
+    if keepalive_service:
+        if config.webhook.enabled:
+            keepalive_service.mount_webhook(
+                dp,
+                bot,
+                path=config.webhook.path,
+                secret=config.webhook.secret,
+                max_concurrency=config.webhook.max_concurrency
             )
-    except Exception as e:
-        logger.warning(f"Could not send startup notification: {e}")
+        if profiler and config.profiling.admin_token:
+            keepalive_service.mount_profiler(profiler, config.profiling.admin_token)
+
+    async def init_storage():
+        await database.init_db()
+        await storage.start()
+        logger.info(f"Database initialized at: {config.database.path}")
+
+    async def init_updates_source():
+        if config.webhook.enabled:
+            # Pending-апдейты не сбрасываются: один из них мог разбудить сервис
+            await bot.set_webhook(
+                url=f"{config.render.external_url.rstrip('/')}{config.webhook.path}",
+                secret_token=config.webhook.secret,
+                allowed_updates=dp.resolve_used_update_types(),
+                max_connections=config.webhook.max_concurrency
+            )
+        else:
+            # Удаление вебхуков; pending-апдейты, как и в webhook-режиме,
+            # сохраняются и обрабатываются после запуска
+            await bot.delete_webhook(drop_pending_updates=False)
 
+    notification = None
     try:
-        # Удаление вебхуков
-        await bot.delete_webhook(drop_pending_updates=True)
-        logger.info("Bot started successfully! Polling mode activated.")
+        # БД, веб-сервер и запрос к Telegram выполняются параллельно
+        init_tasks = [init_storage(), init_updates_source()]
+        if keepalive_service:
+            init_tasks.append(keepalive_service.start())
+        await asyncio.gather(*init_tasks)
+        if keepalive_service:
+            logger.info(f"Keep-alive service started on port {config.render.port}")
+        startup.mark_ready()
+
+        # Планировщик и уведомление не задерживают прием апдейтов
+        scheduler_service.start()
+        logger.info("Scheduler started")
+        notification = asyncio.create_task(send_startup_notification(bot, config))
+
+        if config.webhook.enabled:
+            logger.info("Bot started successfully! Webhook mode activated.")
+
+            # Апдейты приходят в aiohttp-приложение keep-alive сервиса
+            await asyncio.Event().wait()
+        else:
+            logger.info("Bot started successfully! Polling mode activated.")
 
-        # Запуск polling
-        await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            # Запуск polling
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
     except Exception as e:
         logger.error(f"Error during bot execution: {e}", exc_info=True)
 
     finally:
         # Cleanup
+        if notification is not None:
+            # Уведомление, не успевшее уйти до остановки, отменяется
+            notification.cancel()
+            await asyncio.gather(notification, return_exceptions=True)
         scheduler_service.shutdown()
+        await scheduler_service.release_ownership()
+        if news_service.exclusions:
+            await news_service.exclusions.snapshot()
+        await storage.close()
+        if profiler:
+            await profiler.stop()
         if keepalive_service:
             await keepalive_service.stop()
         await bot.session.close()
@@ -0,0 +1,81 @@
+"""Middleware готовности к обработке апдейтов и замер холодного старта"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from utils.metrics import STARTUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Запасная точка отсчета, если время запуска процесса недоступно
+_IMPORTED_AT = time.monotonic()
+
+
+def process_uptime() -> float:
+    """
+    Секунды с запуска процесса
+
+    В Linux считается от времени старта процесса из /proc, то есть
+    включает запуск интерпретатора и импорты. В других системах - от
+    импорта этого модуля.
+    """
+    try:
+        with open('/proc/self/stat', 'rb') as stat:
+            # Поле 22 - время старта в тиках с загрузки системы; имя процесса
+            # в скобках может содержать пробелы, поэтому режем после ')'
+            fields = stat.read().rsplit(b')', 1)[1].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - started
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _IMPORTED_AT
+
+
+class StartupMiddleware(BaseMiddleware):
+    """
+    Outer middleware апдейтов: придерживает апдейты до готовности бота
+
+    Веб-сервер webhook поднимается параллельно с инициализацией БД, и
+    апдейт может прийти раньше, чем готовы таблицы и состояния FSM. Такой
+    апдейт ждет mark_ready(). Первый обработанный апдейт фиксирует метрику
+    time-to-first-update.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ready = asyncio.Event()
+        self.phases: Dict[str, float] = {}
+
+    def mark(self, phase: str) -> float:
+        """Зафиксировать этап старта (секунды с запуска процесса)"""
+        elapsed = process_uptime()
+        self.phases[phase] = elapsed
+        STARTUP_SECONDS.labels(phase).set(elapsed)
+        return elapsed
+
+    def mark_ready(self):
+        """Бот готов обрабатывать апдейты"""
+        self.mark('ready')
+        self.ready.set()
+        logger.info(f"Startup: ready to accept updates after {self._phases_text()}")
+
+    def _phases_text(self) -> str:
+        return ', '.join(f"{phase} {elapsed:.2f}s" for phase, elapsed in self.phases.items())
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        if not self.ready.is_set():
+            await self.ready.wait()
+        if 'first_update' not in self.phases:
+            self.mark('first_update')
+            logger.info(f"Startup: time to first update {self.phases['first_update']:.2f}s "
+                        f"({self._phases_text()})")
+        return await handler(event, data)
@@ -0,0 +1,122 @@
+"""Middleware для ограничения частоты запросов"""
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from utils.metrics import THROTTLED
+
+# Ключ общего лимита пользователя по всем командам
+USER_KEY = '*'
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated_at', 'notified')
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = now
+        self.notified = False
+
+    def consume(self, now: float) -> bool:
+        """Взять токен, если он есть"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            self.notified = False
+            return True
+        return False
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничение частоты команд и нажатий кнопок
+
+    Каждое событие проверяется двумя корзинами: общей для пользователя и
+    корзиной команды. Команда определяется флагом хендлера
+    ``throttling_key``, например::
+
+        @router.message(Command("check"), flags={"throttling_key": "check"})
+
+    Лимиты команд задаются при регистрации middleware, без изменения
+    хендлеров. Корзины хранятся в памяти, самые давно неиспользуемые
+    вытесняются при превышении max_buckets.
+    """
+
+    def __init__(
+            self,
+            rate: float = 1.0,
+            burst: float = 5,
+            rates: Optional[Dict[str, Tuple[float, float]]] = None,
+            max_buckets: int = 10000
+    ):
+        super().__init__()
+        self.user_limit = (rate, burst)
+        self.rates = rates or {}
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[Tuple[int, str], TokenBucket] = OrderedDict()
+        self.dropped: Counter = Counter()
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        user = data.get('event_from_user')
+        if user is None:
+            return await handler(event, data)
+
+        key = get_flag(data, 'throttling_key', default='default')
+        now = time.monotonic()
+
+        user_bucket = self._get_bucket(user.id, USER_KEY, self.user_limit, now)
+        if not user_bucket.consume(now):
+            return await self._drop(key, event, user_bucket)
+
+        limit = self.rates.get(key)
+        if limit is not None:
+            command_bucket = self._get_bucket(user.id, key, limit, now)
+            if not command_bucket.consume(now):
+                return await self._drop(key, event, command_bucket)
+
+        return await handler(event, data)
+
+    def _get_bucket(
+            self,
+            user_id: int,
+            key: str,
+            limit: Tuple[float, float],
+            now: float
+    ) -> TokenBucket:
+        """Получить корзину, вытесняя самые старые при переполнении"""
+        bucket_key = (user_id, key)
+        bucket = self._buckets.get(bucket_key)
+        if bucket is None:
+            bucket = TokenBucket(limit[0], limit[1], now)
+            self._buckets[bucket_key] = bucket
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(bucket_key)
+        return bucket
+
+    async def _drop(self, key: str, event: TelegramObject, bucket: TokenBucket) -> None:
+        """Отбросить событие с дешевым ответом"""
+        self.dropped[key] += 1
+        THROTTLED.labels(key).inc()
+        if isinstance(event, CallbackQuery):
+            # На callback отвечать нужно всегда, иначе у кнопки крутится индикатор
+            await event.answer("⏳ Слишком часто, попробуйте чуть позже")
+        elif isinstance(event, Message) and not bucket.notified:
+            # Предупреждаем один раз, чтобы не спамить в ответ
+            bucket.notified = True
+            await event.answer("⏳ Слишком много запросов, попробуйте чуть позже")
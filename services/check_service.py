@@ -0,0 +1,175 @@
+"""Сервис ручной проверки новостей (/check)"""
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.types import InlineKeyboardMarkup
+
+from config import CheckConfig
+from bot.keyboards.inline import get_feedback_keyboard
+from database.database import Database
+from services.delivery_errors import classify_send_error
+from services.feedback import feedback_keys
+from services.news_service import NewsService
+from utils.metrics import MESSAGES
+
+if TYPE_CHECKING:
+    from services.feedback import FeedbackService
+
+logger = logging.getLogger(__name__)
+
+
+class CheckService:
+    """
+    Проверка новостей по всем подпискам пользователя
+
+    Компании пользователя запрашиваются параллельно (с ограничением), а
+    результаты каждой компании отправляются сразу по готовности. Ответы
+    API берутся из общего кэша NewsService, поэтому проверка сразу после
+    цикла планировщика не тратит квоту. Между проверками одного
+    пользователя выдерживается пауза.
+    """
+
+    MAX_RESULTS = 3
+    SEND_DELAY = 0.5
+
+    def __init__(
+            self,
+            database: Database,
+            news_service: NewsService,
+            config: CheckConfig,
+            feedback: Optional['FeedbackService'] = None
+    ):
+        self.database = database
+        self.news_service = news_service
+        self.config = config
+        # Персональные модели релевантности и кнопки оценки новостей
+        self.feedback = feedback
+        self._semaphore = asyncio.Semaphore(config.concurrency)
+        self._last_started: Dict[int, float] = {}
+        self._running: set = set()
+
+    def cooldown_left(self, user_id: int) -> float:
+        """Сколько секунд пользователь должен подождать до следующей проверки"""
+        if user_id in self._running:
+            return float(self.config.cooldown)
+        last_started = self._last_started.get(user_id)
+        if last_started is None:
+            return 0.0
+        return max(0.0, self.config.cooldown - (time.monotonic() - last_started))
+
+    def try_start(self, user_id: int) -> float:
+        """
+        Занять проверку пользователя, если пауза прошла
+
+        Проверка паузы и отметка начала - один синхронный шаг: два быстрых
+        нажатия не могут оба пройти до первого await.
+
+        Returns:
+            0.0 - проверка занята (вызвать check), иначе сколько секунд ждать
+        """
+        wait = self.cooldown_left(user_id)
+        if wait <= 0:
+            self._start(user_id)
+        return wait
+
+    def finish(self, user_id: int):
+        """Освободить проверку, занятую try_start, если check не был вызван"""
+        self._running.discard(user_id)
+
+    async def check(
+            self,
+            user_id: int,
+            send: Callable[[str, Optional[InlineKeyboardMarkup]], Awaitable]
+    ) -> Tuple[int, int]:
+        """
+        Проверить новости пользователя и отправить найденные
+
+        Вызывается после успешного try_start(user_id); по завершении
+        проверка пользователя освобождается.
+
+        Args:
+            user_id: Пользователь
+            send: Функция отправки сообщения (текст, клавиатура) в чат
+
+        Returns:
+            (количество отправленных новостей, количество подписок)
+        """
+        try:
+            subscriptions = await self.database.get_user_subscriptions_with_filters(user_id)
+
+            tasks = [
+                asyncio.create_task(self._fetch(user_id, company_name, filters))
+                for company_name, filters in subscriptions
+            ]
+
+            news_count = 0
+            try:
+                # Отправляем результаты компании, как только они готовы
+                for task in asyncio.as_completed(tasks):
+                    company_name, articles = await task
+                    for article in articles:
+                        news_url = article.get('url', '')
+                        if await self.database.is_news_sent(user_id, news_url):
+                            continue
+
+                        keys = feedback_keys(company_name, article) if self.feedback else None
+                        try:
+                            await send(
+                                self.news_service.format_news_message(
+                                    company_name,
+                                    article,
+                                    show_relevance=True
+                                ),
+                                get_feedback_keyboard(*keys) if keys else None
+                            )
+                        except Exception as e:
+                            # Новость не отмечается отправленной: ее покажет следующая проверка
+                            status = classify_send_error(e)
+                            MESSAGES.labels('check', status.value).inc()
+                            logger.warning(f"Error sending news to {user_id} ({status.value}): {e}")
+                            if status.is_dead_chat:
+                                return news_count, len(subscriptions)
+                            continue
+                        await self.database.mark_news_as_sent(user_id, news_url)
+                        MESSAGES.labels('check', 'sent').inc()
+                        news_count += 1
+                        await asyncio.sleep(self.SEND_DELAY)
+            finally:
+                # Только при выходе раньше времени (отмена, недоступный чат):
+                # общие запросы новостей защищены от отмены в NewsService
+                for task in tasks:
+                    task.cancel()
+
+            return news_count, len(subscriptions)
+        finally:
+            self._running.discard(user_id)
+
+    async def _fetch(self, user_id: int, company_name: str, filters: dict) -> Tuple[str, List[Dict]]:
+        """Получить отфильтрованные новости компании"""
+        model = await self.feedback.model(user_id, company_name) if self.feedback else None
+        async with self._semaphore:
+            articles = await self.news_service.fetch_news(
+                company_name,
+                max_results=self.MAX_RESULTS,
+                exclude_keywords=filters['exclude'],
+                include_keywords=filters['include'],
+                min_relevance_score=filters['min_relevance'],
+                sentiment=filters['sentiment'],
+                model=model
+            )
+        return company_name, articles
+
+    def _start(self, user_id: int):
+        """Зафиксировать начало проверки пользователя"""
+        now = time.monotonic()
+        self._running.add(user_id)
+        self._last_started[user_id] = now
+
+        # Не храним отметки тех, у кого пауза уже прошла
+        if len(self._last_started) > 10000:
+            self._last_started = {
+                uid: started for uid, started in self._last_started.items()
+                if now - started < self.config.cooldown
+            }
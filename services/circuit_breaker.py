@@ -0,0 +1,145 @@
+"""Circuit breaker и повторы запросов к внешним API"""
+import logging
+import random
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from utils.metrics import CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+HALF_OPEN = 'half_open'
+OPEN = 'open'
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """
+    Размыкатель запросов к одному API
+
+    - closed: запросы идут, неудачи подряд считаются;
+    - open: после failure_threshold неудач подряд (или ответа с долгим
+      Retry-After) запросы не отправляются recovery_timeout секунд;
+    - half_open: по истечении паузы проходит один пробный запрос; успех
+      замыкает цепь, неудача снова размыкает.
+
+    Пока цепь разомкнута, вызывающий код сразу получает отказ и может
+    отдать прошлый ответ, не дожидаясь таймаутов недоступного API.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 60.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self._open_until = 0.0
+        self._opened_at: Optional[float] = None
+        self._probe_started: Optional[float] = None
+        CIRCUIT_STATE.labels(name).set(0)
+
+    def allow(self) -> bool:
+        """Можно ли отправить запрос сейчас"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now < self._open_until:
+                self.rejected += 1
+                return False
+            self._set_state(HALF_OPEN)
+
+        if self.state == HALF_OPEN:
+            # Один пробный запрос; если он потерялся (отмена), через
+            # recovery_timeout разрешается следующий
+            if self._probe_started is not None and now - self._probe_started < self.recovery_timeout:
+                self.rejected += 1
+                return False
+            self._probe_started = now
+
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self._probe_started = None
+        if self.state != CLOSED:
+            logger.info(f"Circuit {self.name} closed")
+            self._set_state(CLOSED)
+
+    def record_failure(self, error: str, retry_after: Optional[float] = None):
+        """
+        Учесть неудачный запрос
+
+        Args:
+            error: Описание ошибки для /status
+            retry_after: Пауза, которую попросил сервер (429/503), сек
+        """
+        self.failures += 1
+        self.last_error = error
+        self._probe_started = None
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold or retry_after:
+            self._open(max(self.recovery_timeout, retry_after or 0.0))
+
+    def retry_in(self) -> float:
+        """Через сколько секунд будет пробный запрос (0 - цепь не разомкнута)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._open_until - time.monotonic())
+
+    def status(self) -> dict:
+        """Состояние для /status"""
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'rejected': self.rejected,
+            'retry_in': round(self.retry_in(), 1),
+            'opened_at': (
+                datetime.fromtimestamp(self._opened_at).isoformat()
+                if self._opened_at and self.state != CLOSED else None
+            ),
+            'last_error': self.last_error,
+        }
+
+    def _open(self, duration: float):
+        if self.state != OPEN:
+            self.trips += 1
+            self._opened_at = time.time()
+        self._open_until = time.monotonic() + duration
+        logger.warning(
+            f"Circuit {self.name} opened for {duration:.0f}s "
+            f"after {self.failures} failures: {self.last_error}"
+        )
+        self._set_state(OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Пауза перед повтором attempt (с 1): экспоненциальная с полным jitter
+
+    Случайная пауза в [0, min(cap, base * 2^(attempt-1))] разводит по
+    времени повторы разных компаний, чтобы они не приходили к API разом.
+    """
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Заголовок Retry-After в секундах (число секунд или HTTP-дата)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,55 @@
+"""Классификация ошибок доставки сообщений в Telegram"""
+from enum import Enum
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+    TelegramServerError
+)
+
+
+class DeliveryStatus(str, Enum):
+    """Результат отправки сообщения"""
+    SENT = 'sent'
+    BLOCKED = 'blocked'  # пользователь заблокировал бота
+    DEACTIVATED = 'deactivated'  # аккаунт удален
+    CHAT_NOT_FOUND = 'chat_not_found'
+    TRANSIENT = 'transient'  # сеть, 5xx, flood control: стоит повторить позже
+    FAILED = 'failed'  # прочие ошибки: повтор не поможет
+
+    @property
+    def is_dead_chat(self) -> bool:
+        """Чат больше не может получать сообщения"""
+        return self in (
+            DeliveryStatus.BLOCKED,
+            DeliveryStatus.DEACTIVATED,
+            DeliveryStatus.CHAT_NOT_FOUND
+        )
+
+
+def classify_send_error(error: Exception) -> DeliveryStatus:
+    """Определить тип ошибки отправки"""
+    message = str(error).lower()
+
+    if isinstance(error, TelegramForbiddenError):
+        if 'deactivated' in message:
+            return DeliveryStatus.DEACTIVATED
+        return DeliveryStatus.BLOCKED
+
+    if isinstance(error, (TelegramBadRequest, TelegramNotFound)):
+        if 'chat not found' in message or 'user not found' in message:
+            return DeliveryStatus.CHAT_NOT_FOUND
+        return DeliveryStatus.FAILED
+
+    if isinstance(error, (
+            TelegramRetryAfter,
+            TelegramNetworkError,
+            TelegramServerError,
+            TimeoutError
+    )):
+        return DeliveryStatus.TRANSIENT
+
+    return DeliveryStatus.FAILED
@@ -0,0 +1,232 @@
+"""Загрузка полного текста статей для уточнения релевантности"""
+import asyncio
+import codecs
+import gzip
+import hashlib
+import logging
+import os
+import re
+import time
+import aiohttp
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from config import EnrichmentConfig
+from utils.metrics import ENRICHMENT
+
+logger = logging.getLogger(__name__)
+
+_SPACES_RE = re.compile(r'\s+')
+
+
+class TextExtractor(HTMLParser):
+    """
+    Потоковое извлечение текста из HTML
+
+    Страница подается кусками по мере загрузки. Скрипты, стили, меню,
+    шапка и подвал пропускаются. Основной текст - абзацы <p>; если их
+    почти нет, берется весь видимый текст.
+    """
+
+    SKIP_TAGS = {
+        'script', 'style', 'noscript', 'template', 'svg', 'iframe',
+        'nav', 'header', 'footer', 'aside', 'form', 'button', 'select',
+    }
+    MIN_PARAGRAPHS_CHARS = 200
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._skip_depth = 0
+        self._paragraph: Optional[List[str]] = None
+        self._paragraphs: List[str] = []
+        self._paragraphs_chars = 0
+        self._other: List[str] = []
+
+    @property
+    def full(self) -> bool:
+        """Текста набрано достаточно, дальше страницу можно не читать"""
+        return self._paragraphs_chars >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == 'p':
+            # <p> может закрываться неявно следующим <p>
+            self._close_paragraph()
+            self._paragraph = []
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == 'p':
+            self._close_paragraph()
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._paragraph is not None:
+            self._paragraph.append(data)
+        elif len(self._other) < 10000:
+            self._other.append(data)
+
+    def _close_paragraph(self):
+        if self._paragraph is None:
+            return
+        text = _SPACES_RE.sub(' ', ''.join(self._paragraph)).strip()
+        self._paragraph = None
+        if text:
+            self._paragraphs.append(text)
+            self._paragraphs_chars += len(text) + 1
+
+    def text(self) -> str:
+        self._close_paragraph()
+        if self._paragraphs_chars >= self.MIN_PARAGRAPHS_CHARS:
+            text = '\n'.join(self._paragraphs)
+        else:
+            text = _SPACES_RE.sub(' ', ' '.join(self._paragraphs + self._other)).strip()
+        return text[:self.max_chars]
+
+
+class ArticleEnricher:
+    """
+    Полный текст статьи по ее URL
+
+    GNews отдает только начало текста, поэтому слова-исключения и
+    упоминания компании в остальной статье не видны. Загружаются только
+    статьи с пограничной оценкой; одновременно - не больше concurrency
+    страниц и не больше per_host с одного сайта, с каждой страницы - не
+    больше max_bytes. Тексты кэшируются на диске по хэшу URL, неудачные
+    загрузки не повторяются FAILURE_TTL секунд.
+    """
+
+    FAILURE_TTL = 3600
+    PRUNE_EVERY = 100
+
+    def __init__(self, config: EnrichmentConfig):
+        self.config = config
+        self._pool = asyncio.Semaphore(config.concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._failed: Dict[str, float] = {}
+        self._writes = 0
+        os.makedirs(config.cache_dir, exist_ok=True)
+
+    def is_borderline(self, score: float, min_score: float) -> bool:
+        """Оценка близка к порогу и может измениться по полному тексту"""
+        return abs(score - min_score) < self.config.margin
+
+    async def full_text(self, url: str) -> Optional[str]:
+        """Текст статьи (None, если страницу получить не удалось)"""
+        key = hashlib.sha1(url.encode()).hexdigest()
+
+        cached = await asyncio.to_thread(self._read_cache, key)
+        if cached is not None:
+            ENRICHMENT.labels('cache_hit').inc()
+            return cached
+
+        failed_at = self._failed.get(key)
+        if failed_at and time.monotonic() - failed_at < self.FAILURE_TTL:
+            ENRICHMENT.labels('skipped').inc()
+            return None
+
+        # Одну страницу для /check и планировщика загружаем один раз
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._download(url, key))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, url: str, key: str) -> Optional[str]:
+        host = urlsplit(url).netloc.lower()
+        host_limit = self._hosts.setdefault(host, asyncio.Semaphore(self.config.per_host))
+
+        # Сначала лимит сайта, потом общий пул: ожидающие медленный сайт
+        # не занимают места в пуле
+        async with host_limit, self._pool:
+            try:
+                text = await self._fetch_text(url)
+            except (aiohttp.ClientError, asyncio.TimeoutError, LookupError) as e:
+                logger.warning(f"Error fetching article text {url}: {str(e) or type(e).__name__}")
+                text = None
+
+        if not text:
+            ENRICHMENT.labels('error').inc()
+            self._remember_failure(key)
+            return None
+
+        ENRICHMENT.labels('fetched').inc()
+        await asyncio.to_thread(self._write_cache, key, text)
+        return text
+
+    async def _fetch_text(self, url: str) -> Optional[str]:
+        """Прочитать не больше max_bytes страницы, извлекая текст по ходу"""
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.config.timeout)
+        ) as session:
+            async with session.get(url) as response:
+                if response.status != 200 or 'html' not in response.content_type:
+                    logger.warning(
+                        f"Skipping article text {url}: HTTP {response.status}, {response.content_type}"
+                    )
+                    return None
+
+                decoder = codecs.getincrementaldecoder(response.charset or 'utf-8')(errors='replace')
+                extractor = TextExtractor(self.config.max_chars)
+                received = 0
+                async for chunk in response.content.iter_chunked(16 * 1024):
+                    chunk = chunk[:self.config.max_bytes - received]
+                    received += len(chunk)
+                    extractor.feed(decoder.decode(chunk))
+                    if received >= self.config.max_bytes or extractor.full:
+                        break
+                return extractor.text()
+
+    def _remember_failure(self, key: str):
+        now = time.monotonic()
+        self._failed[key] = now
+        if len(self._failed) > 10000:
+            self._failed = {
+                failed_key: failed_at for failed_key, failed_at in self._failed.items()
+                if now - failed_at < self.FAILURE_TTL
+            }
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.config.cache_dir, f"{key}.txt.gz")
+
+    def _read_cache(self, key: str) -> Optional[str]:
+        try:
+            with gzip.open(self._cache_path(key), 'rt', encoding='utf-8') as cached:
+                return cached.read()
+        except (OSError, EOFError):
+            return None
+
+    def _write_cache(self, key: str, text: str):
+        # Запись во временный файл и переименование: читатель не увидит половину
+        path = self._cache_path(key)
+        try:
+            with gzip.open(f"{path}.tmp", 'wt', encoding='utf-8') as cached:
+                cached.write(text)
+            os.replace(f"{path}.tmp", path)
+        except OSError as e:
+            logger.error(f"Error writing enrichment cache {path}: {e}")
+            return
+
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self._prune_cache()
+
+    def _prune_cache(self):
+        """Оставить в кэше cache_max_files самых свежих текстов"""
+        with os.scandir(self.config.cache_dir) as entries:
+            files = sorted(
+                (entry for entry in entries if entry.name.endswith('.txt.gz')),
+                key=lambda entry: entry.stat().st_mtime
+            )
+        for entry in files[:max(0, len(files) - self.config.cache_max_files)]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,264 @@
+"""Рекомендуемые исключения для подписки по статистике полученных статей"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import ExclusionsConfig
+from services.news_filter import NewsFilter
+from utils.urls import url_hash
+
+if TYPE_CHECKING:
+    from database.database import Database
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'[^\W\d_]{3,}')
+
+# Служебные и слишком общие слова: исключать их бессмысленно
+_STOPWORDS = frozenset({
+    'без', 'более', 'был', 'была', 'были', 'было', 'быть', 'вам', 'вас', 'весь', 'все',
+    'всех', 'для', 'его', 'ее', 'её', 'если', 'есть', 'еще', 'ещё', 'или', 'как',
+    'когда', 'кто', 'ли', 'между', 'меня', 'может', 'над', 'нас', 'него', 'нее', 'неё',
+    'нет', 'них', 'однако', 'они', 'она', 'оно', 'под', 'после', 'при', 'про', 'так',
+    'также', 'такой', 'там', 'тем', 'того', 'только', 'том', 'уже', 'чем', 'что',
+    'чтобы', 'это', 'этого', 'этой', 'этом', 'эти', 'этот', 'году', 'года', 'год',
+    'время', 'стал', 'стала', 'стало', 'стали', 'будет', 'будут', 'которые',
+    'который', 'которая', 'которое', 'своих', 'свои', 'свой', 'своей', 'заявил',
+    'заявила', 'сообщил', 'сообщила', 'сообщает', 'сообщили', 'новости', 'компания',
+    'компании', 'компанию', 'компаний',
+    'the', 'and', 'for', 'with', 'that', 'this', 'from', 'are', 'was', 'were', 'has',
+    'have', 'had', 'its', 'his', 'her', 'their', 'will', 'would', 'can', 'could', 'not',
+    'but', 'about', 'after', 'over', 'into', 'than', 'more', 'new', 'says', 'said',
+    'company', 'news', 'you', 'your', 'our', 'all', 'out', 'who', 'what', 'how', 'why',
+})
+
+# Априорный счетчик для сглаживания частот (редкие слова не получают
+# бесконечное отношение шансов)
+_PRIOR = 0.5
+# Шансы встретить слово в статье с низкой оценкой должны быть хотя бы
+# вдвое выше: иначе при тысячах слов и компаний случайные колебания
+# частот общих слов проходят порог значимости
+_MIN_LOG_ODDS = math.log(2)
+
+
+def article_terms(article: Dict, company_name: str) -> Set[str]:
+    """Слова заголовка и описания статьи, пригодные как исключения"""
+    text = f"{article.get('title') or ''} {article.get('description') or ''}".lower()
+    company_words = set(_WORD_RE.findall(company_name.lower()))
+    return {
+        word for word in _WORD_RE.findall(text)
+        if word not in _STOPWORDS and word not in company_words
+    }
+
+
+def rank_exclusions(
+        low_docs: float,
+        high_docs: float,
+        terms: Dict[str, Tuple[float, float]],
+        min_count: float,
+        min_z: float,
+        limit: int
+) -> List[Tuple[str, float]]:
+    """
+    Слова, характерные для статей с низкой оценкой: [(слово, z), ...]
+
+    Сравниваются доли статей со словом среди статей с низкой и с высокой
+    оценкой: логарифм отношения шансов со сглаживанием, деленный на его
+    стандартную ошибку (z-оценка). Так частое в обеих группах слово
+    (например, "акции") не предлагается, а редкое не обгоняет надежное.
+    Слово должно встречаться в статьях с низкой оценкой хотя бы вдвое
+    чаще (по шансам) и с z не ниже min_z.
+    """
+    ranked = []
+    for term, (low, high) in terms.items():
+        if low < min_count:
+            continue
+        low_other = max(low_docs - low, 0.0)
+        high_other = max(high_docs - high, 0.0)
+        log_odds = (
+            math.log((low + _PRIOR) / (low_other + _PRIOR))
+            - math.log((high + _PRIOR) / (high_other + _PRIOR))
+        )
+        variance = (
+            1 / (low + _PRIOR) + 1 / (low_other + _PRIOR)
+            + 1 / (high + _PRIOR) + 1 / (high_other + _PRIOR)
+        )
+        z = log_odds / math.sqrt(variance)
+        if z >= min_z and log_odds >= _MIN_LOG_ODDS:
+            ranked.append((term, z))
+    ranked.sort(key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
+
+
+class _Delta:
+    """Счетчики компании, еще не сохраненные в БД"""
+
+    __slots__ = ('low_docs', 'high_docs', 'terms')
+
+    def __init__(self):
+        self.low_docs = 0.0
+        self.high_docs = 0.0
+        self.terms: Dict[str, List[float]] = {}
+
+
+class ExclusionAdvisor:
+    """
+    Рекомендуемые исключения для любой компании
+
+    Каждая новая статья из источников разносится по группам по базовой
+    оценке релевантности: ниже low_score - статья, где компания упомянута
+    вскользь или не упомянута, не ниже high_score - статья о компании.
+    Для каждой компании считается, в скольких статьях каждой группы
+    встречается слово. Счетчики копятся в памяти и раз в
+    snapshot_interval прибавляются к статистике в SQLite (или раньше,
+    если слов в памяти больше max_pending), где для компании хранится не
+    больше max_terms слов. Рекомендации - одно чтение статистики компании
+    и ранжирование, без пересчета по архиву.
+    """
+
+    MAX_SEEN = 50000
+    MAX_CACHED = 1000
+
+    def __init__(self, database: 'Database', config: ExclusionsConfig):
+        self.database = database
+        self.config = config
+        self._pending: Dict[str, _Delta] = {}
+        self._pending_terms = 0
+        # Статьи, уже учтенные этим процессом (ответы API повторяются)
+        self._seen: OrderedDict[Tuple[str, str], None] = OrderedDict()
+        self._suggestions: OrderedDict[str, Tuple[float, List[str]]] = OrderedDict()
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self.articles = 0
+        self.snapshots = 0
+        self.last_snapshot_at: Optional[float] = None
+
+    def observe(self, company_name: str, articles: Iterable[Dict]):
+        """Учесть новые статьи ответа по компании"""
+        key = company_name.lower()
+        delta = None
+        for article in articles:
+            seen_key = (key, url_hash(article['url']) if article.get('url') else article.get('title') or '')
+            if seen_key in self._seen:
+                continue
+            self._seen[seen_key] = None
+            if len(self._seen) > self.MAX_SEEN:
+                self._seen.popitem(last=False)
+
+            score = NewsFilter.calculate_relevance_score(article, company_name)
+            if score < self.config.low_score:
+                column = 0
+            elif score >= self.config.high_score:
+                column = 1
+            else:
+                continue
+
+            if delta is None:
+                delta = self._pending.setdefault(key, _Delta())
+            self.articles += 1
+            if column:
+                delta.high_docs += 1
+            else:
+                delta.low_docs += 1
+            for term in article_terms(article, company_name):
+                counts = delta.terms.get(term)
+                if counts is None:
+                    counts = delta.terms[term] = [0.0, 0.0]
+                    self._pending_terms += 1
+                counts[column] += 1
+
+        if self._pending_terms > self.config.max_pending and not self._snapshot_running():
+            self._snapshot_task = asyncio.get_running_loop().create_task(self.snapshot())
+
+    async def suggest(self, company_name: str, limit: Optional[int] = None) -> List[str]:
+        """Рекомендуемые исключения для компании (пустой список, если статистики мало)"""
+        key = company_name.lower()
+        limit = limit or self.config.suggestions
+        cached = self._suggestions.get(key)
+        if cached and time.monotonic() - cached[0] < self.config.cache_ttl:
+            self._suggestions.move_to_end(key)
+            return cached[1][:limit]
+
+        try:
+            low_docs, high_docs, stored = await self.database.get_exclusion_stats(key)
+        except Exception as e:
+            logger.error(f"Error reading exclusion stats for {company_name}: {e}")
+            return []
+
+        terms = dict(stored)
+        delta = self._pending.get(key)
+        if delta:
+            # Еще не сохраненные счетчики этого процесса
+            low_docs += delta.low_docs
+            high_docs += delta.high_docs
+            for term, (low, high) in delta.terms.items():
+                stored_low, stored_high = terms.get(term, (0.0, 0.0))
+                terms[term] = (stored_low + low, stored_high + high)
+
+        ranked = rank_exclusions(
+            low_docs, high_docs, terms,
+            self.config.min_count, self.config.min_z, max(limit, self.config.suggestions)
+        )
+        suggestions = [term for term, _ in ranked]
+        self._suggestions[key] = (time.monotonic(), suggestions)
+        if len(self._suggestions) > self.MAX_CACHED:
+            self._suggestions.popitem(last=False)
+        return suggestions[:limit]
+
+    async def snapshot(self):
+        """Прибавить накопленные счетчики к статистике в БД"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        pending_terms, self._pending_terms = self._pending_terms, 0
+        try:
+            await self.database.merge_exclusion_stats(
+                {
+                    key: (delta.low_docs, delta.high_docs, delta.terms)
+                    for key, delta in pending.items()
+                },
+                self.config.max_terms,
+                self.config.max_docs
+            )
+        except Exception as e:
+            logger.error(f"Error saving exclusion stats: {e}")
+            self._restore(pending, pending_terms)
+            return
+        self.snapshots += 1
+        self.last_snapshot_at = time.time()
+        logger.debug(f"Exclusion stats saved for {len(pending)} companies, {pending_terms} terms")
+
+    def status(self) -> Dict:
+        """Состояние для /status"""
+        return {
+            'articles': self.articles,
+            'pending_companies': len(self._pending),
+            'pending_terms': self._pending_terms,
+            'snapshots': self.snapshots,
+            'last_snapshot_at': self.last_snapshot_at,
+        }
+
+    def _snapshot_running(self) -> bool:
+        return self._snapshot_task is not None and not self._snapshot_task.done()
+
+    def _restore(self, pending: Dict[str, _Delta], pending_terms: int):
+        """Вернуть несохраненные счетчики (снимок не удался), сложив с новыми"""
+        for key, old in pending.items():
+            delta = self._pending.get(key)
+            if delta is None:
+                self._pending[key] = old
+                continue
+            delta.low_docs += old.low_docs
+            delta.high_docs += old.high_docs
+            for term, (low, high) in old.terms.items():
+                counts = delta.terms.get(term)
+                if counts is None:
+                    delta.terms[term] = [low, high]
+                else:
+                    counts[0] += low
+                    counts[1] += high
+                    pending_terms -= 1
+        self._pending_terms += pending_terms
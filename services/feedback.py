@@ -0,0 +1,283 @@
+"""Подстройка релевантности новостей по оценкам пользователей (👍/👎)"""
+import logging
+import math
+import re
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from config import FeedbackConfig
+from services.news_filter import NewsFilter
+from utils.metrics import FEEDBACK
+from utils.urls import url_hash
+
+if TYPE_CHECKING:
+    from database.database import Database
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w{3,}')
+
+# Признаки статьи: сигналы базовой оценки релевантности (компания в
+# заголовке, в начале заголовка, в описании, в начале описания) и слова
+# заголовка и описания, хэшированные в HASH_BUCKETS корзин. Полный текст
+# не используется: в архиве, по которому учится модель, его нет, и при
+# оценке признаки должны быть теми же. Размер модели и стоимость оценки не
+# зависят от числа оценок пользователя
+_SIGNALS = 4
+HASH_BUCKETS = 128
+FEATURES = _SIGNALS + HASH_BUCKETS
+
+_SLOPE = 10.0  # крутизна вероятности "понравится" вокруг порога
+_MAX_WEIGHT = 1.0
+
+# Результаты обработки оценки
+SAVED = 'saved'
+CHANGED = 'changed'
+DUPLICATE = 'duplicate'
+UNKNOWN = 'unknown'
+
+
+def company_tag(company_name: str) -> str:
+    """Короткая метка компании для callback_data (сверяется с подписками пользователя)"""
+    return f"{zlib.crc32(company_name.lower().encode()) & 0xffff:04x}"
+
+
+def feedback_callback_data(liked: bool, article_hash: str, tag: str) -> str:
+    """callback_data кнопки оценки: fb:<1|0>:<хэш URL>:<метка компании> (до 50 байт)"""
+    return f"fb:{int(liked)}:{article_hash}:{tag}"
+
+
+def feedback_keys(company_name: str, article: Dict) -> Optional[Tuple[str, str]]:
+    """(хэш URL, метка компании) для кнопок оценки; None - у статьи нет URL"""
+    if not article.get('url'):
+        return None
+    return url_hash(article['url']), company_tag(company_name)
+
+
+def parse_feedback_callback(data: str) -> Optional[Tuple[bool, str, str]]:
+    """(понравилась, хэш URL, метка компании) или None для чужого формата"""
+    parts = data.split(':')
+    if len(parts) != 4 or parts[1] not in ('0', '1') or len(parts[2]) != 40 or len(parts[3]) != 4:
+        return None
+    return parts[1] == '1', parts[2], parts[3]
+
+
+def article_features(article: Dict, company_name: str) -> List[Tuple[int, float]]:
+    """Разреженный вектор признаков статьи: [(индекс, значение), ...]"""
+    title = (article.get('title') or '').lower()
+    description = (article.get('description') or '').lower()
+    company = company_name.lower()
+
+    features = []
+    if company in title:
+        features.append((0, 1.0))
+        if title.startswith(company):
+            features.append((1, 1.0))
+    position = description.find(company)
+    if position >= 0:
+        features.append((2, 1.0))
+        if position < len(description) * 0.3:
+            features.append((3, 1.0))
+
+    # Слова названия компании есть почти в каждой статье и ничего не различают
+    company_words = set(_WORD_RE.findall(company))
+    buckets = {
+        _SIGNALS + zlib.crc32(word.encode()) % HASH_BUCKETS
+        for word in _WORD_RE.findall(f"{title} {description}")
+        if word not in company_words
+    }
+    if buckets:
+        # Нормировка: длинная статья не получает большую поправку
+        value = 1 / math.sqrt(len(buckets))
+        features += [(idx, value) for idx in sorted(buckets)]
+    return features
+
+
+class RelevanceModel:
+    """
+    Персональная поправка к оценке релевантности (пользователь, компания)
+
+    Логистическая регрессия поверх базовой оценки: поправка - скалярное
+    произведение весов на признаки статьи (не больше max_adjust по
+    модулю), плюс сдвиг порога подписки (не больше max_shift). Оценка
+    пользователя - один шаг градиентного спуска по признакам статьи, то
+    есть O(признаков статьи). Пока оценок нет, модель не меняет ничего.
+    """
+
+    __slots__ = ('config', 'weights', 'threshold_shift', 'updates')
+
+    def __init__(
+            self,
+            config: FeedbackConfig,
+            weights: Optional[array] = None,
+            threshold_shift: float = 0.0,
+            updates: int = 0
+    ):
+        self.config = config
+        self.weights = weights if weights is not None else array('f', bytes(4 * FEATURES))
+        self.threshold_shift = threshold_shift
+        self.updates = updates
+
+    @classmethod
+    def from_row(cls, config: FeedbackConfig, row: Optional[Tuple[bytes, float, int]]) -> 'RelevanceModel':
+        """Модель из строки relevance_models (None - новая)"""
+        if row is None:
+            return cls(config)
+        weights = array('f')
+        weights.frombytes(row[0])
+        if len(weights) != FEATURES:
+            # Набор признаков изменился - старые веса не подходят
+            return cls(config, threshold_shift=row[1])
+        return cls(config, weights, row[1], row[2])
+
+    def to_bytes(self) -> bytes:
+        return self.weights.tobytes()
+
+    def _adjustment(self, features: List[Tuple[int, float]]) -> float:
+        weights = self.weights
+        value = sum(weights[idx] * x for idx, x in features)
+        return max(-self.config.max_adjust, min(self.config.max_adjust, value))
+
+    def score(self, article: Dict, company_name: str, base: float) -> float:
+        """Оценка релевантности с учетом оценок пользователя"""
+        if not self.updates:
+            return base
+        return self.score_features(article_features(article, company_name), base)
+
+    def score_features(self, features: List[Tuple[int, float]], base: float) -> float:
+        """
+        Оценка по заранее посчитанным признакам статьи
+
+        Признаки не зависят от пользователя: при рассылке они считаются
+        один раз на статью, а каждый подписчик платит только O(признаков).
+        """
+        if not self.updates:
+            return base
+        return max(0.0, min(1.0, base + self._adjustment(features)))
+
+    def threshold(self, min_relevance: float) -> float:
+        """Порог подписки со сдвигом по оценкам пользователя"""
+        return max(0.0, min(1.0, min_relevance + self.threshold_shift))
+
+    def update(self, article: Dict, company_name: str, base: float, min_relevance: float, liked: bool):
+        """Учесть оценку статьи"""
+        features = article_features(article, company_name)
+        score = max(0.0, min(1.0, base + self._adjustment(features)))
+        probability = 1 / (1 + math.exp(-_SLOPE * (score - self.threshold(min_relevance))))
+        error = (1.0 if liked else 0.0) - probability
+
+        step = self.config.learning_rate * error
+        weights = self.weights
+        for idx, x in features:
+            weights[idx] = max(-_MAX_WEIGHT, min(_MAX_WEIGHT, weights[idx] + step * x))
+
+        # 👍 статье около порога - порог ниже, 👎 - выше
+        shift = self.threshold_shift - self.config.threshold_rate * error
+        self.threshold_shift = max(-self.config.max_shift, min(self.config.max_shift, shift))
+        self.updates += 1
+
+
+class FeedbackService:
+    """
+    Оценки новостей и персональные модели релевантности
+
+    Модели хранятся в SQLite (веса - float32 в BLOB) и кэшируются в
+    памяти (LRU на cache_size моделей). Кэш перечитывается через
+    cache_ttl: оценки принимает бот, а рассылку может делать воркер.
+    """
+
+    def __init__(self, database: 'Database', config: FeedbackConfig):
+        self.database = database
+        self.config = config
+        self._cache: OrderedDict[Tuple[int, str], Tuple[float, RelevanceModel]] = OrderedDict()
+
+    async def models(self, company_name: str, user_ids: List[int]) -> Dict[int, RelevanceModel]:
+        """Модели подписчиков компании (отсутствующие в кэше - одним запросом)"""
+        now = time.monotonic()
+        result = {}
+        missing = []
+        for user_id in user_ids:
+            key = (user_id, company_name)
+            cached = self._cache.get(key)
+            if cached and now - cached[0] < self.config.cache_ttl:
+                self._cache.move_to_end(key)
+                result[user_id] = cached[1]
+            else:
+                missing.append(user_id)
+
+        if missing:
+            rows = await self.database.get_relevance_models(company_name, missing)
+            for user_id in missing:
+                model = RelevanceModel.from_row(self.config, rows.get(user_id))
+                self._put(user_id, company_name, model, now)
+                result[user_id] = model
+        return result
+
+    async def model(self, user_id: int, company_name: str) -> RelevanceModel:
+        return (await self.models(company_name, [user_id]))[user_id]
+
+    async def record(
+            self,
+            user_id: int,
+            liked: bool,
+            article_hash: str,
+            tag: str
+    ) -> Tuple[str, Optional[str]]:
+        """
+        Учесть оценку новости
+
+        Returns:
+            (результат: SAVED, CHANGED, DUPLICATE или UNKNOWN; компания)
+        """
+        subscriptions = await self.database.get_user_subscriptions_with_filters(user_id)
+        match = next(
+            ((name, filters) for name, filters in subscriptions if company_tag(name) == tag),
+            None
+        )
+        if match is None:
+            FEEDBACK.labels(UNKNOWN).inc()
+            return UNKNOWN, None
+        company_name, filters = match
+
+        previous = await self.database.get_feedback_vote(user_id, article_hash, company_name)
+        if previous == liked:
+            FEEDBACK.labels(DUPLICATE).inc()
+            return DUPLICATE, company_name
+
+        article = await self.database.get_article_by_hash(article_hash)
+        if article is None:
+            # Статья удалена из архива - учить модель не на чем
+            FEEDBACK.labels(UNKNOWN).inc()
+            return UNKNOWN, company_name
+
+        model = await self.model(user_id, company_name)
+        base = NewsFilter.calculate_relevance_score(article, company_name)
+        model.update(article, company_name, base, filters['min_relevance'], liked)
+        await self.database.save_feedback(
+            user_id,
+            company_name,
+            article_hash,
+            liked,
+            model.to_bytes(),
+            model.threshold_shift,
+            model.updates
+        )
+        self._put(user_id, company_name, model, time.monotonic())
+
+        result = SAVED if previous is None else CHANGED
+        FEEDBACK.labels('like' if liked else 'dislike').inc()
+        logger.info(
+            f"Feedback from {user_id} on {company_name}: {'like' if liked else 'dislike'}, "
+            f"threshold shift {model.threshold_shift:+.3f} after {model.updates} votes"
+        )
+        return result, company_name
+
+    def _put(self, user_id: int, company_name: str, model: RelevanceModel, now: float):
+        key = (user_id, company_name)
+        self._cache[key] = (now, model)
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.config.cache_size:
+            self._cache.popitem(last=False)
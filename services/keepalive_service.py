@@ -1,20 +1,52 @@
 """Сервис для предотвращения засыпания на Render"""
+import asyncio
 import logging
+import secrets
 from aiohttp import web
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional
 import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler
+from utils.metrics import registry
+
+if TYPE_CHECKING:
+    from utils.profiling import Profiler
 
 logger = logging.getLogger(__name__)
 
 
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик webhook с ограничением параллельности
+
+    Telegram получает ответ сразу, а апдейты обрабатываются в фоне, но
+    не больше max_concurrency одновременно.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_concurrency: int, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _background_feed_update(self, bot: Bot, update: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+
 class KeepAliveService:
     """Сервис для поддержания активности бота на Render"""
 
-    def __init__(self, port: int = 8080, external_url: Optional[str] = None):
+    # Адреса, с которых /metrics доступен без токена
+    LOCAL_ADDRESSES = frozenset({'127.0.0.1', '::1'})
+
+    def __init__(self, port: int = 8080, external_url: Optional[str] = None, metrics_token: str = ''):
         self.port = port
         self.external_url = external_url
+        self.metrics_token = metrics_token
         self.app = web.Application()
         self.runner: Optional[web.AppRunner] = None
+        self.status_provider: Optional[Callable[[], Awaitable[dict]]] = None
+        self.profiler: Optional['Profiler'] = None
+        self._admin_token = ''
         self._setup_routes()
 
     def _setup_routes(self):
@@ -22,6 +54,75 @@ class KeepAliveService:
         self.app.router.add_get('/health', self.health_check)
         self.app.router.add_get('/', self.root)
         self.app.router.add_get('/status', self.status)
+        self.app.router.add_get('/metrics', self.metrics)
+
+    def set_status_provider(self, provider: Callable[[], Awaitable[dict]]):
+        """Источник живых значений для /status (например, SchedulerService.get_status)"""
+        self.status_provider = provider
+
+    def mount_webhook(
+            self,
+            dispatcher: Dispatcher,
+            bot: Bot,
+            path: str,
+            secret: str,
+            max_concurrency: int
+    ):
+        """
+        Подключить webhook aiogram к этому же веб-серверу
+
+        Вызывается до start(): после запуска маршруты менять нельзя.
+        Запросы без правильного X-Telegram-Bot-Api-Secret-Token отклоняются.
+        """
+        BoundedRequestHandler(
+            dispatcher,
+            bot,
+            max_concurrency=max_concurrency,
+            secret_token=secret
+        ).register(self.app, path=path)
+        logger.info(f"Webhook handler mounted at {path}")
+
+    def mount_profiler(self, profiler: 'Profiler', token: str):
+        """
+        Подключить /admin/profiles для скачивания профилей
+
+        Вызывается до start(). Запрос должен содержать токен в заголовке
+        X-Admin-Token или параметре token.
+        """
+        self.profiler = profiler
+        self._admin_token = token
+        self.app.router.add_get('/admin/profiles', self.list_profiles)
+        self.app.router.add_get('/admin/profiles/{name}', self.get_profile)
+        logger.info("Profiles admin route mounted at /admin/profiles")
+
+    def _is_admin(self, request: web.Request) -> bool:
+        token = request.headers.get('X-Admin-Token') or request.query.get('token', '')
+        return secrets.compare_digest(token, self._admin_token)
+
+    def _can_read_metrics(self, request: web.Request) -> bool:
+        """Токен METRICS_TOKEN (Bearer или параметр token); без него - только localhost"""
+        if not self.metrics_token:
+            return request.remote in self.LOCAL_ADDRESSES
+        authorization = request.headers.get('Authorization', '')
+        token = authorization[7:] if authorization.startswith('Bearer ') else request.query.get('token', '')
+        return secrets.compare_digest(token, self.metrics_token)
+
+    async def list_profiles(self, request):
+        """Список сохраненных профилей"""
+        if not self._is_admin(request):
+            raise web.HTTPForbidden()
+        return web.json_response({'profiles': self.profiler.list_profiles()})
+
+    async def get_profile(self, request):
+        """Файл профиля (pstats) или его текстовая сводка с ?format=text"""
+        if not self._is_admin(request):
+            raise web.HTTPForbidden()
+        path = self.profiler.profile_path(request.match_info['name'])
+        if path is None:
+            raise web.HTTPNotFound()
+        if request.query.get('format') == 'text':
+            return web.Response(text=self.profiler.profile_summary(path))
+        return web.FileResponse(path)
 
     async def health_check(self, request):
         """Endpoint для health check от Render"""
@@ -41,17 +142,26 @@ class KeepAliveService:
 
     async def status(self, request):
         """Детальный статус бота"""
-        return web.json_response({
+        status = {
             'bot': 'StockPulse News Bot',
             'version': '1.0.0',
             'status': 'operational',
-            'features': [
-                'News monitoring',
-                'Company subscriptions',
-                'Smart filtering',
-                'Scheduled updates'
-            ]
-        })
+        }
+        if self.status_provider:
+            status.update(await self.status_provider())
+        return web.json_response(status)
+
+    async def metrics(self, request):
+        """Метрики в текстовом формате Prometheus"""
+        if not self._can_read_metrics(request):
+            raise web.HTTPForbidden()
+        if self.status_provider:
+            # Обновляет gauge'и, которые считаются по запросу
+            await self.status_provider()
+        return web.Response(
+            body=registry.render().encode('utf-8'),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        )
 
     async def start(self):
         """Запустить веб-сервер"""
@@ -0,0 +1,84 @@
+"""Рендер сообщений о новостях"""
+from html import escape
+from typing import Dict, Tuple
+
+from utils.metrics import RENDER_CACHE
+
+# Отметка тональности новости (нейтральные не отмечаются)
+_SENTIMENT_LINES = {
+    'bullish': "🐂 Бычья новость",
+    'bearish': "🐻 Медвежья новость",
+}
+
+
+def render_news_message(company_name: str, article: Dict, show_relevance: bool = False) -> str:
+    """
+    Собрать HTML-сообщение о новости
+
+    Все поля из API экранируются: заголовки с '<' или '&' иначе ломают
+    parse_mode="HTML". Лишние пробелы и пустые строки не отправляются.
+    """
+    title = escape(article.get('title') or 'Без заголовка', quote=False)
+    description = escape((article.get('description') or '').strip(), quote=False)
+    published_at = escape(article.get('publishedAt') or '', quote=False)
+    source = escape(
+        (article.get('source') or {}).get('name') or 'Неизвестный источник',
+        quote=False
+    )
+    url = escape(article.get('url') or '')
+
+    lines = [
+        f"📰 <b>Новости по: {escape(company_name, quote=False)}</b>",
+        "",
+        f"📌 <b>{title}</b>",
+    ]
+    if description:
+        lines += ["", description]
+    lines += ["", f"🔗 Источник: {source}"]
+    if published_at:
+        lines.append(f"⏰ {published_at}")
+
+    sentiment_line = _SENTIMENT_LINES.get(article.get('_sentiment'))
+    if sentiment_line:
+        lines.append(sentiment_line)
+
+    # Опционально показываем оценку релевантности
+    if show_relevance and '_relevance_score' in article:
+        score = article['_relevance_score']
+        stars = '⭐' * int(score * 5)
+        lines.append(f"📊 Релевантность: {stars} ({score:.2f})")
+
+    lines += ["", f"<a href=\"{url}\">Читать полностью</a>"]
+    return "\n".join(lines)
+
+
+class MessageRenderer:
+    """
+    Кэш отрендеренных сообщений на один цикл рассылки
+
+    Одна и та же статья уходит всем подписчикам компании, поэтому
+    сообщение собирается один раз на (компания, статья, вариант).
+    """
+
+    def __init__(self):
+        self._cache: Dict[Tuple[str, str, bool], str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, company_name: str, article: Dict, show_relevance: bool = False) -> str:
+        """Получить сообщение из кэша или отрендерить его"""
+        key = (company_name, article.get('url', ''), show_relevance)
+        message = self._cache.get(key)
+        if message is None:
+            self.misses += 1
+            RENDER_CACHE.labels('miss').inc()
+            message = render_news_message(company_name, article, show_relevance)
+            self._cache[key] = message
+        else:
+            self.hits += 1
+            RENDER_CACHE.labels('hit').inc()
+        return message
+
+    def clear(self):
+        """Сбросить кэш в начале нового цикла"""
+        self._cache.clear()
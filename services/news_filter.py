@@ -1,6 +1,82 @@
 """Сервис фильтрации новостей"""
-from typing import Dict, List
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 import re
+import time
+
+
+def article_text(article: Dict) -> str:
+    """Текст статьи в нижнем регистре, по которому проверяются слова фильтров"""
+    title = article.get('title', '').lower()
+    description = article.get('description', '').lower()
+    # Полный текст, если статья дозагружена, иначе обрезанный content из API
+    content = (article.get('full_text') or article.get('content', '')).lower()
+    return f"{title} {description} {content}"
+
+
+def _word_pattern(keyword: str) -> str:
+    # Используем word boundary для точного совпадения
+    return r'\b' + re.escape(keyword.lower()) + r'\b'
+
+
+class KeywordMatcher:
+    """
+    Скомпилированные слова-исключения и обязательные слова подписки
+
+    Все исключения объединены в одно регулярное выражение, поэтому текст
+    статьи просматривается один раз, сколько бы исключений ни было.
+    Обязательные слова проверяются по отдельности: нужны все.
+    """
+
+    __slots__ = ('_exclude', '_include')
+
+    def __init__(self, exclude_keywords: Tuple[str, ...], include_keywords: Tuple[str, ...]):
+        exclude = [_word_pattern(keyword) for keyword in exclude_keywords if keyword.strip()]
+        self._exclude = re.compile('|'.join(exclude)) if exclude else None
+        self._include = [
+            (keyword, re.compile(_word_pattern(keyword)))
+            for keyword in include_keywords if keyword.strip()
+        ]
+
+    def excluded_by(self, text: str) -> Optional[str]:
+        """Найденное в тексте слово-исключение (None - исключений нет)"""
+        if self._exclude is None:
+            return None
+        match = self._exclude.search(text)
+        return match.group() if match else None
+
+    def missing_include(self, text: str) -> Optional[str]:
+        """Первое обязательное слово, которого нет в тексте"""
+        for keyword, pattern in self._include:
+            if not pattern.search(text):
+                return keyword
+        return None
+
+    def matches(self, text: str) -> bool:
+        return self.excluded_by(text) is None and self.missing_include(text) is None
+
+
+@lru_cache(maxsize=4096)
+def _compile_matcher(exclude_keywords: Tuple[str, ...], include_keywords: Tuple[str, ...]) -> KeywordMatcher:
+    return KeywordMatcher(exclude_keywords, include_keywords)
+
+
+@dataclass
+class FilterPreview:
+    """Результат проверки фильтров на уже полученных статьях"""
+    total: int = 0
+    kept: List[Tuple[Dict, float]] = field(default_factory=list)
+    excluded: List[Tuple[Dict, str]] = field(default_factory=list)  # (статья, слово)
+    missing_include: List[Tuple[Dict, str]] = field(default_factory=list)  # (статья, слово)
+    low_relevance: List[Tuple[Dict, float]] = field(default_factory=list)
+    newly_kept: int = 0  # проходили бы с новыми фильтрами, но не с текущими
+    newly_dropped: int = 0  # проходят с текущими фильтрами, но не с новыми
+    elapsed: float = 0.0
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.kept)
 
 
 class NewsFilter:
@@ -25,28 +101,85 @@ class NewsFilter:
         Returns:
             True если новость релевантна, False иначе
         """
-        title = article.get('title', '').lower()
-        description = article.get('description', '').lower()
-        content = article.get('content', '').lower()
+        if not exclude_keywords and not include_keywords:
+            return True
+        matcher = NewsFilter.matcher(exclude_keywords, include_keywords)
+        return matcher.matches(article_text(article))
+
+    @staticmethod
+    def matcher(
+            exclude_keywords: List[str] = None,
+            include_keywords: List[str] = None
+    ) -> KeywordMatcher:
+        """Скомпилированные фильтры (кэшируются по набору слов)"""
+        return _compile_matcher(tuple(exclude_keywords or ()), tuple(include_keywords or ()))
+
+    @staticmethod
+    def preview(
+            articles: List[Dict],
+            company_name: str,
+            exclude_keywords: List[str],
+            include_keywords: List[str],
+            min_relevance: float,
+            current: Optional[Tuple[List[str], List[str], float]] = None
+    ) -> FilterPreview:
+        """
+        Какие статьи прошли бы предлагаемые фильтры
 
-        full_text = f"{title} {description} {content}"
+        Args:
+            articles: Уже полученные статьи компании
+            company_name: Название компании
+            exclude_keywords: Предлагаемые исключения
+            include_keywords: Предлагаемые обязательные слова
+            min_relevance: Предлагаемый порог релевантности
+            current: Текущие (исключения, обязательные слова, порог) - для
+                подсчета, что изменится
 
-        # Проверка слов-исключений
-        if exclude_keywords:
-            for keyword in exclude_keywords:
-                # Используем word boundary для точного совпадения
-                pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
-                if re.search(pattern, full_text):
-                    return False
+        Returns:
+            Оставленные статьи (по убыванию оценки) и отсеянные по причинам
+        """
+        started = time.perf_counter()
+        matcher = NewsFilter.matcher(exclude_keywords, include_keywords)
+        current_matcher = NewsFilter.matcher(current[0], current[1]) if current else None
+        preview = FilterPreview(total=len(articles))
+
+        for article in articles:
+            text = article_text(article)
+            score = NewsFilter.calculate_relevance_score(article, company_name)
+
+            word = matcher.excluded_by(text)
+            if word:
+                preview.excluded.append((article, word))
+                kept = False
+            else:
+                word = matcher.missing_include(text)
+                if word:
+                    preview.missing_include.append((article, word))
+                    kept = False
+                elif score < min_relevance:
+                    preview.low_relevance.append((article, score))
+                    kept = False
+                else:
+                    preview.kept.append((article, score))
+                    kept = True
+
+            if current_matcher:
+                was_kept = score >= current[2] and current_matcher.matches(text)
+                preview.newly_kept += kept and not was_kept
+                preview.newly_dropped += was_kept and not kept
+
+        preview.kept.sort(key=lambda item: item[1], reverse=True)
+        preview.elapsed = time.perf_counter() - started
+        return preview
 
-        # Проверка обязательных слов
-        if include_keywords:
-            for keyword in include_keywords:
-                pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
-                if not re.search(pattern, full_text):
-                    return False
+    @staticmethod
+    def matches_sentiment(article: Dict, sentiment: str) -> bool:
+        """
+        Подходит ли статья под фильтр тональности подписки
 
-        return True
+        Статьи без оценки (оценка тональности выключена) не отбрасываются.
+        """
+        return sentiment == 'any' or article.get('_sentiment', sentiment) == sentiment
 
     @staticmethod
     def calculate_relevance_score(article: Dict, company_name: str) -> float:
@@ -57,6 +190,8 @@ class NewsFilter:
         - Упоминание в заголовке (высокий вес)
         - Упоминание в описании (средний вес)
         - Позиция упоминания (чем раньше, тем лучше)
+        - Упоминания в полном тексте, если статья дозагружена: до +0.3, а
+          если компания в тексте не упоминается ни разу, -0.2
         """
         title = article.get('title', '').lower()
         description = article.get('description', '').lower()
@@ -79,12 +214,20 @@ class NewsFilter:
             if position < len(description) * 0.3:  # В первой трети
                 score += 0.2
 
-        return min(score, 1.0)  # Ограничиваем максимум 1.0
+        full_text = article.get('full_text')
+        if full_text:
+            mentions = full_text.lower().count(company_lower)
+            score += min(mentions, 3) * 0.1 if mentions else -0.2
+
+        return max(0.0, min(score, 1.0))  # Ограничиваем диапазон 0.0-1.0
 
     @staticmethod
     def get_common_exclusions(company_name: str) -> List[str]:
         """
         Получить рекомендуемые исключения для популярных компаний
+
+        Запасной вариант, пока по компании не набралось статистики для
+        ExclusionAdvisor.
         """
         exclusion_map = {
             'яндекс': ['карты', 'такси', 'маркет', 'музыка', 'браузер', 'диск', 'еда'],
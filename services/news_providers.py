@@ -0,0 +1,456 @@
+"""Источники новостей: GNews API и RSS/Atom-ленты компаний"""
+import asyncio
+import json
+import logging
+import re
+import time
+import aiohttp
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from html import unescape
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import Element, ParseError, XMLPullParser
+
+from config import Config, GNewsConfig, ProvidersConfig
+from services.circuit_breaker import HALF_OPEN, CircuitBreaker, backoff_delay, parse_retry_after
+from services.traffic_log import TrafficRecorder, TrafficReplayer
+from utils.metrics import GNEWS_LATENCY, GNEWS_REQUESTS, PROVIDER_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_SPACES_RE = re.compile(r'\s+')
+
+
+class ProviderStats:
+    """Счетчики здоровья источника для /status"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.rejected = 0
+        self.articles = 0
+        self.latency_total = 0.0
+        self.last_success_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def as_dict(self) -> dict:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'not_modified': self.not_modified,
+            'rejected': self.rejected,
+            'articles': self.articles,
+            'avg_latency': round(self.latency_total / self.requests, 3) if self.requests else None,
+            'last_success_at': (
+                datetime.fromtimestamp(self.last_success_at).isoformat()
+                if self.last_success_at else None
+            ),
+            'last_error': self.last_error,
+        }
+
+
+class NewsProvider(ABC):
+    """
+    Источник статей для NewsService
+
+    Статьи возвращаются в формате GNews (title, description, content,
+    url, image, publishedAt, source), чтобы фильтр и рендер не зависели от
+    источника.
+    """
+
+    name = ''
+
+    def __init__(self):
+        self.stats = ProviderStats()
+
+    def covers(self, company_name: str) -> bool:
+        """Может ли источник искать новости по компании"""
+        return True
+
+    @abstractmethod
+    async def fetch(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        """Статьи по компании, новые первыми (None при ошибке)"""
+
+    def status(self) -> dict:
+        return self.stats.as_dict()
+
+    def _observe(self, result: str, started: float, articles: int = 0, error: str = None):
+        PROVIDER_REQUESTS.labels(self.name, result).inc()
+        if result == 'rejected':
+            # Запрос не отправлялся: цепь разомкнута
+            self.stats.rejected += 1
+            return
+        self.stats.requests += 1
+        self.stats.latency_total += time.perf_counter() - started
+        self.stats.articles += articles
+        if result == 'error':
+            self.stats.errors += 1
+            self.stats.last_error = error
+        else:
+            self.stats.last_success_at = time.time()
+            if result == 'not_modified':
+                self.stats.not_modified += 1
+
+
+class GNewsProvider(NewsProvider):
+    """Поиск по GNews API с учетом дневной квоты"""
+
+    name = 'gnews'
+
+    def __init__(self, config: GNewsConfig):
+        super().__init__()
+        self.config = config
+        # Запросы за текущие сутки UTC (квота GNews сбрасывается в полночь UTC)
+        self._quota_day = None
+        self._quota_used = 0
+        # Запись трафика для офлайн-прогонов или воспроизведение записи
+        self.recorder = TrafficRecorder(config.record_path) if config.record_path else None
+        self.replayer = (
+            TrafficReplayer(config.replay_path, config.replay_speed)
+            if config.replay_path else None
+        )
+        self.breaker = CircuitBreaker('gnews', config.breaker_failures, config.breaker_recovery)
+
+    async def fetch(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        """
+        Запрос к GNews API (None при ошибке)
+
+        Временные ошибки (сеть, таймаут, 5xx, 429) повторяются с
+        экспоненциальной паузой и jitter; 429 ждет Retry-After, если он не
+        длиннее max_retry_after. Неудачи подряд размыкают цепь: пока она
+        разомкнута, запросы не отправляются и NewsService отдает последние
+        полученные статьи.
+        """
+        if self.replayer:
+            GNEWS_REQUESTS.labels('replay').inc()
+            return await self.replayer.response(company_name, fetch_count)
+
+        if not self.breaker.allow():
+            GNEWS_REQUESTS.labels('breaker_open').inc()
+            self._observe('rejected', time.perf_counter())
+            return None
+
+        params = {
+            'q': company_name,
+            'token': self.config.api_key,
+            'lang': self.config.language,
+            'max': fetch_count,
+            'sortby': 'publishedAt'
+        }
+
+        started = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            status, data, retry_after, error = await self._request(params)
+            if status == 200:
+                self.breaker.record_success()
+                self._record(params, status, started, data)
+                articles = data.get('articles', [])
+                self._observe('ok', started, len(articles))
+                return articles
+
+            transient = status is None or status == 429 or status >= 500
+            logger.error(
+                f"Error fetching news for {company_name}: {error} "
+                f"(attempt {attempt}/{self.config.retries + 1})"
+            )
+            # Сервер просит паузу длиннее, чем имеет смысл ждать - сразу
+            # размыкаем цепь на это время
+            too_long = retry_after is not None and retry_after > self.config.max_retry_after
+            # Пробный запрос после паузы не повторяется: одна неудача - снова пауза
+            probing = self.breaker.state == HALF_OPEN
+            if not transient or too_long or probing or attempt > self.config.retries:
+                break
+            delay = (
+                retry_after if retry_after is not None
+                else backoff_delay(attempt, self.config.retry_base_delay, self.config.retry_max_delay)
+            )
+            GNEWS_REQUESTS.labels('retry').inc()
+            await asyncio.sleep(delay)
+
+        # Неверный ключ или запрет тоже повод прекратить запросы; прочие
+        # 4xx относятся к конкретному запросу, а не к API
+        if transient or status in (401, 403):
+            self.breaker.record_failure(error, retry_after if too_long else None)
+        else:
+            self.breaker.record_success()
+        self._record(params, status, started)
+        self._observe('error', started, error=error)
+        return None
+
+    async def _request(self, params: Dict):
+        """
+        Одна попытка запроса
+
+        Returns:
+            (HTTP-статус или None при сетевой ошибке, JSON ответа,
+            Retry-After в секундах, описание ошибки)
+        """
+        self._count_request()
+        started = time.perf_counter()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(
+                    self.config.base_url,
+                    params=params,
+                    timeout=aiohttp.ClientTimeout(total=self.config.timeout)
+                ) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        GNEWS_REQUESTS.labels('ok').inc()
+                        return response.status, data, None, None
+                    GNEWS_REQUESTS.labels(str(response.status)).inc()
+                    retry_after = None
+                    if response.status in (429, 503):
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    return response.status, None, retry_after, f"HTTP {response.status}"
+        except Exception as e:
+            GNEWS_REQUESTS.labels('error').inc()
+            return None, None, None, str(e) or type(e).__name__
+        finally:
+            GNEWS_LATENCY.observe(time.perf_counter() - started)
+
+    def _record(self, params: Dict, status: Optional[int], started: float, data: Dict = None):
+        if not self.recorder:
+            return
+        try:
+            self.recorder.record(
+                {key: value for key, value in params.items() if key != 'token'},
+                status,
+                time.perf_counter() - started,
+                data
+            )
+        except OSError as e:
+            logger.error(f"Error recording GNews response: {e}")
+
+    def _count_request(self):
+        today = datetime.now(timezone.utc).date()
+        if today != self._quota_day:
+            self._quota_day = today
+            self._quota_used = 0
+        self._quota_used += 1
+
+    def quota_left(self) -> int:
+        """Остаток дневной квоты GNews по запросам этого процесса"""
+        if datetime.now(timezone.utc).date() != self._quota_day:
+            return self.config.daily_quota
+        return max(0, self.config.daily_quota - self._quota_used)
+
+    def status(self) -> dict:
+        return {
+            **super().status(),
+            'quota_left': self.quota_left(),
+            'breaker': self.breaker.status(),
+        }
+
+
+class _FeedState:
+    """Валидаторы условного GET и последние разобранные статьи ленты"""
+
+    __slots__ = ('etag', 'last_modified', 'articles', 'failures')
+
+    def __init__(self):
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.articles: List[Dict] = []
+        self.failures = 0
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _clean_text(text: Optional[str]) -> str:
+    """Текст без HTML-тегов, сущностей и лишних пробелов"""
+    if not text:
+        return ''
+    return _SPACES_RE.sub(' ', unescape(_TAG_RE.sub(' ', text))).strip()
+
+
+def _parse_date(value: Optional[str]) -> str:
+    """Дата RSS (RFC 822) или Atom (ISO 8601) в формате GNews"""
+    if not value:
+        return ''
+    value = value.strip()
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return ''
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _entry_to_article(entry: Element, feed_title: str, feed_url: str) -> Optional[Dict]:
+    """Элемент <item> (RSS) или <entry> (Atom) в формате статьи GNews"""
+    fields: Dict[str, str] = {}
+    url = ''
+    image = None
+    for child in entry:
+        name = _local_name(child.tag)
+        if name == 'link':
+            # RSS: ссылка в тексте; Atom: в href, основная - rel="alternate"
+            href = child.get('href')
+            if href is None:
+                url = url or (child.text or '').strip()
+            elif child.get('rel', 'alternate') == 'alternate':
+                url = href.strip()
+        elif name == 'enclosure' and (child.get('type') or '').startswith('image/'):
+            image = child.get('url')
+        elif child.text and name not in fields:
+            fields[name] = child.text
+
+    if not url:
+        return None
+
+    description = _clean_text(fields.get('description') or fields.get('summary'))
+    content = _clean_text(fields.get('encoded') or fields.get('content')) or description
+    return {
+        'title': _clean_text(fields.get('title')),
+        'description': description,
+        'content': content,
+        'url': url,
+        'image': image,
+        'publishedAt': _parse_date(
+            fields.get('pubDate') or fields.get('published')
+            or fields.get('updated') or fields.get('date')
+        ),
+        'source': {'name': feed_title or urlsplit(feed_url).netloc, 'url': feed_url},
+    }
+
+
+class RSSProvider(NewsProvider):
+    """
+    Пресс-ленты компаний (RSS 2.0 и Atom)
+
+    Ленты всех компаний скачиваются через общий пул из concurrency
+    соединений. Повторный запрос ленты условный (ETag/If-Modified-Since):
+    на 304 используются статьи, разобранные в прошлый раз. Ответ
+    разбирается потоково по мере получения, хранятся только первые
+    max_items записей ленты.
+    """
+
+    name = 'rss'
+
+    def __init__(self, feeds: Dict[str, List[str]], config: ProvidersConfig):
+        super().__init__()
+        self.config = config
+        self.feeds = {company.lower(): urls for company, urls in feeds.items()}
+        self._states: Dict[str, _FeedState] = {}
+        self._pool = asyncio.Semaphore(config.rss_concurrency)
+
+    @classmethod
+    def from_file(cls, path: str, config: ProvidersConfig) -> 'RSSProvider':
+        """Ленты из JSON-файла {"Компания": ["https://.../rss", ...]}"""
+        with open(path, encoding='utf-8') as feeds_file:
+            feeds = json.load(feeds_file)
+        logger.info(f"Loaded {sum(map(len, feeds.values()))} RSS feeds for {len(feeds)} companies")
+        return cls(feeds, config)
+
+    def covers(self, company_name: str) -> bool:
+        return company_name.lower() in self.feeds
+
+    async def fetch(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        """Статьи всех лент компании (None, если не ответила ни одна)"""
+        urls = self.feeds.get(company_name.lower(), [])
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.config.rss_timeout)
+        ) as session:
+            results = await asyncio.gather(*(self._fetch_feed(session, url) for url in urls))
+
+        if all(result is None for result in results):
+            return None
+
+        articles, seen = [], set()
+        for result in results:
+            for article in result or ():
+                if article['url'] not in seen:
+                    seen.add(article['url'])
+                    articles.append(article)
+        articles.sort(key=lambda article: article['publishedAt'], reverse=True)
+        return articles[:fetch_count]
+
+    async def _fetch_feed(self, session: aiohttp.ClientSession, url: str) -> Optional[List[Dict]]:
+        state = self._states.setdefault(url, _FeedState())
+        headers = {}
+        if state.etag:
+            headers['If-None-Match'] = state.etag
+        if state.last_modified:
+            headers['If-Modified-Since'] = state.last_modified
+
+        async with self._pool:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304:
+                        state.failures = 0
+                        self._observe('not_modified', started)
+                        return state.articles
+                    if response.status != 200:
+                        return self._feed_failed(state, url, started, f"HTTP {response.status}")
+                    articles = await self._parse(response, url)
+                    state.etag = response.headers.get('ETag')
+                    state.last_modified = response.headers.get('Last-Modified')
+            except (aiohttp.ClientError, asyncio.TimeoutError, ParseError) as e:
+                return self._feed_failed(state, url, started, str(e) or type(e).__name__)
+
+        state.articles = articles
+        state.failures = 0
+        self._observe('ok', started, len(articles))
+        return articles
+
+    def _feed_failed(self, state: _FeedState, url: str, started: float, error: str) -> None:
+        state.failures += 1
+        logger.warning(f"Error fetching feed {url} ({state.failures} in a row): {error}")
+        self._observe('error', started, error=f"{url}: {error}")
+
+    async def _parse(self, response: aiohttp.ClientResponse, url: str) -> List[Dict]:
+        """Потоковый разбор ленты по мере получения ответа"""
+        parser = XMLPullParser(events=('start', 'end'))
+        path: List[str] = []
+        feed_title = ''
+        articles: List[Dict] = []
+
+        async for chunk in response.content.iter_chunked(16 * 1024):
+            parser.feed(chunk)
+            for event, element in parser.read_events():
+                name = _local_name(element.tag)
+                if event == 'start':
+                    path.append(name)
+                    continue
+                path.pop()
+                if name == 'title' and path and path[-1] in ('channel', 'feed'):
+                    feed_title = _clean_text(element.text)
+                elif name in ('item', 'entry'):
+                    article = _entry_to_article(element, feed_title, url)
+                    if article:
+                        articles.append(article)
+                    # Разобранная запись больше не нужна в дереве
+                    element.clear()
+            if len(articles) >= self.config.rss_max_items:
+                break
+        return articles[:self.config.rss_max_items]
+
+    def status(self) -> dict:
+        return {
+            **super().status(),
+            'feeds': sum(map(len, self.feeds.values())),
+            'feeds_failing': sum(1 for state in self._states.values() if state.failures),
+        }
+
+
+def create_providers(config: Config) -> List[NewsProvider]:
+    """Источники в порядке опроса: ленты компаний, затем GNews"""
+    providers: List[NewsProvider] = []
+    if config.providers.rss_feeds_file:
+        providers.append(RSSProvider.from_file(config.providers.rss_feeds_file, config.providers))
+    providers.append(GNewsProvider(config.gnews))
+    return providers
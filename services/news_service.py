@@ -1,16 +1,74 @@
 """Сервис для работы с новостями"""
-import aiohttp
-from typing import List, Dict, Optional
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, List, Dict, Optional, Tuple
 from config import GNewsConfig
-from services.news_filter import NewsFilter
+from services.news_filter import FilterPreview, NewsFilter
+from services.message_renderer import render_news_message
+from services.news_providers import GNewsProvider, NewsProvider
+from services.enrichment import ArticleEnricher
+from services.exclusions import ExclusionAdvisor
+from services.sentiment import SentimentScorer
+from services.trending import TrendingDetector
+from utils.metrics import ARTICLES, FILTER_PREVIEW_SECONDS, NEWS_CACHE
+
+if TYPE_CHECKING:
+    from database.database import Database
+    from services.feedback import RelevanceModel
+
+logger = logging.getLogger(__name__)
 
 
 class NewsService:
-    """Сервис для получения новостей через GNews API"""
+    """
+    Сервис для получения новостей
+
+    Источники опрашиваются по порядку: первый, который знает компанию и
+    вернул статьи, дает ответ. Так компании с пресс-лентами не тратят
+    квоту GNews, а GNews остается запасным вариантом.
+    """
+
+    # Сколько последних успешных ответов хранить для отдачи при сбоях API
+    MAX_LAST_GOOD = 1000
+    # На скольких последних статьях проверять фильтры в /filter
+    PREVIEW_ARTICLES = 50
 
-    def __init__(self, config: GNewsConfig):
+    def __init__(
+        self,
+        config: GNewsConfig,
+        archive: Optional['Database'] = None,
+        providers: Optional[List[NewsProvider]] = None,
+        enricher: Optional[ArticleEnricher] = None,
+        sentiment: Optional[SentimentScorer] = None,
+        trending: Optional[TrendingDetector] = None,
+        exclusions: Optional[ExclusionAdvisor] = None
+    ):
         self.config = config
+        # Статистика слов в статьях для рекомендуемых исключений
+        self.exclusions = exclusions
+        # Учет упоминаний во всех полученных статьях для /trending и планировщика
+        self.trending = trending
+        # Оценка тональности отобранных статей
+        self.sentiment = sentiment
+        # Дозагрузка полного текста статей с оценкой около порога
+        self.enricher = enricher
+        self.providers = providers or [GNewsProvider(config)]
+        self.gnews = next(
+            (provider for provider in self.providers if isinstance(provider, GNewsProvider)),
+            None
+        )
+        # Архив статей в БД: ответы API сохраняются для /search, а свежий
+        # ответ, полученный другим процессом, заменяет повторный запрос
+        self.archive = archive
         self.filter = NewsFilter()
+        # Короткий кэш ответов API и запросы в полете: планировщик и /check
+        # разных пользователей по одной компании делают один запрос
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[Dict]]] = {}
+        self._in_flight: Dict[Tuple[str, int], asyncio.Task] = {}
+        # Последние успешные ответы: отдаются, пока источники недоступны
+        self._last_good: OrderedDict[Tuple[str, int], Tuple[float, List[Dict]]] = OrderedDict()
 
     async def fetch_news(
         self,
@@ -18,7 +76,9 @@ class NewsService:
         max_results: Optional[int] = None,
         exclude_keywords: List[str] = None,
         include_keywords: List[str] = None,
-        min_relevance_score: float = 0.0
+        min_relevance_score: float = 0.0,
+        sentiment: str = 'any',
+        model: Optional['RelevanceModel'] = None
     ) -> List[Dict]:
         """
         Получить отфильтрованные новости по компании
@@ -29,67 +89,303 @@ class NewsService:
             exclude_keywords: Слова для исключения
             include_keywords: Обязательные слова
             min_relevance_score: Минимальный порог релевантности (0.0-1.0)
+            sentiment: Только статьи с этой тональностью (bullish, bearish; any - все)
+            model: Персональная модель релевантности по оценкам пользователя
         """
         max_results = max_results or self.config.max_results
 
         # Запрашиваем больше результатов для последующей фильтрации
         fetch_count = max_results * 3
+        articles = await self.fetch_articles(company_name, fetch_count)
 
-        params = {
-            'q': company_name,
-            'token': self.config.api_key,
-            'lang': self.config.language,
-            'max': fetch_count,
-            'sortby': 'publishedAt'
-        }
+        # Фильтруем и сортируем по релевантности
+        scored = []
+
+        for article in articles:
+            # Проверяем ключевые слова
+            if not self.filter.is_relevant(
+                article,
+                company_name,
+                exclude_keywords,
+                include_keywords
+            ):
+                continue
+
+            # Вычисляем релевантность
+            score = self.filter.calculate_relevance_score(
+                article,
+                company_name
+            )
+            scored.append((article, score))
+
+        if self.enricher:
+            scored = await self._rescore_borderline(
+                scored, company_name, exclude_keywords, include_keywords, min_relevance_score
+            )
+
+        if model:
+            scored = [
+                (article, model.score(article, company_name, score))
+                for article, score in scored
+            ]
+            min_relevance_score = model.threshold(min_relevance_score)
+
+        # Копия: исходная статья разделяется через кэш
+        filtered_articles = [
+            {**article, '_relevance_score': score}
+            for article, score in scored if score >= min_relevance_score
+        ]
+
+        if self.sentiment:
+            self.sentiment.annotate(filtered_articles)
+            filtered_articles = [
+                article for article in filtered_articles
+                if self.filter.matches_sentiment(article, sentiment)
+            ]
+
+        ARTICLES.labels('kept').inc(len(filtered_articles))
+        ARTICLES.labels('filtered').inc(len(articles) - len(filtered_articles))
+
+        # Сортируем по релевантности
+        filtered_articles.sort(
+            key=lambda x: x.get('_relevance_score', 0),
+            reverse=True
+        )
+
+        return filtered_articles[:max_results]
+
+    async def recent_articles(self, company_name: str, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Последние полученные статьи компании без запросов к источникам
+
+        Статьи берутся из кэша ответов и последних успешных ответов в
+        памяти, а если их меньше limit - еще и из архива.
+        """
+        limit = limit or self.PREVIEW_ARTICLES
+        articles: Dict[str, Dict] = {}
+        for entries in (self._cache, self._last_good):
+            for (name, _), (_, cached) in list(entries.items()):
+                if name == company_name:
+                    for article in cached:
+                        articles.setdefault(article.get('url') or article.get('title', ''), article)
+
+        if self.archive and len(articles) < limit:
+            try:
+                archived = await self.archive.get_company_articles(company_name, limit)
+            except Exception as e:
+                logger.error(f"Error reading article archive for {company_name}: {e}")
+                archived = []
+            for article in archived:
+                articles.setdefault(article.get('url') or article.get('title', ''), article)
+
+        result = sorted(articles.values(), key=lambda a: a.get('publishedAt') or '', reverse=True)
+        return result[:limit]
+
+    async def suggest_exclusions(self, company_name: str) -> List[str]:
+        """
+        Рекомендуемые исключения для подписки без запросов к источникам
+
+        Пока по компании нет статистики (новая компания, новая установка) -
+        запасной список для популярных компаний. Статистика новой подписки
+        наберется из запросов планировщика.
+        """
+        suggestions = await self.exclusions.suggest(company_name) if self.exclusions else []
+        return suggestions or NewsFilter.get_common_exclusions(company_name)
+
+    async def preview_filters(
+        self,
+        company_name: str,
+        exclude_keywords: List[str],
+        include_keywords: List[str],
+        min_relevance: float,
+        current: Optional[Tuple[List[str], List[str], float]] = None
+    ) -> FilterPreview:
+        """
+        Проверить предлагаемые фильтры на последних статьях компании
 
+        Источники не запрашиваются и полный текст не загружается: оценка
+        считается по тому, что уже есть в кэше и архиве.
+        """
+        started = time.perf_counter()
+        articles = await self.recent_articles(company_name)
+        preview = self.filter.preview(
+            articles, company_name, exclude_keywords, include_keywords, min_relevance, current
+        )
+        FILTER_PREVIEW_SECONDS.observe(time.perf_counter() - started)
+        return preview
+
+    async def _rescore_borderline(
+        self,
+        scored: List[Tuple[Dict, float]],
+        company_name: str,
+        exclude_keywords: Optional[List[str]],
+        include_keywords: Optional[List[str]],
+        min_relevance_score: float
+    ) -> List[Tuple[Dict, float]]:
+        """Повторно проверить статьи с оценкой около порога по полному тексту"""
+        borderline = [
+            idx for idx, (article, score) in enumerate(scored)
+            if article.get('url') and self.enricher.is_borderline(score, min_relevance_score)
+        ]
+        if not borderline:
+            return scored
+
+        texts = await asyncio.gather(*(
+            self.enricher.full_text(scored[idx][0]['url']) for idx in borderline
+        ))
+
+        result = list(scored)
+        for idx, text in zip(borderline, texts):
+            if not text:
+                continue
+            article = {**scored[idx][0], 'full_text': text}
+            if self.filter.is_relevant(article, company_name, exclude_keywords, include_keywords):
+                result[idx] = (article, self.filter.calculate_relevance_score(article, company_name))
+            else:
+                result[idx] = None
+        return [item for item in result if item is not None]
+
+    async def fetch_articles(self, company_name: str, fetch_count: int) -> List[Dict]:
+        """
+        Получить сырые статьи из источников с кэшированием
+
+        Одновременные запросы по одной компании объединяются в один.
+        Если в архиве есть ответ не старше cache_ttl (например, полученный
+        воркером), API не запрашивается. Если источники ответили ошибкой
+        (или цепь GNews разомкнута), возвращается последний успешный ответ
+        не старше stale_ttl.
+        """
+        key = (company_name, fetch_count)
+
+        cached = self._cache.get(key)
+        if cached and time.monotonic() - cached[0] < self.config.cache_ttl:
+            NEWS_CACHE.labels('hit').inc()
+            return cached[1]
+
+        in_flight = self._in_flight.get(key)
+        if in_flight:
+            NEWS_CACHE.labels('shared').inc()
+        else:
+            # Запрос идет в отдельной задаче: отмена любого из ожидающих
+            # (в том числе начавшего запрос) не отменяет его для остальных
+            in_flight = asyncio.create_task(self._load(company_name, fetch_count))
+            self._in_flight[key] = in_flight
+            in_flight.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(in_flight)
+
+    async def _load(self, company_name: str, fetch_count: int) -> List[Dict]:
+        """Статьи из архива или источников; результат кэшируется (для fetch_articles)"""
+        key = (company_name, fetch_count)
+        stale = None
+        articles = await self._from_archive(company_name, fetch_count)
+        if articles is not None:
+            NEWS_CACHE.labels('archive').inc()
+        else:
+            NEWS_CACHE.labels('miss').inc()
+            articles = await self._request(company_name, fetch_count)
+            if articles is not None:
+                await self._save_to_archive(company_name, fetch_count, articles)
+            else:
+                stale = await self._stale(company_name, fetch_count)
+
+        # Ошибки API и устаревшие ответы не кэшируем: следующий запрос
+        # снова попробует источники
+        if articles is None:
+            return stale or []
+
+        self._last_good[key] = (time.time(), articles)
+        self._last_good.move_to_end(key)
+        if len(self._last_good) > self.MAX_LAST_GOOD:
+            self._last_good.popitem(last=False)
+
+        if self.trending:
+            self.trending.observe(articles, company_name=company_name)
+        if self.exclusions:
+            self.exclusions.observe(company_name, articles)
+
+        self._cache[key] = (time.monotonic(), articles)
+        self._evict_expired()
+        return articles
+
+    async def _request(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        """Статьи от первого источника, ответившего по компании (None при ошибке всех)"""
+        result = None
+        for provider in self.providers:
+            if not provider.covers(company_name):
+                continue
+            articles = await provider.fetch(company_name, fetch_count)
+            if articles:
+                return articles
+            if articles is not None:
+                result = articles
+        return result
+
+    async def _stale(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        """Последний успешный ответ не старше stale_ttl (из памяти или архива)"""
+        last_good = self._last_good.get((company_name, fetch_count))
+        if last_good and time.time() - last_good[0] < self.config.stale_ttl:
+            articles = last_good[1]
+        elif self.archive:
+            try:
+                articles = await self.archive.get_recent_articles(
+                    company_name, fetch_count, self.config.stale_ttl
+                )
+            except Exception as e:
+                logger.error(f"Error reading article archive for {company_name}: {e}")
+                articles = None
+        else:
+            articles = None
+
+        if articles is not None:
+            NEWS_CACHE.labels('stale').inc()
+            logger.warning(f"Sources unavailable for {company_name}, serving last good articles")
+        return articles
+
+    async def _from_archive(self, company_name: str, fetch_count: int) -> Optional[List[Dict]]:
+        if not self.archive:
+            return None
+        try:
+            return await self.archive.get_recent_articles(
+                company_name, fetch_count, self.config.cache_ttl
+            )
+        except Exception as e:
+            logger.error(f"Error reading article archive for {company_name}: {e}")
+            return None
+
+    async def _save_to_archive(self, company_name: str, fetch_count: int, articles: List[Dict]):
+        if not self.archive:
+            return
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    self.config.base_url,
-                    params=params,
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        articles = data.get('articles', [])
-
-                        # Фильтруем и сортируем по релевантности
-                        filtered_articles = []
-
-                        for article in articles:
-                            # Проверяем ключевые слова
-                            if not self.filter.is_relevant(
-                                article,
-                                company_name,
-                                exclude_keywords,
-                                include_keywords
-                            ):
-                                continue
-
-                            # Вычисляем релевантность
-                            score = self.filter.calculate_relevance_score(
-                                article,
-                                company_name
-                            )
-
-                            if score >= min_relevance_score:
-                                article['_relevance_score'] = score
-                                filtered_articles.append(article)
-
-                        # Сортируем по релевантности
-                        filtered_articles.sort(
-                            key=lambda x: x.get('_relevance_score', 0),
-                            reverse=True
-                        )
-
-                        return filtered_articles[:max_results]
-                    else:
-                        print(f"Error fetching news: {response.status}")
-                        return []
+            await self.archive.save_articles(company_name, fetch_count, articles)
         except Exception as e:
-            print(f"Exception while fetching news: {e}")
-            return []
+            logger.error(f"Error archiving articles for {company_name}: {e}")
+
+    def quota_left(self) -> int:
+        """Остаток дневной квоты GNews по запросам этого процесса"""
+        return self.gnews.quota_left() if self.gnews else 0
+
+    def providers_status(self) -> Dict[str, dict]:
+        """Здоровье источников для /status"""
+        return {provider.name: provider.status() for provider in self.providers}
+
+    def cached_articles(self) -> Dict[str, List[Dict]]:
+        """Свежие ответы из кэша по компаниям (для бенчмарков и диагностики)"""
+        now = time.monotonic()
+        return {
+            company_name: articles
+            for (company_name, _), (fetched_at, articles) in self._cache.items()
+            if now - fetched_at < self.config.cache_ttl
+        }
+
+    def _evict_expired(self):
+        """Удалить устаревшие записи кэша"""
+        now = time.monotonic()
+        expired = [
+            key for key, (fetched_at, _) in self._cache.items()
+            if now - fetched_at >= self.config.cache_ttl
+        ]
+        for key in expired:
+            del self._cache[key]
 
     @staticmethod
     def format_news_message(
@@ -98,29 +394,4 @@ class NewsService:
         show_relevance: bool = False
     ) -> str:
         """Форматировать новость для отправки"""
-        title = article.get('title', 'Без заголовка')
-        description = article.get('description', '')
-        published_at = article.get('publishedAt', '')
-        source = article.get('source', {}).get('name', 'Неизвестный источник')
-        url = article.get('url', '')
-
-        message = f"""
-                    📰 <b>Новости по: {company_name}</b>
-                    
-                    📌 <b>{title}</b>
-                    
-                    {description}
-                    
-                    🔗 Источник: {source}
-                    ⏰ {published_at}
-                """
-
-        # Опционально показываем оценку релевантности
-        if show_relevance and '_relevance_score' in article:
-            score = article['_relevance_score']
-            stars = '⭐' * int(score * 5)
-            message += f"📊 Релевантность: {stars} ({score:.2f})\n"
-
-        message += f"\n<a href=\"{url}\">Читать полностью</a>"
-
-        return message.strip()
+        return render_news_message(company_name, article, show_relevance)
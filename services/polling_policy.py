@@ -0,0 +1,182 @@
+"""Адаптивное расписание опроса компаний"""
+import heapq
+import math
+from dataclasses import replace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database.models import CompanySchedule
+
+
+class PollingPolicy:
+    """
+    Расчет интервала опроса компании
+
+    Интервал зависит от:
+    - частоты новых статей (хотим ~1 новую статью за опрос)
+    - количества подписчиков (популярные компании опрашиваются чаще)
+    - серии пустых проверок (экспоненциальный backoff для тихих компаний)
+    - всплеска упоминаний компании в новостях (boost)
+    """
+
+    def __init__(
+            self,
+            base_interval: float,
+            min_interval: float,
+            max_interval: float,
+            backoff_factor: float = 2.0,
+            rate_smoothing: float = 0.3,
+            subscriber_weight: float = 0.25
+    ):
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.rate_smoothing = rate_smoothing
+        self.subscriber_weight = subscriber_weight
+
+    def new_schedule(self, company_name: str, due_at: float) -> CompanySchedule:
+        """Расписание для компании, которую еще не опрашивали"""
+        return CompanySchedule(
+            company_name=company_name,
+            next_due_at=due_at,
+            interval=self._clamp(self.base_interval)
+        )
+
+    def interval_for(
+            self,
+            article_rate: float,
+            subscribers: int,
+            quiet_streak: int,
+            boost: float = 1.0
+    ) -> float:
+        """Вычислить интервал опроса в секундах"""
+        interval = self.base_interval
+
+        # Частые новости -> опрашиваем так, чтобы на опрос приходилась ~1 статья
+        if article_rate > 0:
+            interval = min(interval, 3600 / article_rate)
+
+        # Больше подписчиков -> опрашиваем чаще (логарифмически)
+        interval /= 1 + self.subscriber_weight * math.log2(max(subscribers, 1))
+
+        # Тихие компании -> экспоненциальный backoff
+        if quiet_streak:
+            interval *= self.backoff_factor ** quiet_streak
+
+        # О компании внезапно много пишут -> опрашиваем чаще
+        interval /= boost
+
+        return self._clamp(interval)
+
+    def update(
+            self,
+            schedule: CompanySchedule,
+            new_articles: int,
+            subscribers: int,
+            now: float,
+            boost: float = 1.0
+    ) -> CompanySchedule:
+        """Обновить расписание после проверки компании"""
+        article_rate = schedule.article_rate
+        if schedule.last_checked_at is not None:
+            elapsed_hours = max(now - schedule.last_checked_at, 1.0) / 3600
+            observed = new_articles / elapsed_hours
+            article_rate += self.rate_smoothing * (observed - article_rate)
+        elif new_articles:
+            article_rate = new_articles * 3600 / self.base_interval
+
+        quiet_streak = 0 if new_articles else schedule.quiet_streak + 1
+        interval = self.interval_for(article_rate, subscribers, quiet_streak, boost)
+
+        # Не наращиваем степень backoff после достижения максимума
+        if quiet_streak and interval >= self.max_interval:
+            quiet_streak = max(schedule.quiet_streak, 1)
+
+        return replace(
+            schedule,
+            next_due_at=now + interval,
+            interval=interval,
+            article_rate=article_rate,
+            quiet_streak=quiet_streak,
+            last_checked_at=now
+        )
+
+    def retry_after_failure(self, schedule: CompanySchedule, failures: int, now: float) -> CompanySchedule:
+        """
+        Перепланировать компанию после ошибки проверки
+
+        Повтор откладывается экспоненциально (min_interval, 2x, 4x, ...), но
+        не дольше обычного интервала компании: падающий источник не
+        опрашивается на каждом тике и не расходует квоту.
+        """
+        delay = min(schedule.interval, self.min_interval * self.backoff_factor ** max(failures - 1, 0))
+        return replace(schedule, next_due_at=now + delay)
+
+    def _clamp(self, interval: float) -> float:
+        return max(self.min_interval, min(self.max_interval, interval))
+
+
+class PollingDispatcher:
+    """
+    Очередь с приоритетом по времени следующей проверки
+
+    Вместо одного цикла по всем компаниям раз в час диспетчер на каждом
+    тике выдает только подошедшие компании, ограничивая их количество
+    ожидаемой нагрузкой на тик. Так запросы к API распределяются
+    равномерно по интервалу.
+    """
+
+    def __init__(self, tick: float):
+        self.tick = tick
+        self._heap: List[Tuple[float, str]] = []
+        self._schedules: Dict[str, CompanySchedule] = {}
+
+    def __len__(self) -> int:
+        return len(self._schedules)
+
+    def load(self, schedules: Iterable[CompanySchedule]):
+        """Загрузить расписание (например, из БД)"""
+        self._schedules = {s.company_name: s for s in schedules}
+        self._heap = [(s.next_due_at, s.company_name) for s in self._schedules.values()]
+        heapq.heapify(self._heap)
+
+    def push(self, schedule: CompanySchedule):
+        """Добавить или перепланировать компанию"""
+        self._schedules[schedule.company_name] = schedule
+        heapq.heappush(self._heap, (schedule.next_due_at, schedule.company_name))
+
+    def get(self, company_name: str) -> Optional[CompanySchedule]:
+        return self._schedules.get(company_name)
+
+    def expedite(self, company_name: str, due_at: float) -> bool:
+        """Перенести проверку компании на более раннее время"""
+        schedule = self._schedules.get(company_name)
+        if schedule is None or schedule.next_due_at <= due_at:
+            return False
+        self.push(replace(schedule, next_due_at=due_at))
+        return True
+
+    def tick_budget(self) -> int:
+        """Ожидаемое количество проверок за один тик"""
+        demand = sum(self.tick / s.interval for s in self._schedules.values())
+        return max(1, math.ceil(demand))
+
+    def pop_due(self, now: float, limit: Optional[int] = None) -> List[CompanySchedule]:
+        """Извлечь компании, время проверки которых наступило"""
+        due = []
+        while self._heap and (limit is None or len(due) < limit):
+            due_at, company_name = self._heap[0]
+            schedule = self._schedules.get(company_name)
+
+            # Устаревшая запись: компания перепланирована
+            if schedule is None or schedule.next_due_at != due_at:
+                heapq.heappop(self._heap)
+                continue
+
+            if due_at > now:
+                break
+
+            heapq.heappop(self._heap)
+            due.append(schedule)
+
+        return due
@@ -1,121 +1,492 @@
 """Сервис планировщика задач"""
 import asyncio
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
+import collections
+import math
+import os
+import random
+import socket
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
 from aiogram import Bot
-from database.database import Database
+from aiogram.exceptions import TelegramRetryAfter
+from bot.keyboards.inline import get_feedback_keyboard
+from database.database import DEFAULT_MIN_RELEVANCE, Database
+from services.feedback import article_features, feedback_keys
+from services.news_filter import article_text
 from services.news_service import NewsService
-from services.keepalive_service import KeepAliveService
+from services.polling_policy import PollingPolicy, PollingDispatcher
+from services.message_renderer import MessageRenderer
+from services.delivery_errors import DeliveryStatus, classify_send_error
+from database.models import CompanySchedule
+from utils.logger import log_context
+from utils.metrics import CYCLE_SECONDS, LAST_CYCLE, MESSAGES, PENDING_DELIVERIES, GNEWS_QUOTA_LEFT
 from config import Config
 import logging
 
+if TYPE_CHECKING:
+    # Нужны только для аннотаций: aiohttp.web и cProfile не грузятся при старте
+    from services.feedback import FeedbackService
+    from services.keepalive_service import KeepAliveService
+    from utils.profiling import Profiler
+
 logger = logging.getLogger(__name__)
 
 
 class SchedulerService:
     """Сервис для периодической проверки новостей"""
 
+    SEND_DELAY = 0.5  # пауза между сообщениями (лимиты Telegram)
+
     def __init__(
         self,
         bot: Bot,
         database: Database,
         news_service: NewsService,
         config: Config,
-        keepalive_service: KeepAliveService = None
+        keepalive_service: 'KeepAliveService' = None,
+        profiler: Optional['Profiler'] = None,
+        feedback: Optional['FeedbackService'] = None
     ):
         self.bot = bot
         self.database = database
         self.news_service = news_service
         self.config = config
         self.keepalive_service = keepalive_service
-        self.scheduler = AsyncIOScheduler()
+        self.profiler = profiler
+        # Персональные модели релевантности и кнопки оценки новостей
+        self.feedback = feedback
+        self.scheduler = None  # создается в start(), после готовности бота
+        self.polling_policy = PollingPolicy(
+            base_interval=config.scheduler.check_interval,
+            min_interval=config.scheduler.min_poll_interval,
+            max_interval=config.scheduler.max_poll_interval
+        )
+        self.dispatcher = PollingDispatcher(tick=config.scheduler.dispatch_tick)
+        self.renderer = MessageRenderer()
+        self.cycle_stats = collections.Counter()
+        self._inactive_counts: Dict[str, int] = {}
+        # Ошибок проверки подряд по компаниям (для отложенного повтора)
+        self._failures: Dict[str, int] = {}
+        self.worker_id = config.scheduler.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self._resumed = False
+        self._cycle_number = 0
+        self.last_cycle_at: Optional[float] = None
+        self.last_cycle_duration: Optional[float] = None
+        self.last_cycle_stats: Dict[str, int] = {}
+
+    async def check_and_send_news(self, force: bool = False):
+        """
+        Проверить новости подошедших по расписанию компаний и отправить пользователям
+
+        Прогресс цикла сохраняется в БД: проверка компании атомарно ставит
+        статьи в очередь доставки и продвигает ее расписание. После
+        перезапуска цикл продолжается с места остановки: сначала
+        дорассылается очередь, затем проверяются просроченные компании.
+
+        Args:
+            force: Проверить все компании, не дожидаясь их расписания
+        """
+        self._cycle_number += 1
+        with log_context(cycle=self._cycle_number):
+            # Сообщение рендерится один раз на статью за цикл
+            self.renderer.clear()
+            self.cycle_stats.clear()
+
+            try:
+                # Дорассылаем то, что не успели отправить до перезапуска
+                await self.deliver_pending()
+
+                subscriptions = await self.database.get_all_subscriptions()
+                self._inactive_counts = await self.database.get_inactive_subscription_counts()
+
+                # Группируем подписки по компаниям
+                companies_users = {}
+                for user_id, company_name in subscriptions:
+                    if company_name not in companies_users:
+                        companies_users[company_name] = []
+                    companies_users[company_name].append(user_id)
+
+                await self._sync_ownership(companies_users)
+
+                # После перезапуска проверяем все просроченные компании сразу,
+                # чтобы ни одна не ждала больше одного интервала
+                now = time.time()
+                self._expedite_trending(companies_users, now)
+                limit = None if force or not self._resumed else self.dispatcher.tick_budget()
+                self._resumed = True
+                due = self.dispatcher.pop_due(float('inf') if force else now, limit)
+                if not due:
+                    return
+
+                logger.info(f"Starting news check cycle ({len(due)} companies due)")
+                started = time.perf_counter()
+
+                # Получаем новости для каждой подошедшей компании
+                for schedule in due:
+                    company_name = schedule.company_name
+                    user_ids = companies_users[company_name]
+
+                    # Подтверждаем аренду: компания могла перейти к другому воркеру
+                    if not await self.database.acquire_company_leases(
+                        self.worker_id, [company_name], self.config.scheduler.lease_ttl
+                    ):
+                        continue
+
+                    try:
+                        with log_context(company=company_name):
+                            schedule = await self.process_company(schedule, user_ids)
+                    except Exception as e:
+                        failures = self._failures.get(company_name, 0) + 1
+                        self._failures[company_name] = failures
+                        schedule = self.polling_policy.retry_after_failure(schedule, failures, time.time())
+                        logger.error(
+                            f"Error processing {company_name} (failure {failures}, "
+                            f"retry in {schedule.next_due_at - time.time():.0f}s): {e}",
+                            exc_info=True
+                        )
+                        # Расписание перечитывается из БД на каждом тике
+                        try:
+                            await self.database.save_company_schedule(schedule)
+                        except Exception as save_error:
+                            logger.error(f"Error saving schedule of {company_name}: {save_error}")
+                        self.dispatcher.push(schedule)
+                        continue
+
+                    self._failures.pop(company_name, None)
+                    self.dispatcher.push(schedule)
+                    await self.deliver_pending()
+
+                self.last_cycle_duration = time.perf_counter() - started
+                self.last_cycle_at = time.time()
+                self.last_cycle_stats = dict(self.cycle_stats)
+                CYCLE_SECONDS.observe(self.last_cycle_duration)
+                LAST_CYCLE.set(self.last_cycle_at)
 
-    async def check_and_send_news(self):
-        """Проверить новости и отправить пользователям"""
-        logger.info("Starting news check cycle")
-
-        try:
-            subscriptions = await self.database.get_all_subscriptions()
-
-            # Группируем подписки по компаниям
-            companies_users = {}
-            for user_id, company_name in subscriptions:
-                if company_name not in companies_users:
-                    companies_users[company_name] = []
-                companies_users[company_name].append(user_id)
-
-            # Получаем новости для каждой компании
-            for company_name, user_ids in companies_users.items():
-                logger.info(f"Fetching news for {company_name}")
-
-                # Получаем фильтры первого пользователя (или можно индивидуально)
-                articles = await self.news_service.fetch_news(
-                    company_name,
-                    max_results=3,
-                    min_relevance_score=0.3
+                logger.info(
+                    f"News check cycle completed in {self.last_cycle_duration:.1f}s: "
+                    f"{self.last_cycle_stats}"
                 )
 
-                if articles:
-                    for article in articles:
-                        news_url = article.get('url', '')
+            except Exception as e:
+                logger.error(f"Error in check_and_send_news: {e}", exc_info=True)
 
-                        for user_id in user_ids:
-                            # Получаем персональные фильтры пользователя
-                            filters = await self.database.get_subscription_filters(
-                                user_id,
-                                company_name
-                            )
+    async def process_company(self, schedule: CompanySchedule, user_ids: List[int]) -> CompanySchedule:
+        """
+        Получить новости компании и поставить их в очередь доставки
 
-                            # Проверяем фильтры
-                            if filters['exclude'] or filters['include']:
-                                from services.news_filter import NewsFilter
-                                filter_service = NewsFilter()
+        Returns:
+            Обновленное расписание компании
+        """
+        company_name = schedule.company_name
+        logger.info(f"Fetching news for {company_name}")
 
-                                if not filter_service.is_relevant(
-                                    article,
-                                    company_name,
-                                    filters['exclude'],
-                                    filters['include']
-                                ):
-                                    continue
+        # Персональные фильтры подписчиков: слова компилируются один раз
+        # на компанию, а не на каждую статью
+        user_filters = []
+        for user_id in user_ids:
+            filters = await self.database.get_subscription_filters(user_id, company_name)
+            matcher = (
+                self.news_service.filter.matcher(filters['exclude'], filters['include'])
+                if filters['exclude'] or filters['include'] else None
+            )
+            user_filters.append((user_id, filters, matcher))
 
-                            # Проверяем, не отправляли ли ранее
-                            if not await self.database.is_news_sent(user_id, news_url):
-                                await self.send_news_to_user(user_id, company_name, article)
-                                await self.database.mark_news_as_sent(user_id, news_url)
-                                await asyncio.sleep(0.5)
+        # Модели по оценкам подписчиков загружаются одним запросом
+        models = await self.feedback.models(company_name, user_ids) if self.feedback else {}
 
-                await asyncio.sleep(2)
+        # Общий запрос с самым низким порогом среди подписчиков (с учетом
+        # того, насколько модель может поднять оценку), персональный порог
+        # проверяется ниже
+        floors = []
+        for user_id, filters, _ in user_filters:
+            model = models.get(user_id)
+            floor = filters['min_relevance']
+            if model and model.updates:
+                floor = model.threshold(floor) - self.feedback.config.max_adjust
+            floors.append(floor)
+        articles = await self.news_service.fetch_news(
+            company_name,
+            max_results=3,
+            min_relevance_score=max(0.0, min(floors, default=DEFAULT_MIN_RELEVANCE))
+        )
 
-            logger.info("News check cycle completed")
+        # Подписчики, заблокировавшие бота, уже исключены из рассылки. Их
+        # фильтры не проверяются, поэтому считаем пропущенные подписки, а не
+        # несостоявшиеся отправки (те считает sends_avoided при доставке)
+        self.cycle_stats['inactive_skipped'] += self._inactive_counts.get(company_name, 0)
 
-        except Exception as e:
-            logger.error(f"Error in check_and_send_news: {e}", exc_info=True)
+        deliveries = []
+        new_articles = 0
+        trained = any(model.updates for model in models.values())
+        for article in articles:
+            news_url = article.get('url', '')
+            is_new = False
+            # Полный текст нужен только фильтрам, в очередь доставки он не идет
+            queued_article = {key: value for key, value in article.items() if key != 'full_text'}
+            text = article_text(article)
+            # Признаки для персональных моделей - один раз на статью
+            features = article_features(article, company_name) if trained else None
+            score = article.get('_relevance_score', 0.0)
 
-    async def send_news_to_user(self, user_id: int, company_name: str, article: dict):
-        """Отправить новость пользователю"""
-        try:
-            message_text = self.news_service.format_news_message(company_name, article)
-            await self.bot.send_message(
-                user_id,
-                message_text,
-                parse_mode="HTML",
-                disable_web_page_preview=False
+            for user_id, filters, matcher in user_filters:
+                # Проверяем фильтры
+                model = models.get(user_id)
+                if model and model.updates:
+                    if model.score_features(features, score) < model.threshold(filters['min_relevance']):
+                        continue
+                elif score < filters['min_relevance']:
+                    continue
+
+                if matcher and not matcher.matches(text):
+                    continue
+
+                if not self.news_service.filter.matches_sentiment(article, filters['sentiment']):
+                    continue
+
+                # Проверяем, не отправляли ли ранее
+                if not await self.database.is_news_sent(user_id, news_url):
+                    is_new = True
+                    deliveries.append((user_id, news_url, queued_article))
+
+            if is_new:
+                new_articles += 1
+
+        now = time.time()
+        schedule = self.polling_policy.update(
+            schedule,
+            new_articles,
+            len(user_ids),
+            now,
+            boost=self.news_service.trending.boost(company_name, now)
+            if self.news_service.trending else 1.0
+        )
+        await self.database.complete_company_check(schedule, deliveries)
+
+        logger.info(
+            f"{company_name}: {new_articles} new articles, "
+            f"next check in {schedule.interval:.0f}s"
+        )
+        return schedule
+
+    def _expedite_trending(self, company_names, now: float):
+        """Проверить раньше срока компании, о которых внезапно много пишут"""
+        trending = self.news_service.trending
+        if not trending:
+            return
+        for company_name in company_names:
+            boost = trending.boost(company_name, now)
+            schedule = self.dispatcher.get(company_name)
+            if boost == 1.0 or schedule is None or schedule.last_checked_at is None:
+                continue
+            due_at = schedule.last_checked_at + max(
+                schedule.interval / boost, self.polling_policy.min_interval
+            )
+            if self.dispatcher.expedite(company_name, max(due_at, now)):
+                self.cycle_stats['expedited'] += 1
+                logger.info(f"{company_name} is trending (x{boost:.1f}), checking earlier")
+
+    async def deliver_pending(self):
+        """Разослать статьи из очереди доставки"""
+        while True:
+            pending = await self.database.claim_pending_deliveries(
+                self.worker_id,
+                self.config.scheduler.lease_ttl
             )
-        except Exception as e:
-            logger.error(f"Error sending message to {user_id}: {e}")
+            if not pending:
+                return
+
+            dead_chats = set()
+            retry_later = False
+            for delivery_id, user_id, company_name, news_url, article in pending:
+                if user_id in dead_chats:
+                    self.cycle_stats['sends_avoided'] += 1
+                    continue
+
+                # sent_news делает доставку идемпотентной при повторном запуске
+                if not await self.database.is_news_sent(user_id, news_url):
+                    status = await self.send_news_to_user(user_id, company_name, article)
+                    self.cycle_stats[status.value] += 1
+                    MESSAGES.labels('scheduler', status.value).inc()
+
+                    if status.is_dead_chat:
+                        # Чат больше недоступен: убираем его из рассылки до следующего /start
+                        await self.database.deactivate_user(user_id, status.value)
+                        dead_chats.add(user_id)
+                        logger.info(f"Chat {user_id} deactivated: {status.value}")
+                        continue
+
+                    if status == DeliveryStatus.TRANSIENT:
+                        # Строка останется в очереди и будет повторена после истечения аренды
+                        retry_later = True
+                        continue
+
+                    await asyncio.sleep(self.SEND_DELAY)
+                await self.database.complete_delivery(delivery_id, user_id, news_url)
+
+            if retry_later:
+                return
+
+    async def _sync_ownership(self, companies_users: Dict[str, List[int]]):
+        """
+        Распределить компании между воркерами и загрузить расписание своих
+
+        Каждый воркер держит примерно равную долю компаний. Аренды
+        продлеваются heartbeat'ом; компании упавшего воркера освобождаются
+        по истечении LEASE_TTL и разбираются остальными.
+        """
+        ttl = self.config.scheduler.lease_ttl
+        alive = await self.database.heartbeat_worker(self.worker_id, ttl)
+        leases = await self.database.get_company_leases()
+        share = math.ceil(len(companies_users) / max(alive, 1))
+
+        owned = {name for name, worker in leases.items() if worker == self.worker_id}
+
+        # Отдаем компании без подписчиков и излишек сверх своей доли
+        released = [name for name in owned if name not in companies_users]
+        owned.difference_update(released)
+        if len(owned) > share:
+            extra = sorted(owned)[share:]
+            released.extend(extra)
+            owned.difference_update(extra)
+        if released:
+            await self.database.release_company_leases(self.worker_id, released)
+
+        # Добираем свободные компании до своей доли
+        if len(owned) < share:
+            free = [name for name in companies_users if name not in leases]
+            random.shuffle(free)
+            acquired = await self.database.acquire_company_leases(
+                self.worker_id,
+                free[:share - len(owned)],
+                ttl
+            )
+            owned.update(acquired)
+
+        schedules = {s.company_name: s for s in await self.database.get_company_schedules()}
+        await self.database.delete_company_schedules(
+            [name for name in schedules if name not in companies_users]
+        )
+
+        now = time.time()
+        for company_name in owned:
+            if company_name not in schedules:
+                # Новая компания проверяется сразу, бюджет тика размажет всплеск
+                schedule = self.polling_policy.new_schedule(company_name, now)
+                await self.database.save_company_schedule(schedule)
+                schedules[company_name] = schedule
+
+        self.dispatcher.load(schedules[name] for name in owned)
+
+    async def get_status(self) -> dict:
+        """Текущее состояние рассылки для /status и /metrics"""
+        pending = await self.database.count_pending_deliveries()
+        quota_left = self.news_service.quota_left()
+        PENDING_DELIVERIES.set(pending)
+        GNEWS_QUOTA_LEFT.set(quota_left)
+
+        return {
+            'worker_id': self.worker_id,
+            'last_cycle_at': (
+                datetime.fromtimestamp(self.last_cycle_at).isoformat()
+                if self.last_cycle_at else None
+            ),
+            'last_cycle_duration': (
+                round(self.last_cycle_duration, 3)
+                if self.last_cycle_duration is not None else None
+            ),
+            'last_cycle_stats': self.last_cycle_stats,
+            'companies_scheduled': len(self.dispatcher),
+            'pending_deliveries': pending,
+            'gnews_quota_left': quota_left,
+            'providers': self.news_service.providers_status(),
+            'trending': self.news_service.trending.status() if self.news_service.trending else None,
+            'exclusions': (
+                self.news_service.exclusions.status() if self.news_service.exclusions else None
+            ),
+        }
+
+    async def heartbeat(self):
+        """Продлить аренды воркера между тиками"""
+        await self.database.heartbeat_worker(self.worker_id, self.config.scheduler.lease_ttl)
+
+    async def release_ownership(self):
+        """Освободить аренды при остановке, чтобы компании сразу разобрали другие воркеры"""
+        await self.database.release_company_leases(self.worker_id)
+
+    async def send_news_to_user(
+        self,
+        user_id: int,
+        company_name: str,
+        article: dict
+    ) -> DeliveryStatus:
+        """Отправить новость пользователю"""
+        message_text = self.renderer.render(company_name, article)
+        keys = feedback_keys(company_name, article) if self.feedback else None
+        for attempt in range(2):
+            try:
+                await self.bot.send_message(
+                    user_id,
+                    message_text,
+                    parse_mode="HTML",
+                    disable_web_page_preview=False,
+                    reply_markup=get_feedback_keyboard(*keys) if keys else None
+                )
+                return DeliveryStatus.SENT
+            except TelegramRetryAfter as e:
+                # Flood control: ждем, сколько просит Telegram, и пробуем еще раз
+                logger.warning(f"Flood control for {user_id}, retry in {e.retry_after}s")
+                if attempt == 0:
+                    await asyncio.sleep(e.retry_after)
+                    continue
+                return DeliveryStatus.TRANSIENT
+            except Exception as e:
+                status = classify_send_error(e)
+                logger.error(f"Error sending message to {user_id} ({status.value}): {e}")
+                return status
 
     def start(self):
         """Запустить планировщик"""
-        # Основная задача проверки новостей
+        # APScheduler импортируется лениво: он не нужен до приема апдейтов
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        from apscheduler.triggers.interval import IntervalTrigger
+
+        self.scheduler = AsyncIOScheduler()
+
+        # Основная задача проверки новостей: диспетчер на каждом тике
+        # проверяет компании, подошедшие по адаптивному расписанию
+        check_job = self.check_and_send_news
+        if self.profiler:
+            check_job = self.profiler.wrap('cycle', check_job)
         self.scheduler.add_job(
-            self.check_and_send_news,
-            trigger=IntervalTrigger(seconds=self.config.scheduler.check_interval),
+            check_job,
+            trigger=IntervalTrigger(seconds=self.config.scheduler.dispatch_tick),
             id='news_checker',
-            name='Check news for all subscriptions',
+            name='Check news for due companies',
+            next_run_time=datetime.now(),  # сразу после старта: продолжаем прерванный цикл
+            replace_existing=True
+        )
+
+        # Heartbeat воркера: аренды не истекают во время долгой рассылки
+        self.scheduler.add_job(
+            self.heartbeat,
+            trigger=IntervalTrigger(seconds=max(self.config.scheduler.lease_ttl // 3, 1)),
+            id='worker_heartbeat',
+            name='Extend company leases',
             replace_existing=True
         )
 
+        # Счетчики слов для рекомендуемых исключений копятся в памяти и
+        # периодически прибавляются к статистике в БД
+        if self.news_service.exclusions:
+            self.scheduler.add_job(
+                self.news_service.exclusions.snapshot,
+                trigger=IntervalTrigger(seconds=self.config.exclusions.snapshot_interval),
+                id='exclusions_snapshot',
+                name='Save exclusion term stats',
+                replace_existing=True
+            )
+
         # Очистка старых записей раз в день
         self.scheduler.add_job(
             self.database.cleanup_old_news,
@@ -125,6 +496,14 @@ class SchedulerService:
             kwargs={'days': 7},
             replace_existing=True
         )
+        self.scheduler.add_job(
+            self.database.cleanup_old_articles,
+            trigger=IntervalTrigger(hours=24),
+            id='cleanup_old_articles',
+            name='Cleanup article archive',
+            kwargs={'days': self.config.archive.retention_days},
+            replace_existing=True
+        )
 
         # Keep-alive для Render (пинг каждые 10 минут)
         if self.keepalive_service and self.config.render.is_render:
@@ -142,5 +521,7 @@ class SchedulerService:
 
     def shutdown(self):
         """Остановить планировщик"""
+        if self.scheduler is None or not self.scheduler.running:
+            return
         self.scheduler.shutdown()
         logger.info("Scheduler stopped")
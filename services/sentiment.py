@@ -0,0 +1,216 @@
+"""Оценка тональности новостей: бычьи и медвежьи"""
+import json
+import logging
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import SentimentConfig
+from utils.metrics import SENTIMENT_CACHE
+from utils.urls import url_hash
+
+logger = logging.getLogger(__name__)
+
+BULLISH = 'bullish'
+BEARISH = 'bearish'
+NEUTRAL = 'neutral'
+
+# Основы слов финансового словаря: слово совпадает, если начинается с основы
+# (так покрываются падежи и времена). Вес - вклад в оценку от -1 до 1
+_STEMS: Dict[str, float] = {
+    # Русский: рост
+    'рост': 0.8, 'выро': 0.8, 'раст': 0.6, 'подскоч': 1.0, 'взлет': 1.0, 'взлёт': 1.0,
+    'рекорд': 0.8, 'прибыл': 0.5, 'превыс': 0.7, 'повыс': 0.7, 'повыш': 0.7, 'увелич': 0.6,
+    'дивиденд': 0.6, 'байбэк': 0.7, 'обратный выкуп': 0.7,
+    'одобр': 0.5, 'укреп': 0.6, 'подорож': 0.5, 'лидир': 0.5, 'успе': 0.6,
+    'позитив': 0.7, 'оптимиз': 0.3, 'восстанов': 0.5, 'расшир': 0.4, 'партнерств': 0.3,
+    'контракт': 0.3, 'инвестир': 0.3, 'покупать': 0.6, 'перевыполн': 0.8,
+    # Русский: падение
+    'паден': -0.8, 'упал': -0.8, 'упад': -0.8, 'сниж': -0.6, 'сниз': -0.6, 'убыт': -0.8,
+    'штраф': -0.7, 'оштраф': -0.7, 'санкц': -0.7, 'банкрот': -1.0, 'дефолт': -1.0,
+    'сокращ': -0.5, 'обвал': -1.0, 'рухн': -1.0, 'расследов': -0.6, 'кризис': -0.7,
+    'потер': -0.6, 'подешев': -0.6, 'увольн': -0.6, 'задолжен': -0.5, 'негатив': -0.7,
+    'ослаб': -0.5, 'обыск': -0.8, 'арест': -0.8, 'мошенн': -0.9, 'уголовн': -0.8,
+    'претенз': -0.4, 'отзыв лиценз': -1.0, 'понизи': -0.7, 'пониж': -0.7,
+    'просел': -0.7, 'просяд': -0.7, 'сбой': -0.5, 'утечк': -0.6, 'продавать': -0.6,
+    # English
+    'surg': 0.9, 'soar': 1.0, 'jump': 0.8, 'rall': 0.8, 'gain': 0.6, 'record': 0.6,
+    'upgrad': 0.8, 'profit': 0.5, 'growth': 0.6, 'grow': 0.5, 'boost': 0.6,
+    'outperform': 0.8, 'dividend': 0.5, 'buyback': 0.7, 'bullish': 1.0,
+    'exceed': 0.7, 'strong': 0.5, 'approv': 0.5, 'recover': 0.5, 'expand': 0.4,
+    'plung': -1.0, 'slump': -0.9, 'tumbl': -0.9, 'declin': -0.6, 'downgrad': -0.8,
+    'lawsuit': -0.7, 'sanction': -0.7, 'bankrupt': -1.0, 'default': -0.8,
+    'layoff': -0.7, 'crash': -1.0, 'bearish': -1.0, 'weak': -0.5, 'warn': -0.5,
+    'loss': -0.7, 'fraud': -0.9, 'investigat': -0.6, 'recall': -0.6, 'underperform': -0.8,
+    'disappoint': -0.7, 'breach': -0.6, 'shortfall': -0.7,
+    # Слова, начинающиеся с основ выше, но без тональности (в том числе
+    # названия компаний: иначе все новости о них были бы бычьими)
+    'ростелеком': 0.0, 'ростех': 0.0, 'ростов': 0.0, 'растен': 0.0, 'растрат': -0.8,
+    'warner': 0.0, 'recordati': 0.0,
+}
+
+# Короткие слова только целиком: основы из них совпали бы с посторонними словами
+_WORDS: Dict[str, float] = {
+    'rise': 0.6, 'rises': 0.6, 'rose': 0.6, 'beat': 0.7, 'beats': 0.7, 'up': 0.2,
+    'fall': -0.7, 'falls': -0.7, 'fell': -0.7, 'drop': -0.7, 'drops': -0.7,
+    'dropped': -0.7, 'miss': -0.7, 'misses': -0.7, 'missed': -0.7, 'cut': -0.5,
+    'cuts': -0.5, 'fine': -0.6, 'fined': -0.7, 'probe': -0.6, 'down': -0.2,
+    'иск': -0.6, 'иски': -0.6, 'иском': -0.6, 'рухнул': -1.0, 'минус': -0.4, 'плюс': 0.3,
+}
+
+# Отрицание меняет знак ближайшего слова со значимым весом
+_NEGATIONS = {'не', 'нет', 'без', 'ни', 'not', 'no', 'never', 'without'}
+
+_TOKEN_RE = re.compile(r'[a-zа-яё]+')
+
+# Вес заголовка относительно описания
+_TITLE_WEIGHT = 2.0
+
+
+class SentimentScorer:
+    """
+    Оценка тональности статьи от -1 (медвежья) до 1 (бычья)
+
+    Оценка - линейная модель по словам заголовка и описания: веса из
+    финансового словаря (русский и английский), поверх которых можно
+    загрузить свои веса из JSON ({"bias": 0, "stems": {...}, "words":
+    {...}}). Результат делится на число значимых слов, так что одно
+    сильное слово в заголовке весит больше, чем смесь разнонаправленных.
+
+    Оценки статей запоминаются по каноническому URL: одна и та же статья
+    приходит во многих циклах и по нескольким компаниям. Вес каждого
+    встреченного слова тоже запоминается - словарь новостей ограничен, и
+    поиск основы для слова выполняется один раз.
+    """
+
+    MIN_STEM = 3
+    MAX_STEM = 14
+    MAX_TOKENS = 200000
+
+    def __init__(self, config: SentimentConfig):
+        self.config = config
+        self.bias = 0.0
+        self._stems = dict(_STEMS)
+        self._words = dict(_WORDS)
+        if config.model_path:
+            self._load_model(config.model_path)
+        # Основы из нескольких слов проверяются по тексту целиком
+        self._phrases = {stem: weight for stem, weight in self._stems.items() if ' ' in stem}
+        self._token_weights: Dict[str, float] = {}
+        self._cache: OrderedDict[str, float] = OrderedDict()
+
+    def _load_model(self, path: str):
+        try:
+            with open(path, encoding='utf-8') as model_file:
+                model = json.load(model_file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading sentiment model {path}: {e}")
+            return
+        self.bias = float(model.get('bias', 0.0))
+        self._stems.update(model.get('stems', {}))
+        self._words.update(model.get('words', {}))
+        logger.info(
+            f"Loaded sentiment model {path}: {len(model.get('stems', {}))} stems, "
+            f"{len(model.get('words', {}))} words"
+        )
+
+    def _token_weight(self, token: str) -> float:
+        weight = self._token_weights.get(token)
+        if weight is not None:
+            return weight
+
+        weight = self._words.get(token)
+        if weight is None:
+            # Самая длинная основа, с которой начинается слово
+            for length in range(min(len(token), self.MAX_STEM), self.MIN_STEM - 1, -1):
+                weight = self._stems.get(token[:length])
+                if weight is not None:
+                    break
+            weight = weight or 0.0
+
+        if len(self._token_weights) >= self.MAX_TOKENS:
+            self._token_weights.clear()
+        self._token_weights[token] = weight
+        return weight
+
+    def _score_text(self, text: str) -> Tuple[float, int]:
+        """Сумма весов слов текста и число значимых слов"""
+        total = 0.0
+        hits = 0
+        # Отрицание действует на два следующих слова: "не смогла увеличить"
+        negated = 0
+        for token in _TOKEN_RE.findall(text):
+            if token in _NEGATIONS:
+                negated = 2
+                continue
+            weight = self._token_weight(token)
+            if weight:
+                total += -weight if negated else weight
+                hits += 1
+                negated = 0
+            elif negated:
+                negated -= 1
+        for phrase, weight in self._phrases.items():
+            if phrase in text:
+                total += weight
+                hits += 1
+        return total, hits
+
+    def score_article(self, article: Dict) -> float:
+        """Оценка статьи без кэша"""
+        title_total, title_hits = self._score_text((article.get('title') or '').lower())
+        text_total, text_hits = self._score_text((article.get('description') or '').lower())
+        total = self.bias + title_total * _TITLE_WEIGHT + text_total
+        hits = title_hits * _TITLE_WEIGHT + text_hits
+        return max(-1.0, min(1.0, total / (hits + 1)))
+
+    def score_batch(self, articles: List[Dict]) -> List[float]:
+        """Оценки статей ответа; уже оцененные берутся из кэша"""
+        scores = []
+        misses = 0
+        for article in articles:
+            url = article.get('url')
+            key = url_hash(url) if url else article.get('title') or ''
+            score = self._cache.get(key)
+            if score is None:
+                misses += 1
+                score = self.score_article(article)
+                self._cache[key] = score
+                if len(self._cache) > self.config.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            scores.append(score)
+
+        if misses:
+            SENTIMENT_CACHE.labels('miss').inc(misses)
+        if len(articles) > misses:
+            SENTIMENT_CACHE.labels('hit').inc(len(articles) - misses)
+        return scores
+
+    def label(self, score: float) -> str:
+        if score >= self.config.threshold:
+            return BULLISH
+        if score <= -self.config.threshold:
+            return BEARISH
+        return NEUTRAL
+
+    def annotate(self, articles: List[Dict]):
+        """Добавить статьям оценку (_sentiment_score) и метку (_sentiment)"""
+        for article, score in zip(articles, self.score_batch(articles)):
+            article['_sentiment_score'] = round(score, 3)
+            article['_sentiment'] = self.label(score)
+
+
+def sentiment_from_text(text: str) -> Optional[str]:
+    """Фильтр тональности из ввода пользователя (None - не распознан)"""
+    aliases = {
+        BULLISH: ('бычьи', 'бычий', 'позитив', 'рост', 'bull', 'bullish', 'up', '🐂'),
+        BEARISH: ('медвежьи', 'медвежий', 'негатив', 'падение', 'bear', 'bearish', 'down', '🐻'),
+        'any': ('все', 'любые', 'any', 'all'),
+    }
+    text = text.strip().lower()
+    for sentiment, words in aliases.items():
+        if text in words:
+            return sentiment
+    return None
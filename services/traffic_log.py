@@ -0,0 +1,115 @@
+"""Запись и воспроизведение ответов GNews"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+import zlib
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """
+    Прочитать записи лога по порядку
+
+    Недописанный хвост (процесс убит во время записи) пропускается.
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as log:
+            for line in log:
+                yield json.loads(line)
+    except (EOFError, zlib.error, json.JSONDecodeError) as e:
+        logger.warning(f"Traffic log {path} is truncated: {e}")
+
+
+class TrafficRecorder:
+    """
+    Запись ответов GNews в сжатый JSON Lines
+
+    Каждая запись - отдельный gzip-member, дописываемый в конец файла:
+    файл остается читаемым, даже если процесс завершится посреди работы.
+    Ключ API в лог не попадает.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def record(
+            self,
+            params: Dict,
+            status: Optional[int],
+            latency: float,
+            data: Optional[Dict] = None
+    ):
+        """
+        Дописать ответ
+
+        Args:
+            params: Параметры запроса (без token)
+            status: HTTP-статус, None - сетевая ошибка
+            latency: Время ответа, сек
+            data: Тело ответа при статусе 200
+        """
+        line = json.dumps({
+            'ts': time.time(),
+            'params': params,
+            'status': status,
+            'latency': round(latency, 4),
+            'data': data,
+        }, ensure_ascii=False)
+        with gzip.open(self.path, 'at', encoding='utf-8') as log:
+            log.write(line + '\n')
+
+
+class TrafficReplayer:
+    """
+    Воспроизведение записанных ответов вместо запросов к GNews
+
+    Ответы по каждому запросу (q) отдаются по порядку записи. Ответ не
+    выдается раньше, чем наступил его момент в записи с учетом ускорения
+    speed (speed=0 - без ожидания), и с записанной задержкой сети. Когда
+    записи по запросу кончились, отдается пустой список - новых статей нет.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.speed = speed
+        self._queues: Dict[str, Deque[Dict]] = defaultdict(deque)
+        self._log_started: Optional[float] = None
+        self._replay_started: Optional[float] = None
+
+        count = 0
+        for record in read_records(path):
+            if self._log_started is None:
+                self._log_started = record['ts']
+            self._queues[record['params']['q']].append(record)
+            count += 1
+        logger.info(f"Loaded {count} recorded GNews responses from {path}")
+
+    def remaining(self) -> int:
+        """Сколько записанных ответов еще не отдано"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def response(self, query: str, fetch_count: int) -> Optional[List[Dict]]:
+        """Следующий записанный ответ по запросу (None - записанная ошибка)"""
+        queue = self._queues.get(query)
+        if not queue:
+            return []
+        record = queue.popleft()
+
+        if self.speed > 0:
+            now = time.monotonic()
+            if self._replay_started is None:
+                self._replay_started = now
+            due = self._replay_started + (record['ts'] - self._log_started) / self.speed
+            await asyncio.sleep(max(0.0, due - now) + record['latency'] / self.speed)
+
+        if record['status'] != 200:
+            return None
+        return (record['data'] or {}).get('articles', [])[:fetch_count]
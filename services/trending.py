@@ -0,0 +1,324 @@
+"""Поиск компаний и тем с всплеском упоминаний в новостях"""
+import math
+import re
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import TrendingConfig
+from utils.urls import url_hash
+
+# Последовательность слов с заглавной буквы: "Tesla", "Норильский Никель"
+_ENTITY_RE = re.compile(r"[A-ZА-ЯЁ][\w&'-]*(?:[ \t]+[A-ZА-ЯЁ][\w&'-]*)*")
+_SENTENCE_RE = re.compile(r'(?<=[.!?…])\s+')
+_CYRILLIC_RE = re.compile(r'[а-яё]')
+
+# Слова, которые пишутся с заглавной в начале предложения, но не являются
+# названиями
+_STOPWORDS = {
+    'в', 'во', 'на', 'по', 'с', 'со', 'о', 'об', 'для', 'из', 'к', 'у', 'за', 'от',
+    'и', 'а', 'но', 'как', 'что', 'это', 'этот', 'эта', 'после', 'при', 'до', 'без',
+    'над', 'под', 'через', 'почему', 'где', 'когда', 'кто', 'зачем', 'еще', 'ещё',
+    'акции', 'компания', 'компании', 'новый', 'новая', 'новые', 'глава', 'эксперты',
+    'аналитики', 'власти', 'инвесторы', 'рынок', 'индекс', 'индексы', 'главное',
+    'итоги', 'обзор', 'мнение', 'интервью', 'видео', 'фото', 'online', 'онлайн',
+    'сегодня', 'вчера', 'завтра', 'новости', 'today', 'yesterday', 'news',
+    'the', 'a', 'an', 'in', 'on', 'at', 'for', 'with', 'and', 'but', 'how', 'why',
+    'what', 'who', 'new', 'this', 'that', 'after', 'as', 'by', 'from', 'to', 'is',
+    'are', 'will', 'report', 'reports', 'update', 'breaking', 'exclusive', 'watch',
+    'live', 'stocks', 'shares', 'analysis', 'opinion',
+    'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday',
+    'january', 'february', 'march', 'april', 'may', 'june', 'july', 'august',
+    'september', 'october', 'november', 'december',
+}
+
+# Падежные окончания: "Сбербанка", "Сбербанком" и "Сбербанк" - одна сущность
+_ENDINGS = (
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ой', 'ей', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'а', 'я', 'у', 'ю', 'е', 'ы', 'и',
+)
+
+_MAX_RUN = 3  # длиннее - скорее заголовок в Title Case, чем название
+
+
+def normalize_entity(name: str) -> str:
+    """Ключ сущности: нижний регистр без падежных окончаний"""
+    words = []
+    for word in name.lower().split():
+        if word.endswith("'s"):
+            word = word[:-2]
+        if len(word) > 5 and _CYRILLIC_RE.search(word):
+            for ending in _ENDINGS:
+                if word.endswith(ending):
+                    word = word[:-len(ending)]
+                    break
+        words.append(word)
+    return ' '.join(words)
+
+
+def extract_entities(text: str) -> Dict[str, str]:
+    """
+    Названия из текста: {ключ: написание}
+
+    Названием считается слово или несколько слов подряд с заглавной
+    буквы. Отдельные слова из многословного названия тоже учитываются:
+    "Норильский Никель" дает и "норильский никель", и "никель".
+    """
+    entities = {}
+    for sentence in _SENTENCE_RE.split(text):
+        for match in _ENTITY_RE.finditer(sentence):
+            words = match.group().split()
+            # Служебные слова в начале ("В Сбербанке") не часть названия
+            while words and words[0].lower() in _STOPWORDS:
+                words.pop(0)
+            if not words or len(words) > _MAX_RUN:
+                continue
+            for word in words:
+                if (len(word) >= 3 or word.isupper()) and word.lower() not in _STOPWORDS:
+                    entities.setdefault(normalize_entity(word), word)
+            if len(words) > 1:
+                run = ' '.join(words)
+                entities.setdefault(normalize_entity(run), run)
+    return entities
+
+
+class DecayedCountMinSketch:
+    """
+    Count-min sketch с экспоненциальным затуханием счетчиков
+
+    Память фиксирована (depth x width) и не зависит от числа разных
+    сущностей; оценка может быть только завышена коллизиями. Затухание
+    "вперед": новые события добавляются с растущим весом
+    exp(t / tau) относительно точки отсчета, поэтому старые счетчики не
+    нужно пересчитывать на каждом шаге. Когда вес становится слишком
+    большим, все счетчики один раз масштабируются и точка отсчета
+    переносится.
+    """
+
+    RESCALE_EXPONENT = 30.0
+
+    def __init__(self, width: int, depth: int, half_life: float):
+        self.width = width
+        self.depth = depth
+        self.half_life = half_life
+        self._decay = math.log(2) / half_life
+        self._rows = [array('d', bytes(8 * width)) for _ in range(depth)]
+        self._landmark: Optional[float] = None
+
+    def _indexes(self, key: str) -> List[int]:
+        # Двойное хэширование: depth индексов из одного хэша
+        value = hash(key)
+        h1 = value & 0xFFFFFFFF
+        h2 = ((value >> 32) & 0xFFFFFFFF) | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def advance(self, now: float) -> Tuple[float, float]:
+        """
+        Текущий вес нового события
+
+        Returns:
+            (вес, множитель масштабирования): множитель меньше 1, если
+            точка отсчета перенесена и счетчики уменьшены
+        """
+        if self._landmark is None:
+            self._landmark = now
+        exponent = self._decay * (now - self._landmark)
+        if exponent <= self.RESCALE_EXPONENT:
+            return math.exp(exponent), 1.0
+
+        factor = math.exp(-exponent)
+        for row in self._rows:
+            for idx in range(self.width):
+                row[idx] *= factor
+        self._landmark = now
+        return 1.0, factor
+
+    def add(self, key: str, weight: float) -> float:
+        """
+        Добавить событие с весом из advance()
+
+        Консервативное обновление: увеличиваются только минимальные
+        счетчики, что уменьшает завышение от коллизий.
+
+        Returns:
+            Оценка ключа после добавления (в весах текущей точки отсчета)
+        """
+        indexes = self._indexes(key)
+        estimate = min(row[idx] for row, idx in zip(self._rows, indexes)) + weight
+        for row, idx in zip(self._rows, indexes):
+            if row[idx] < estimate:
+                row[idx] = estimate
+        return estimate
+
+    def estimate(self, key: str, now: float) -> float:
+        """Затухшее число упоминаний ключа к моменту now"""
+        if self._landmark is None:
+            return 0.0
+        raw = min(row[idx] for row, idx in zip(self._rows, self._indexes(key)))
+        return raw * math.exp(-self._decay * (now - self._landmark))
+
+
+class TrendingDetector:
+    """
+    Сущности, упоминания которых резко участились
+
+    Статьи из всех ответов источников проходят через два затухающих
+    count-min sketch: свежее окно (short_half_life) и базовое
+    (long_half_life). Всплеск - отношение частоты в свежем окне к базовой
+    частоте. Для /trending отслеживаются top_k самых упоминаемых в свежем
+    окне сущностей (heavy hitters); частоту любой компании планировщик
+    получает напрямую из sketch. Статья учитывается один раз, сколько бы
+    раз ее ни вернул источник: последние URL хранятся в ограниченном LRU.
+    Первый ответ по компании (новая подписка, перезапуск) содержит статьи
+    за много дней и идет только в базовое окно: иначе он выглядел бы
+    всплеском.
+    """
+
+    MAX_SEEN = 50000
+    MAX_COMPANIES = 50000
+
+    def __init__(self, config: TrendingConfig):
+        self.config = config
+        self.short = DecayedCountMinSketch(config.width, config.depth, config.short_half_life)
+        self.long = DecayedCountMinSketch(config.width, config.depth, config.long_half_life)
+        # Heavy hitters: ключ -> оценка в свежем окне (в весах его точки отсчета)
+        self._top: Dict[str, float] = {}
+        self._names: Dict[str, str] = {}
+        self._floor_key: Optional[str] = None
+        self._seen: OrderedDict[str, None] = OrderedDict()
+        # Компании, первый ответ по которым уже учтен
+        self._companies: OrderedDict[str, None] = OrderedDict()
+        self.started_at: Optional[float] = None
+        self.articles = 0
+
+    def observe(self, articles: Iterable[Dict], now: Optional[float] = None, company_name: Optional[str] = None):
+        """Учесть упоминания в новых статьях ответа (по компании company_name, если известна)"""
+        now = time.time() if now is None else now
+        if self.started_at is None:
+            self.started_at = now
+
+        baseline_only = False
+        if company_name is not None:
+            key = normalize_entity(company_name)
+            if key in self._companies:
+                self._companies.move_to_end(key)
+            else:
+                baseline_only = True
+                self._companies[key] = None
+                if len(self._companies) > self.MAX_COMPANIES:
+                    self._companies.popitem(last=False)
+
+        short_weight, factor = self.short.advance(now)
+        if factor != 1.0:
+            # Оценки heavy hitters хранятся в весах sketch - масштабируем так же
+            self._top = {entity: value * factor for entity, value in self._top.items()}
+        long_weight, _ = self.long.advance(now)
+
+        for article in articles:
+            key = url_hash(article['url']) if article.get('url') else article.get('title') or ''
+            if key in self._seen:
+                continue
+            self._seen[key] = None
+            if len(self._seen) > self.MAX_SEEN:
+                self._seen.popitem(last=False)
+            self.articles += 1
+
+            text = f"{article.get('title') or ''}. {article.get('description') or ''}"
+            for entity, name in extract_entities(text).items():
+                self.long.add(entity, long_weight)
+                if not baseline_only:
+                    self._offer(entity, name, self.short.add(entity, short_weight))
+
+    def _offer(self, entity: str, name: str, estimate: float):
+        """Обновить top_k (оценки только растут, минимум пересчитывается редко)"""
+        if entity in self._top:
+            self._top[entity] = estimate
+            # Для показа - самая короткая форма: "Аэрофлот", а не "Аэрофлота"
+            if len(name) < len(self._names[entity]):
+                self._names[entity] = name
+            if entity == self._floor_key:
+                self._floor_key = None
+            return
+
+        if len(self._top) < self.config.top_k:
+            self._top[entity] = estimate
+            self._names[entity] = name
+            self._floor_key = None
+            return
+
+        if self._floor_key is None:
+            self._floor_key = min(self._top, key=self._top.get)
+        if estimate > self._top[self._floor_key]:
+            del self._top[self._floor_key]
+            del self._names[self._floor_key]
+            self._top[entity] = estimate
+            self._names[entity] = name
+            self._floor_key = None
+
+    def surge(self, entity: str, now: Optional[float] = None) -> float:
+        """
+        Во сколько раз свежая частота упоминаний выше базовой
+
+        Сравниваются упоминания в свежем окне с ожидаемыми по базовой
+        частоте; к обоим добавляется min_mentions, чтобы случайные 5
+        упоминаний вместо обычных 1-2 не выглядели всплеском.
+        1.0 - нет всплеска, мало упоминаний или статистика еще собирается.
+        """
+        now = time.time() if now is None else now
+        if self.warming_up(now):
+            return 1.0
+        key = normalize_entity(entity)
+        recent = self.short.estimate(key, now)
+        if recent < self.config.min_mentions:
+            return 1.0
+        expected = self.long.estimate(key, now) * self.short.half_life / self.long.half_life
+        prior = self.config.min_mentions
+        return max(1.0, (recent + prior) / (expected + prior))
+
+    def boost(self, company_name: str, now: Optional[float] = None) -> float:
+        """Во сколько раз ускорить опрос компании (1.0 - не ускорять)"""
+        surge = self.surge(company_name, now)
+        if surge < self.config.surge_ratio:
+            return 1.0
+        return min(surge, self.config.max_boost)
+
+    def trending(self, limit: int = 10, now: Optional[float] = None) -> List[Tuple[str, float, float]]:
+        """
+        Сущности с всплеском упоминаний
+
+        Returns:
+            [(название, упоминаний в свежем окне, всплеск), ...] - по
+            числу упоминаний
+        """
+        now = time.time() if now is None else now
+        result = []
+        for entity in self._top:
+            surge = self.surge(entity, now)
+            if surge >= self.config.surge_ratio:
+                result.append((self._names[entity], self.short.estimate(entity, now), surge))
+        result.sort(key=lambda item: item[1], reverse=True)
+        return result[:limit]
+
+    def top_mentions(self, limit: int = 10, now: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Самые упоминаемые сущности в свежем окне без учета всплеска"""
+        now = time.time() if now is None else now
+        mentions = [(self._names[entity], self.short.estimate(entity, now)) for entity in self._top]
+        mentions.sort(key=lambda item: item[1], reverse=True)
+        return mentions[:limit]
+
+    def warming_up(self, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return self.started_at is None or now - self.started_at < self.config.warmup
+
+    def status(self) -> dict:
+        """Сводка для /status"""
+        return {
+            'articles': self.articles,
+            'tracked': len(self._top),
+            'warming_up': self.warming_up(),
+            'trending': [
+                {'name': name, 'mentions': round(mentions, 1), 'surge': round(surge, 1)}
+                for name, mentions, surge in self.trending(5)
+            ],
+        }
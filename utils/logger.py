@@ -1,19 +1,163 @@
 """Настройка логирования"""
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
 
+from config import LoggingConfig
 
-def setup_logger():
-    """Настроить логгер"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(sys.stdout),
-            logging.FileHandler('bot.log', encoding='utf-8')
-        ]
-    )
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Поля контекста (cycle, company), которые попадают в каждую запись
+_log_context: contextvars.ContextVar[Dict[str, object]] = contextvars.ContextVar(
+    'log_context', default={}
+)
+
+
+@contextmanager
+def log_context(**fields):
+    """
+    Добавить поля ко всем записям лога внутри блока::
+
+        with log_context(company=company_name):
+            logger.info("Fetching news")
+
+    Контекст наследуется задачами asyncio, созданными внутри блока.
+    """
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Переносит поля log_context в атрибуты записи"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.context = _log_context.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничение повторяющихся ошибок
+
+    Записи уровня ERROR и выше с одного места в коде пропускаются не чаще
+    burst раз за interval секунд. Следующая пропущенная запись сообщает,
+    сколько похожих было подавлено.
+    """
+
+    def __init__(self, interval: float = 60, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, файл, строка) -> [начало окна, записей в окне, подавлено]
+        self._windows: Dict[Tuple[str, str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR:
+            return True
+
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.msg} (suppressed {suppressed} similar messages)"
+            return True
+
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+
+        window[2] += 1
+        return False
+
+
+class TextFormatter(logging.Formatter):
+    """Обычный текстовый формат, поля контекста - в конце строки"""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        context = getattr(record, 'context', None)
+        if context:
+            text += ' [' + ' '.join(f"{key}={value}" for key, value in context.items()) + ']'
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Одна запись - одна JSON-строка с полями контекста
+
+    Трейсбек уже включен в message: QueueHandler форматирует его при
+    постановке в очередь.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            **getattr(record, 'context', {}),
+        }, ensure_ascii=False, default=str)
+
+
+def _stop_listener(listener: logging.handlers.QueueListener):
+    # Слушатель мог быть уже остановлен вручную
+    if listener._thread is not None:
+        listener.stop()
+
+
+def setup_logger(config: Optional[LoggingConfig] = None) -> logging.handlers.QueueListener:
+    """
+    Настроить логгер
+
+    Запись в консоль и файл выполняется фоновым потоком QueueListener:
+    в event loop остается только постановка записи в очередь. Файл
+    ротируется по размеру. Слушатель останавливается при выходе из
+    процесса, дописывая оставшиеся записи.
+    """
+    config = config or LoggingConfig()
+
+    formatter = JsonFormatter() if config.json else TextFormatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            config.file,
+            maxBytes=config.max_bytes,
+            backupCount=config.backup_count,
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter(config.error_interval, config.error_burst))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
 
     # Отключаем излишнюю детализацию для некоторых библиотек
     logging.getLogger('aiogram').setLevel(logging.WARNING)
     logging.getLogger('aiohttp').setLevel(logging.WARNING)
+
+    return listener
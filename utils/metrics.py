@@ -0,0 +1,306 @@
+"""
+Метрики бота в формате Prometheus
+
+Метрики меняются только из event loop, поэтому обходятся без блокировок:
+инкремент - это операция со словарем. Экспорт собирает текстовый формат
+Prometheus при запросе /metrics.
+"""
+import bisect
+import functools
+import inspect
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Границы гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Базовый класс метрики с метками"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """Дочерняя метрика для конкретных значений меток (кэшируется)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._new_child()
+            self._children[values] = child
+        return child
+
+    @abstractmethod
+    def _new_child(self):
+        """Значение для одного набора меток"""
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Строки значений в текстовом формате Prometheus"""
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        """Увеличить счетчик без меток"""
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+
+class Gauge(Counter):
+    """Текущее значение (может уменьшаться)"""
+
+    type_name = 'gauge'
+
+    def set(self, value: float):
+        """Установить значение без меток"""
+        self.labels().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self) -> '_Timer':
+        """Замерить длительность блока: ``with histogram.time(): ...``"""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ('target', 'started')
+
+    def __init__(self, target: _HistogramValue):
+        self.target = target
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.target.observe(time.perf_counter() - self.started)
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам"""
+
+    type_name = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            documentation: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        """Добавить наблюдение без меток"""
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def totals(self) -> Tuple[int, float]:
+        """(число наблюдений, их сумма) по всем значениям меток"""
+        count = sum(child.count for child in self._children.values())
+        return count, sum(child.sum for child in self._children.values())
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик процесса"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus"""
+        return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+registry = MetricsRegistry()
+
+GNEWS_REQUESTS = registry.register(Counter(
+    'stockpulse_gnews_requests_total', 'Запросы к GNews API', ['status']
+))
+GNEWS_LATENCY = registry.register(Histogram(
+    'stockpulse_gnews_request_seconds', 'Длительность запроса к GNews API'
+))
+CIRCUIT_STATE = registry.register(Gauge(
+    'stockpulse_circuit_state', 'Состояние circuit breaker (0 - замкнут, 1 - пробный запрос, 2 - разомкнут)',
+    ['breaker']
+))
+PROVIDER_REQUESTS = registry.register(Counter(
+    'stockpulse_provider_requests_total', 'Запросы к источникам новостей', ['provider', 'result']
+))
+ENRICHMENT = registry.register(Counter(
+    'stockpulse_enrichment_total', 'Загрузка полного текста статей', ['result']
+))
+NEWS_CACHE = registry.register(Counter(
+    'stockpulse_news_cache_total', 'Обращения к кэшу ответов GNews', ['result']
+))
+ARTICLES = registry.register(Counter(
+    'stockpulse_articles_total', 'Статьи после фильтрации', ['result']
+))
+DB_QUERY_SECONDS = registry.register(Histogram(
+    'stockpulse_db_query_seconds', 'Длительность методов Database', ['method']
+))
+MESSAGES = registry.register(Counter(
+    'stockpulse_messages_total', 'Отправка сообщений с новостями', ['source', 'status']
+))
+RENDER_CACHE = registry.register(Counter(
+    'stockpulse_render_cache_total', 'Обращения к кэшу отрендеренных сообщений', ['result']
+))
+FILTER_PREVIEW_SECONDS = registry.register(Histogram(
+    'stockpulse_filter_preview_seconds', 'Проверка фильтров на полученных статьях (/filter)',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+))
+FEEDBACK = registry.register(Counter(
+    'stockpulse_feedback_total', 'Оценки новостей пользователями', ['result']
+))
+SENTIMENT_CACHE = registry.register(Counter(
+    'stockpulse_sentiment_cache_total', 'Обращения к кэшу оценок тональности', ['result']
+))
+THROTTLED = registry.register(Counter(
+    'stockpulse_throttled_total', 'Отброшенные из-за лимита события', ['key']
+))
+CYCLE_SECONDS = registry.register(Histogram(
+    'stockpulse_cycle_seconds', 'Длительность цикла проверки новостей',
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+))
+LAST_CYCLE = registry.register(Gauge(
+    'stockpulse_last_cycle_timestamp_seconds', 'Время завершения последнего цикла'
+))
+PENDING_DELIVERIES = registry.register(Gauge(
+    'stockpulse_pending_deliveries', 'Статьи в очереди доставки'
+))
+GNEWS_QUOTA_LEFT = registry.register(Gauge(
+    'stockpulse_gnews_quota_left', 'Остаток дневной квоты GNews (по счетчику процесса)'
+))
+STARTUP_SECONDS = registry.register(Gauge(
+    'stockpulse_startup_seconds', 'Этапы холодного старта, секунд с запуска процесса', ['phase']
+))
+LOOP_LAG = registry.register(Histogram(
+    'stockpulse_event_loop_lag_seconds', 'Задержка event loop (в режиме профилирования)'
+))
+
+
+def timed_methods(histogram: Histogram) -> Callable[[type], type]:
+    """
+    Декоратор класса: замерять длительность всех публичных async-методов
+
+    Метка гистограммы - имя метода.
+    """
+    def decorate(cls: type) -> type:
+        for name, attr in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.iscoroutinefunction(attr):
+                continue
+            setattr(cls, name, _timed(attr, histogram.labels(name)))
+        return cls
+    return decorate
+
+
+def _timed(method, child: _HistogramValue):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            child.observe(time.perf_counter() - started)
+    return wrapper
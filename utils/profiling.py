@@ -0,0 +1,174 @@
+"""
+Профилирование по запросу (PROFILING=true)
+
+Когда режим выключен, профилировщик не создается: цикл проверки и
+хендлеры вызываются как обычно, middleware не регистрируется, монитор
+задержки event loop не запускается.
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import TelegramObject
+
+from config import ProfilingConfig
+from utils.metrics import LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+# Имена файлов профилей: <имя>-<время>.prof
+_PROFILE_NAME = re.compile(r'^[\w.-]+\.prof$')
+
+
+class Profiler:
+    """
+    Детерминированный профилировщик (cProfile) для async-кода
+
+    cProfile видит только поток event loop и все задачи, которые работали
+    в нем, пока профилируемая корутина ждала. Поэтому одновременно
+    профилируется не больше одного вызова, остальные выполняются без
+    профиля. Время в потоке aiosqlite видно как ожидание.
+
+    Профили пишутся в config.directory, для каждого имени хранятся
+    последние config.keep файлов.
+    """
+
+    def __init__(self, config: ProfilingConfig):
+        self.config = config
+        self._active = False
+        self._lag_task: Optional[asyncio.Task] = None
+        os.makedirs(config.directory, exist_ok=True)
+
+    def wrap(self, name: str, func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        """Обернуть корутинную функцию профилированием"""
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await self.run(name, func(*args, **kwargs))
+        return wrapper
+
+    async def run(self, name: str, coro: Awaitable) -> Any:
+        """Выполнить корутину под профилировщиком"""
+        if self._active:
+            return await coro
+
+        profile = cProfile.Profile()
+        self._active = True
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            self._active = False
+            self._save(name, profile, time.perf_counter() - started)
+
+    def _save(self, name: str, profile: cProfile.Profile, duration: float):
+        now = time.time()
+        path = os.path.join(
+            self.config.directory,
+            f"{name}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}"
+            f"{int(now * 1000) % 1000:03d}-{int(duration * 1000)}ms.prof"
+        )
+        profile.dump_stats(path)
+        logger.info(f"Profile {name} saved to {path} ({duration:.2f}s)")
+
+        # Ротация: оставляем последние keep файлов этого имени
+        files = sorted(
+            entry for entry in os.listdir(self.config.directory)
+            if entry.startswith(f"{name}-") and entry.endswith('.prof')
+        )
+        for old in files[:-self.config.keep]:
+            os.remove(os.path.join(self.config.directory, old))
+
+    def list_profiles(self) -> List[Dict]:
+        """Сохраненные профили, новые первыми"""
+        profiles = []
+        for entry in os.listdir(self.config.directory):
+            if not _PROFILE_NAME.match(entry):
+                continue
+            stat = os.stat(os.path.join(self.config.directory, entry))
+            profiles.append({'name': entry, 'size': stat.st_size, 'mtime': stat.st_mtime})
+        profiles.sort(key=lambda profile: profile['mtime'], reverse=True)
+        return profiles
+
+    def profile_path(self, name: str) -> Optional[str]:
+        """Путь к профилю по имени файла (None, если имя недопустимо или файла нет)"""
+        if not _PROFILE_NAME.match(name):
+            return None
+        path = os.path.join(self.config.directory, name)
+        return path if os.path.isfile(path) else None
+
+    @staticmethod
+    def profile_summary(path: str, limit: int = 40) -> str:
+        """Текстовая сводка профиля: самые дорогие функции по cumulative time"""
+        stream = io.StringIO()
+        pstats.Stats(path, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def start_loop_monitor(self):
+        """
+        Следить за задержкой event loop
+
+        Задача просыпается каждые interval секунд; если она проснулась
+        позже, чем должна, значит loop был занят синхронным кодом. Кроме
+        того, включается debug-режим asyncio: он пишет в лог конкретный
+        callback, выполнявшийся дольше порога.
+        """
+        loop = asyncio.get_running_loop()
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.config.slow_callback_ms / 1000
+        self._lag_task = asyncio.create_task(self._monitor_loop_lag())
+
+    async def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+
+    async def _monitor_loop_lag(self):
+        interval = self.config.lag_interval
+        threshold = self.config.slow_callback_ms / 1000
+        while True:
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lag = time.perf_counter() - expected
+            LOOP_LAG.observe(max(lag, 0.0))
+            if lag > threshold:
+                logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+
+class ProfilingMiddleware(BaseMiddleware):
+    """
+    Профилирование хендлеров с флагом ``profile``::
+
+        @router.message(Command("check"), flags={"profile": "check"})
+
+    Регистрируется только в режиме профилирования.
+    """
+
+    def __init__(self, profiler: Profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+            event: TelegramObject,
+            data: Dict[str, Any]
+    ) -> Any:
+        name = get_flag(data, 'profile')
+        if name is None:
+            return await handler(event, data)
+        return await self.profiler.run(f"handler_{name}", handler(event, data))
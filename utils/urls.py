@@ -0,0 +1,27 @@
+"""Канонический вид ссылок на статьи"""
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Параметры ссылок, которые не меняют саму статью (метки трафика)
+_TRACKING_PARAMS = ('utm_', 'fbclid', 'gclid', 'yclid', '_openstat')
+
+
+def canonical_url(url: str) -> str:
+    """URL статьи без меток трафика, фрагмента и завершающего слэша"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(_TRACKING_PARAMS)
+    ))
+    return urlunsplit((
+        parts.scheme.lower(),
+        parts.netloc.lower(),
+        parts.path.rstrip('/') or '/',
+        query,
+        ''
+    ))
+
+
+def url_hash(url: str) -> str:
+    """Ключ статьи: одна и та же статья с разными метками дает один хэш"""
+    return hashlib.sha1(canonical_url(url).encode()).hexdigest()
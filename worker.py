@@ -0,0 +1,78 @@
+"""Запуск дополнительного воркера проверки новостей
+
+Воркер не принимает апдейты Telegram, а только проверяет новости и
+рассылает их. Несколько воркеров (на одной машине или на разных
+инстансах с общей БД) делят компании между собой через аренды в SQLite.
+"""
+import asyncio
+import logging
+
+from bot.factory import create_bot
+from config import load_config
+from database.database import Database
+from services.enrichment import ArticleEnricher
+from services.exclusions import ExclusionAdvisor
+from services.feedback import FeedbackService
+from services.sentiment import SentimentScorer
+from services.trending import TrendingDetector
+from services.news_providers import create_providers
+from services.news_service import NewsService
+from services.scheduler_service import SchedulerService
+from utils.logger import setup_logger
+
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    """Главная функция запуска воркера"""
+    config = load_config()
+    setup_logger(config.logging)
+
+    bot = create_bot(config)
+
+    database = Database(config.database.path)
+    await database.init_db()
+
+    profiler = None
+    if config.profiling.enabled:
+        from utils.profiling import Profiler
+        profiler = Profiler(config.profiling)
+        profiler.start_loop_monitor()
+
+    news_service = NewsService(
+        config.gnews,
+        archive=database,
+        providers=create_providers(config),
+        enricher=ArticleEnricher(config.enrichment) if config.enrichment.enabled else None,
+        sentiment=SentimentScorer(config.sentiment) if config.sentiment.enabled else None,
+        trending=TrendingDetector(config.trending) if config.trending.enabled else None,
+        exclusions=ExclusionAdvisor(database, config.exclusions) if config.exclusions.enabled else None
+    )
+    scheduler_service = SchedulerService(
+        bot,
+        database,
+        news_service,
+        config,
+        profiler=profiler,
+        feedback=FeedbackService(database, config.feedback) if config.feedback.enabled else None
+    )
+
+    scheduler_service.start()
+    logger.info(f"Worker {scheduler_service.worker_id} started")
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        scheduler_service.shutdown()
+        await scheduler_service.release_ownership()
+        if news_service.exclusions:
+            await news_service.exclusions.snapshot()
+        await bot.session.close()
+        logger.info("Worker stopped gracefully")
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user (Ctrl+C)")